@@ -0,0 +1,3 @@
+"""
+Benchmarks of the kernel's hot paths, compared against the baselines in `baseline.json` - see `harness.main`
+"""
@@ -0,0 +1,27 @@
+"""
+`do_execute` round-trips through the stand-in interpreter
+"""
+import asyncio
+
+from .bench_kernel import stand_in_kernel
+from .harness import benchmark
+
+CELLS = {
+    'statement': 'Dim i: i = 6 * 7',
+    'echo': 'WScript.Echo "value"',
+    'evaluate': '6 * 7',
+    'error': 'Err.Raise 11',
+}
+
+
+# round-trips include process scheduling, they vary more than in-process benchmarks
+@benchmark('do_execute', CELLS, threshold=3.0)
+def do_execute(cell: str):
+    code = CELLS[cell]
+    loop = asyncio.new_event_loop()
+    with stand_in_kernel() as kernel:
+        kernel.send_response = lambda *args, **kwargs: None
+        try:
+            yield lambda: loop.run_until_complete(kernel.do_execute(code, silent=False))
+        finally:
+            loop.close()
@@ -0,0 +1,80 @@
+"""
+History appends and lookups against databases of 10^3 to 10^6 entries
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+from ivbscript.history import HistoryManager
+
+from .harness import benchmark
+
+ROWS = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+SOURCES = 1000
+LINES_PER_SESSION = 100
+# databases built once per size, copied for each benchmark
+_templates = {}
+_templates_dir = tempfile.mkdtemp(prefix='ivbscript-benchmarks-')
+atexit.register(shutil.rmtree, _templates_dir, ignore_errors=True)
+
+
+def _template(rows: int) -> str:
+    if rows not in _templates:
+        path = os.path.join(_templates_dir, f'history-{rows}.db')
+        history = HistoryManager(path)
+        history.connect()
+        sessions = [HistoryManager._generate_session_id()  # pylint: disable=protected-access
+                    for _ in range(rows // LINES_PER_SESSION)]
+        sources = [f'WScript.Echo "line {n}"' for n in range(SOURCES)]
+        with history.history_db:
+            history.history_db.executemany("INSERT INTO sessions (session_id, start_time) VALUES (?, ?)",
+                                           [(session_id, 0) for session_id in sessions])
+            history.history_db.executemany("INSERT INTO sources (hash, source) VALUES (source_hash(?), ?)",
+                                           [(source, source) for source in sources])
+            history.history_db.executemany("INSERT INTO history (session_id, line, source_id) VALUES (?, ?, ?)",
+                                           ((sessions[row // LINES_PER_SESSION], row % LINES_PER_SESSION,
+                                             row % SOURCES + 1) for row in range(rows)))
+        history.disconnect()
+        _templates[rows] = path
+    return _templates[rows]
+
+
+def _history(rows: int):
+    directory = tempfile.mkdtemp(dir=_templates_dir)
+    path = os.path.join(directory, 'history.db')
+    shutil.copyfile(_template(rows), path)
+    history = HistoryManager(path)
+    history.connect()
+    return history, directory
+
+
+@benchmark('history.append', ROWS)
+def append(rows: int):
+    history, directory = _history(rows)
+    lines = iter(range(rows, 2 ** 62))
+    try:
+        yield lambda: history.append(next(lines), f'WScript.Echo "appended {rows}"')
+    finally:
+        history.disconnect()
+        shutil.rmtree(directory)
+
+
+@benchmark('history.tail', ROWS)
+def tail(rows: int):
+    history, directory = _history(rows)
+    try:
+        yield lambda: history.tail(100)
+    finally:
+        history.disconnect()
+        shutil.rmtree(directory)
+
+
+@benchmark('history.tail_unique', ROWS)
+def tail_unique(rows: int):
+    history, directory = _history(rows)
+    try:
+        yield lambda: history.tail(100, unique=True)
+    finally:
+        history.disconnect()
+        shutil.rmtree(directory)
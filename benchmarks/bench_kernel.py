@@ -0,0 +1,118 @@
+"""
+Requests the kernel answers without the interpreter - completion, completeness and whether a cell is evaluated
+"""
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from ivbscript.kernel import VBScriptKernel
+from ivbscript.syntax import BlockChecker, is_statement
+
+from .harness import benchmark
+
+LINES = [10, 100, 1000, 5000]
+# names defined in the session, completed alongside the builtins
+SESSION_NAMES = 1000
+BLOCK = '''Sub Work{n}(count, text)
+    Dim i
+    For i = 0 To count
+        If i Mod 2 = 0 Then
+            text = text & "x"
+        ElseIf i > 3 Then text = text & "y"
+        End If
+    Next
+End Sub
+Work{n} 3, "value{n}"
+'''
+CELLS = {
+    'statement': 'WScript.Echo "value"',
+    'expression': 'total + Len(name) * 2',
+    'call': 'objShell.Run("cmd /c dir", 0, True)',
+    'sub': 'Work12 3, "x"',
+    'block': BLOCK.format(n=0),
+}
+PREFIXES = ['W', 'Work1', 'value99']
+# seconds given to the standby interpreter's process to start up, so it does not compete with the timed calls
+SETTLE_TIME = 0.5
+
+
+class StandInKernel(VBScriptKernel):
+    """
+    Kernel running the stand-in interpreter, with history kept in memory
+    """
+    BACKEND = 'stand-in'
+
+    @classmethod
+    def get_history_path(cls):
+        return ':memory:'
+
+
+@contextmanager
+def stand_in_kernel() -> Iterator[StandInKernel]:
+    kernel = StandInKernel()
+    kernel._wait_started()  # pylint: disable=protected-access
+    kernel.interpreters._spawner.join()  # pylint: disable=protected-access
+    time.sleep(SETTLE_TIME)
+    try:
+        yield kernel
+    finally:
+        kernel.do_shutdown(False)
+
+
+def module(lines: int) -> str:
+    blocks = [BLOCK.format(n=n) for n in range(-(-lines // BLOCK.count('\n')))]
+    return ''.join(blocks).splitlines(keepends=True)[:lines]
+
+
+@benchmark('do_is_complete', LINES)
+def do_is_complete(lines: int):
+    code = ''.join(module(lines)).rstrip('\n')
+    with stand_in_kernel() as kernel:
+        yield lambda: kernel.do_is_complete(code)
+
+
+@benchmark('do_is_complete_cold', LINES)
+def do_is_complete_cold(lines: int):
+    code = ''.join(module(lines)).rstrip('\n')
+    with stand_in_kernel() as kernel:
+        def call():
+            # nothing remembered from checking the same code before
+            kernel.block_checker = BlockChecker()
+            return kernel.do_is_complete(code)
+
+        yield call
+
+
+@benchmark('do_is_complete_append', LINES)
+def do_is_complete_append(lines: int):
+    """
+    A line typed at a time - each call checks the buffer grown by the next line, starting over after `lines` lines
+    """
+    source = module(lines)
+    buffer = []
+    with stand_in_kernel() as kernel:
+        def call():
+            if len(buffer) == len(source):
+                buffer.clear()
+                kernel.block_checker = BlockChecker()
+            buffer.append(source[len(buffer)])
+            return kernel.do_is_complete(''.join(buffer))
+
+        yield call
+
+
+@benchmark('do_complete', PREFIXES)
+def do_complete(prefix: str):
+    code = ''.join(BLOCK.format(n=n) for n in range(SESSION_NAMES // 2))
+    code += ''.join(f'Dim value{n}\n' for n in range(SESSION_NAMES // 2))
+    with stand_in_kernel() as kernel:
+        kernel._remember_symbols(code)  # pylint: disable=protected-access
+        line = f'x = {prefix}'
+        yield lambda: kernel.do_complete(line, len(line))
+
+
+@benchmark('is_statement', CELLS)
+def should_evaluate(cell: str):
+    code = CELLS[cell]
+    subs = {f'work{n}' for n in range(SESSION_NAMES)}
+    yield lambda: is_statement(code, subs)
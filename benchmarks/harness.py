@@ -0,0 +1,177 @@
+"""
+Benchmark registry, timing, and comparison of the results against stored baselines
+"""
+import argparse
+import functools
+import importlib
+import itertools
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Dict, Iterable, List, NamedTuple, Optional
+
+from ivbscript.stats import format_duration
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+MODULES = ['bench_kernel', 'bench_history', 'bench_execute']
+# a benchmark regressed when its fastest round is slower than the baseline's by more than this factor - the fastest
+# round is the least disturbed by the rest of the machine, medians are kept for the record
+DEFAULT_THRESHOLD = 2.0
+# seconds each round takes at least - calls are repeated `number` times per round to get there
+ROUND_TIME = 0.05
+ROUNDS = 7
+NUMBERS = [1, 2, 5]
+
+
+class Benchmark(NamedTuple):
+    """
+    :param name: unique name, `<name>[<param>]` for parametrized benchmarks
+    :param setup: context manager factory - it prepares the state and yields the call to time
+    :param threshold: default regression threshold, see `DEFAULT_THRESHOLD`
+    """
+    name: str
+    setup: Callable[[], ContextManager[Callable[[], object]]]
+    threshold: float
+
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, params: Iterable = (None,), threshold: float = DEFAULT_THRESHOLD):
+    """
+    Register a generator function as a benchmark per param in `params`. The function gets the param (unless the
+    benchmark has none), prepares what it needs, yields the call to time, then cleans up
+    """
+    def register(function):
+        setup = contextmanager(function)
+        for param in params:
+            full_name = name if param is None else f'{name}[{param}]'
+            BENCHMARKS[full_name] = Benchmark(full_name, setup if param is None else functools.partial(setup, param),
+                                              threshold)
+        return function
+
+    return register
+
+
+def load():
+    for module in MODULES:
+        importlib.import_module(f'{__package__}.{module}')
+
+
+def _time(call: Callable[[], object], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        call()
+    return time.perf_counter() - start
+
+
+def autorange(call: Callable[[], object], round_time: float = ROUND_TIME) -> int:
+    """
+    Smallest number of calls (1, 2, 5, 10, 20...) taking at least `round_time`, the calls made also warm up
+    """
+    numbers = (factor * 10 ** magnitude for magnitude in itertools.count() for factor in NUMBERS)
+    return next(number for number in numbers if _time(call, number) >= round_time)
+
+
+def measure(call: Callable[[], object], rounds: int = ROUNDS, round_time: float = ROUND_TIME) -> Dict:
+    """
+    Time `call` like `timeit` - `rounds` rounds of `autorange` calls
+
+    :return: median/min seconds per call and the matching calls per second
+    """
+    number = autorange(call, round_time)
+    seconds = [_time(call, number) / number for _ in range(rounds)]
+    median = statistics.median(seconds)
+    return {'seconds': median, 'min': min(seconds), 'ops_per_second': 1 / median if median else None,
+            'number': number, 'rounds': rounds}
+
+
+def run(names: List[str], rounds: int = ROUNDS, round_time: float = ROUND_TIME,
+        report: Callable[[str], None] = lambda line: None) -> Dict[str, Dict]:
+    results = {}
+    for name in names:
+        with BENCHMARKS[name].setup() as call:
+            results[name] = measure(call, rounds, round_time)
+        report(f'{name}: {format_duration(results[name]["seconds"])}')
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict) -> List[Dict]:
+    """
+    :return: per benchmark - its verdict (regressed/improved/ok/new) and the ratio of its fastest round to the
+        baseline's
+    """
+    comparison = []
+    for name, result in results.items():
+        base = baseline.get('benchmarks', {}).get(name)
+        if base is None:
+            comparison.append({'name': name, 'verdict': 'new', 'ratio': None})
+            continue
+        threshold = base.get('threshold', BENCHMARKS[name].threshold if name in BENCHMARKS else DEFAULT_THRESHOLD)
+        ratio = result['min'] / base['min']
+        verdict = 'regressed' if ratio > threshold else 'improved' if ratio < 1 / threshold else 'ok'
+        comparison.append({'name': name, 'verdict': verdict, 'ratio': ratio, 'threshold': threshold})
+    return comparison
+
+
+def make_baseline(results: Dict[str, Dict], previous: Dict) -> Dict:
+    """
+    Baseline of `results`, keeping thresholds tuned in the `previous` baseline
+    """
+    benchmarks = dict(previous.get('benchmarks', {}))
+    for name, result in results.items():
+        threshold = benchmarks.get(name, {}).get('threshold', BENCHMARKS[name].threshold)
+        benchmarks[name] = {'seconds': result['seconds'], 'min': result['min'],
+                            'ops_per_second': result['ops_per_second'], 'threshold': threshold}
+    return {'machine': machine(), 'benchmarks': dict(sorted(benchmarks.items()))}
+
+
+def machine() -> Dict:
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.machine(),
+            'cpus': os.cpu_count()}
+
+
+def read_baseline(path: str) -> Dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as baseline_file:
+            return json.load(baseline_file)
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Benchmark the kernel and compare the results to the baselines')
+    parser.add_argument('-k', '--filter', default='', help='run only benchmarks whose name matches this regex')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON file (default: %(default)s)')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baselines')
+    parser.add_argument('-o', '--output', help='path of the JSON results and comparison')
+    parser.add_argument('--rounds', type=int, default=ROUNDS, help='rounds per benchmark (default: %(default)s)')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    load()
+    names = [name for name in BENCHMARKS if re.search(args.filter, name)]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+    baseline = read_baseline(args.baseline)
+    results = run(names, rounds=args.rounds, report=functools.partial(print, file=sys.stderr))
+    comparison = compare(results, baseline)
+    for row in comparison:
+        ratio = f'{row["ratio"]:.2f}x' if row['ratio'] is not None else '-'
+        print(f'{row["verdict"]:<10} {ratio:>8}  {format_duration(results[row["name"]]["seconds"]):>12}  {row["name"]}')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump({'machine': machine(), 'results': results, 'comparison': comparison}, output_file, indent=2)
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(make_baseline(results, baseline), baseline_file, indent=2)
+            baseline_file.write('\n')
+        return 0
+    return 1 if any(row['verdict'] == 'regressed' for row in comparison) else 0
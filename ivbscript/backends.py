@@ -0,0 +1,206 @@
+"""
+Interpreter backends - processes executing VBScript for the kernel
+"""
+import os
+import re
+import shutil
+import sys
+import threading
+from subprocess import Popen, TimeoutExpired
+from typing import Callable, Dict, List, Optional, Union
+
+from .transport import TRANSPORTS, InterpreterExited
+from .watchdog import kill_process_tree
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# kernels keep their transport files in a private directory, `<prefix><kernel pid>-<random suffix>`
+RUNTIME_DIR_PREFIX = 'ivbscript-'
+RUNTIME_DIR_REGEX = re.compile(rf'^{RUNTIME_DIR_PREFIX}(?P<pid>\d+)-')
+
+
+class InterpreterNotFound(Exception):
+    pass
+
+
+class InterpreterBackend:
+    """
+    Interpreter process speaking the kernel's protocol over a transport
+    """
+    name = None
+
+    def __init__(self, runtime_data_dir: str, pid: Union[int, str], transport: str = 'pipe'):
+        """
+        :param runtime_data_dir: directory for the transport's files
+        :param pid: identifier for the transport's files
+        :param transport: name of the transport to use, see `transport.TRANSPORTS`
+        """
+        self.transport = TRANSPORTS[transport](runtime_data_dir, pid)
+        self.process: Optional[Popen] = None
+
+    def command(self) -> List[str]:
+        raise NotImplementedError
+
+    def environment(self) -> Dict[str, str]:
+        env = os.environ.copy()
+        env.update(self.transport.environment())
+        return env
+
+    def spawn(self):
+        self.process = self.transport.spawn(self.command(), env=self.environment())
+
+    def send(self, code: str):
+        self.transport.send(code)
+
+    def wait_result(self, timeout: Optional[float] = None, until_output: bool = False) -> Optional[str]:
+        return self.transport.wait_result(timeout, until_output=until_output)
+
+    def read_output(self) -> str:
+        return self.transport.read_output()
+
+    def read_values(self) -> List[str]:
+        return self.transport.read_values()
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def kill(self):
+        """
+        Kill the interpreter and the processes it started right away - a pending `wait_result` raises
+        `InterpreterExited`
+        """
+        if self.is_running():
+            kill_process_tree(self.process.pid)
+
+    def terminate(self, timeout: float):
+        """
+        Ask the interpreter to quit, killing it if it did not exit within `timeout` seconds
+        """
+        if self.process is None:
+            return
+        try:
+            self.send('WScript.Quit')
+            self.process.wait(timeout)
+        except (InterpreterExited, TimeoutExpired):
+            pass
+        if self.is_running():
+            self.process.kill()
+            self.process.wait()
+        self.transport.close()
+        self.process = None
+
+
+class CScriptBackend(InterpreterBackend):
+    """
+    interpreter.vbs running under Windows Script Host
+    """
+    name = 'cscript'
+    INTERPRETER = 'cscript.exe'
+    SCRIPT = os.path.join(PACKAGE_DIR, 'interpreter.vbs')
+
+    def command(self) -> List[str]:
+        return [self.INTERPRETER, '//nologo', self.SCRIPT]
+
+    def spawn(self):
+        if not shutil.which(self.INTERPRETER):
+            raise InterpreterNotFound(f'Could not find {self.INTERPRETER}')
+        super().spawn()
+
+
+class StandInBackend(InterpreterBackend):
+    """
+    Python stand-in for interpreter.vbs (see `stand_in.py`), for tests and benchmarks on any platform
+    """
+    name = 'stand-in'
+    SCRIPT = os.path.join(PACKAGE_DIR, 'stand_in.py')
+
+    def command(self) -> List[str]:
+        return [sys.executable, self.SCRIPT]
+
+
+class InterpreterStandby:
+    """
+    Keeps a spawned, idle interpreter ready to replace the active one, so a reset does not wait for a new
+    process to start. Spawning the replacement and terminating retired interpreters happen in the background.
+    """
+
+    def __init__(self, create: Callable[[], InterpreterBackend], timeout: float):
+        """
+        :param create: creates a new (not yet spawned) interpreter
+        :param timeout: seconds retired interpreters are given to quit before they are killed
+        """
+        self.create = create
+        self.timeout = timeout
+        self._standby: Optional[InterpreterBackend] = None
+        self._spawn_error: Optional[Exception] = None
+        self._spawner: Optional[threading.Thread] = None
+        self._terminators: List[threading.Thread] = []
+
+    def _spawn(self):
+        interpreter = self.create()
+        try:
+            interpreter.spawn()
+        except Exception as exception:  # pylint: disable=broad-except
+            self._spawn_error = exception
+        else:
+            self._standby = interpreter
+
+    def replenish(self):
+        """
+        Spawn a standby interpreter in the background, unless there is one
+        """
+        if self._standby is not None or (self._spawner and self._spawner.is_alive()):
+            return
+        self._spawn_error = None
+        self._spawner = threading.Thread(target=self._spawn, name='interpreter-standby', daemon=True)
+        self._spawner.start()
+
+    def take(self) -> InterpreterBackend:
+        """
+        Get the standby interpreter (spawning one if the background spawn failed) and start replenishing
+        """
+        if self._spawner:
+            self._spawner.join()
+        interpreter, self._standby = self._standby, None
+        if interpreter is None or not interpreter.is_running():
+            interpreter = self.create()
+            interpreter.spawn()
+        self.replenish()
+        return interpreter
+
+    def retire(self, interpreter: InterpreterBackend):
+        """
+        Terminate `interpreter` in the background
+        """
+        self._terminators = [thread for thread in self._terminators if thread.is_alive()]
+        terminator = threading.Thread(target=interpreter.terminate, args=(self.timeout,),
+                                      name='interpreter-terminate', daemon=True)
+        terminator.start()
+        self._terminators.append(terminator)
+
+    def close(self):
+        """
+        Terminate the standby interpreter and wait for retired ones to exit
+        """
+        if self._spawner:
+            self._spawner.join()
+            self._spawner = None
+        if self._standby is not None:
+            self._standby.terminate(self.timeout)
+            self._standby = None
+        for terminator in self._terminators:
+            terminator.join()
+        self._terminators = []
+
+
+BACKENDS = {backend.name: backend for backend in (CScriptBackend, StandInBackend)}
+
+
+def sweep_runtime_data(parent_dir: str):
+    """
+    Remove the runtime directories left in `parent_dir` by kernels that are no longer running
+    """
+    import psutil  # pylint: disable=import-outside-toplevel
+    for name in os.listdir(parent_dir):
+        match = RUNTIME_DIR_REGEX.match(name)
+        if match and not psutil.pid_exists(int(match.group('pid'))):
+            shutil.rmtree(os.path.join(parent_dir, name), ignore_errors=True)
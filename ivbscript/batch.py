@@ -0,0 +1,277 @@
+"""
+Headless batch runner - executes many .vbs scripts and notebooks across a pool of interpreters, each job in a fresh
+interpreter, and reports every job's output and timings as JSON
+"""
+import argparse
+import itertools
+import json
+import os
+import queue
+import shlex
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple
+
+from .backends import (BACKENDS, RUNTIME_DIR_PREFIX, InterpreterBackend,
+                       InterpreterStandby)
+from .imports import ENCODING, ImportTable
+from .stats import PhaseTimer
+from .symbols import SymbolTable
+from .syntax import interpreter_command
+from .transport import TRANSPORTS, InterpreterExited
+from .watchdog import CellWatchdog, describe_process
+
+NOTEBOOK_EXTENSION = '.ipynb'
+IMPORT_MAGIC = '%import '
+FILE_MAGIC = '%file'
+# notebook cells the kernel handles itself rather than the interpreter, skipped except for `%import` and `%file`
+KERNEL_COMMAND_PREFIXES = ('%', '!')
+
+
+def read_cells(path: str) -> List[str]:
+    """
+    Code to run for `path` - a notebook's code cells, or a script as a single cell. Scripts are read in the locale's
+    encoding like the kernel reads them (`%file`, `%import`), notebooks are UTF-8 JSON
+    """
+    if not path.lower().endswith(NOTEBOOK_EXTENSION):
+        with open(path, 'r', encoding=ENCODING) as code_file:
+            return [code_file.read()]
+    with open(path, 'r', encoding='utf-8') as code_file:
+        notebook = json.load(code_file)
+    if not isinstance(notebook, dict):
+        raise ValueError(f'{path} is not a notebook, its JSON is not an object')
+    cells = []
+    for cell in notebook.get('cells', []):
+        if cell.get('cell_type') == 'code':
+            source = cell.get('source', '')
+            cells.append(''.join(source) if isinstance(source, list) else source)
+    return cells
+
+
+class BatchRunner:
+    """
+    Runs jobs (scripts/notebooks) on `workers` threads, each driving its own interpreter process, so throughput scales
+    with the number of cores. A worker keeps a standby interpreter spawning while it runs a job, the next job starts
+    in it without waiting for a process to start.
+    """
+    POLL_INTERVAL = 0.05
+    SHUTDOWN_TIMEOUT = 2
+
+    def __init__(self, workers: int, backend: str = 'cscript', transport: str = 'pipe',
+                 timeout: Optional[float] = None):
+        """
+        :param workers: number of jobs running at once
+        :param backend: name of the interpreter backend, see `backends.BACKENDS`
+        :param transport: name of the interpreter transport, see `transport.TRANSPORTS`
+        :param timeout: seconds a job may run before its interpreter is killed, None for no limit
+        """
+        self.workers = max(workers, 1)
+        self.backend = backend
+        self.transport = transport
+        self.timeout = timeout
+        self._runtime_data_dir = None
+        self._interpreter_ids = itertools.count()
+
+    def _create_interpreter(self) -> InterpreterBackend:
+        return BACKENDS[self.backend](self._runtime_data_dir, f'batch-{next(self._interpreter_ids)}',
+                                      transport=self.transport)
+
+    def run(self, paths: List[str]) -> Dict:
+        """
+        Run the jobs in `paths`
+
+        :return: the report - a result per job (in the order of `paths`) and a summary
+        """
+        start = time.monotonic()
+        jobs: queue.Queue = queue.Queue()
+        for index, path in enumerate(paths):
+            jobs.put((index, path))
+        results: List[Optional[Dict]] = [None] * len(paths)
+        # named like a kernel's, so kernels sweep it if the runner is killed
+        self._runtime_data_dir = tempfile.mkdtemp(prefix=f'{RUNTIME_DIR_PREFIX}{os.getpid()}-')
+        try:
+            workers = [threading.Thread(target=self._work, args=(jobs, results), name=f'ivbscript-batch-{number}')
+                       for number in range(min(self.workers, len(paths)))]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            shutil.rmtree(self._runtime_data_dir, ignore_errors=True)
+        return {'workers': self.workers, 'seconds': time.monotonic() - start,
+                'failed': sum(result['status'] != 'ok' for result in results), 'jobs': results}
+
+    def _work(self, jobs: queue.Queue, results: List[Optional[Dict]]):
+        interpreters = InterpreterStandby(self._create_interpreter, self.SHUTDOWN_TIMEOUT)
+        interpreters.replenish()
+        try:
+            while True:
+                try:
+                    index, path = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    interpreter = interpreters.take()
+                except Exception as exception:  # pylint: disable=broad-except
+                    results[index] = self._error_result(path, exception)
+                    continue
+                try:
+                    results[index] = self.run_job(interpreter, path)
+                except Exception as exception:  # pylint: disable=broad-except
+                    # one broken job must not cost the report of the others
+                    results[index] = self._error_result(path, exception)
+                finally:
+                    interpreters.retire(interpreter)
+        finally:
+            interpreters.close()
+
+    @staticmethod
+    def _error_result(path: str, exception: Exception) -> Dict:
+        return {'path': path, 'status': 'error', 'stdout': '', 'seconds': 0.0, 'timings': {}, 'values': [],
+                'stderr': ''.join(traceback.format_exception(None, exception, None))}
+
+    def run_job(self, interpreter: InterpreterBackend, path: str) -> Dict:
+        """
+        Run the cells of `path` in order in `interpreter`, stopping at the first failing one
+        """
+        timer = PhaseTimer()
+        # values of the expressions evaluated, see `values.py`
+        result = {'path': path, 'status': 'ok', 'stdout': '', 'stderr': '', 'values': []}
+        try:
+            cells = read_cells(path)
+        except (OSError, ValueError) as exception:
+            cells = []
+            result.update(status='error', stderr=''.join(traceback.format_exception(None, exception, None)))
+        watchdog = CellWatchdog(self.timeout)
+        symbols = SymbolTable()
+        imports = ImportTable()
+        cell_results = []
+        for code in cells:
+            cell_start = time.monotonic()
+            if code.strip().startswith(IMPORT_MAGIC):
+                status, stdout, stderr = self._run_imports(interpreter, code.strip()[len(IMPORT_MAGIC):], imports,
+                                                           symbols, watchdog, timer)
+            elif code.split(maxsplit=1)[:1] == [FILE_MAGIC]:
+                status, stdout, stderr = self._run_file(interpreter, code.strip()[len(FILE_MAGIC):], symbols,
+                                                        watchdog, timer)
+                result['values'] += [json.loads(value) for value in interpreter.read_values()]
+            elif not code.strip() or code.lstrip().startswith(KERNEL_COMMAND_PREFIXES):
+                cell_results.append({'status': 'skipped', 'stdout': '', 'stderr': '', 'seconds': 0.0})
+                continue
+            else:
+                status, stdout, stderr = self._run_code(interpreter, interpreter_command(code, symbols.subs()),
+                                                        watchdog, timer)
+                result['values'] += [json.loads(value) for value in interpreter.read_values()]
+            cell_results.append({'status': status, 'stdout': stdout, 'stderr': stderr,
+                                 'seconds': time.monotonic() - cell_start})
+            result['stdout'] += stdout
+            result['stderr'] += stderr
+            if status != 'ok':
+                result['status'] = status
+                break
+            symbols.update(code)
+        if path.lower().endswith(NOTEBOOK_EXTENSION):
+            result['cells'] = cell_results
+        result['seconds'] = timer.elapsed()
+        result['timings'] = dict(timer.timings)
+        return result
+
+    # pylint: disable=too-many-arguments
+    def _run_imports(self, interpreter: InterpreterBackend, arguments: str, imports: ImportTable,
+                     symbols: SymbolTable, watchdog: CellWatchdog, timer: PhaseTimer) -> Tuple[str, str, str]:
+        """
+        Run the library files of an `%import` cell not imported by the job yet
+        """
+        stdout = ''
+        for library_path in shlex.split(arguments):
+            try:
+                changed = imports.changed(library_path)
+            except (OSError, ValueError) as exception:
+                return 'error', stdout, ''.join(traceback.format_exception(None, exception, None))
+            if changed is None:
+                continue
+            code, state = changed
+            status, library_stdout, stderr = self._run_code(interpreter, code, watchdog, timer)
+            stdout += library_stdout
+            if status != 'ok':
+                return status, stdout, f'{library_path}: {stderr}'
+            imports.add(library_path, state)
+            symbols.update(code)
+        return 'ok', stdout, ''
+
+    # pylint: enable=too-many-arguments
+
+    def _run_file(self, interpreter: InterpreterBackend, arguments: str, symbols: SymbolTable,
+                  watchdog: CellWatchdog, timer: PhaseTimer) -> Tuple[str, str, str]:
+        """
+        Run the script of a `%file` cell, as the kernel does
+        """
+        paths = shlex.split(arguments)
+        if len(paths) != 1:
+            return 'error', '', 'Usage: %file <file_path>'
+        try:
+            with open(paths[0], 'r', encoding=ENCODING) as code_file:
+                code = code_file.read()
+        except (OSError, ValueError) as exception:
+            return 'error', '', ''.join(traceback.format_exception(None, exception, None))
+        status, stdout, stderr = self._run_code(interpreter, interpreter_command(code, symbols.subs()), watchdog,
+                                                timer)
+        if status == 'ok':
+            symbols.update(code)
+        return status, stdout, stderr
+
+    def _run_code(self, interpreter: InterpreterBackend, command: str, watchdog: CellWatchdog,
+                  timer: PhaseTimer) -> Tuple[str, str, str]:
+        """
+        :return: status (ok/error/timeout), stdout and stderr of `command`
+        """
+        stdout = ''
+        try:
+            with timer.phase('send'):
+                interpreter.send(command)
+            while True:
+                if watchdog.expired():
+                    state = describe_process(interpreter.process.pid)
+                    interpreter.kill()
+                    return ('timeout', stdout + interpreter.read_output(),
+                            f'TimeoutError: job timed out after {watchdog.timeout:g} seconds with the interpreter '
+                            f'{state}')
+                with timer.phase('wait'):
+                    stderr = interpreter.wait_result(self.POLL_INTERVAL, until_output=True)
+                with timer.phase('output'):
+                    stdout += interpreter.read_output()
+                if stderr is not None:
+                    return 'error' if stderr else 'ok', stdout, stderr
+        except InterpreterExited:
+            return 'error', stdout, 'Error: interpreter exited'
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='ivbscript-batch',
+                                     description='Run VBScript scripts and notebooks in parallel interpreters')
+    parser.add_argument('paths', nargs='+', help='.vbs scripts and .ipynb notebooks to run')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of jobs running at once (default: number of cores)')
+    parser.add_argument('--timeout', type=float, default=None, help='seconds a job may run before it is killed')
+    parser.add_argument('--backend', default=os.environ.get('IVBS_BACKEND', 'cscript'), choices=sorted(BACKENDS))
+    parser.add_argument('--transport', default='pipe', choices=sorted(TRANSPORTS))
+    parser.add_argument('-o', '--report', help='path of the JSON report (default: print to stdout)')
+    args = parser.parse_args(argv)
+
+    report = BatchRunner(args.jobs, backend=args.backend, transport=args.transport,
+                         timeout=args.timeout).run(args.paths)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
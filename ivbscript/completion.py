@@ -0,0 +1,117 @@
+"""
+Prefix index for code completion
+"""
+import bisect
+import heapq
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# sorts after any character a word may continue with
+MAX_CHARACTER = '\U0010ffff'
+
+
+class Vocabulary:
+    """
+    Words sorted by their lower case form, for case insensitive prefix lookups with bisect, and by length, for
+    the shortest words of prefixes matching many
+    """
+    # prefixes matching more words than this are served from `by_length` rather than by sorting their matches
+    SORT_LIMIT = 256
+
+    def __init__(self, words: Iterable[str] = ()):
+        self.entries: List[Tuple[str, str]] = sorted({(word.lower(), word) for word in words})
+        self.by_length: List[Tuple[int, str, str]] = sorted((len(word), lower, word) for lower, word in self.entries)
+
+    def add(self, word: str):
+        entry = (word.lower(), word)
+        index = bisect.bisect_left(self.entries, entry)
+        if index == len(self.entries) or self.entries[index] != entry:
+            self.entries.insert(index, entry)
+            bisect.insort(self.by_length, (len(word), *entry))
+
+    def discard(self, word: str):
+        entry = (word.lower(), word)
+        index = bisect.bisect_left(self.entries, entry)
+        if index < len(self.entries) and self.entries[index] == entry:
+            del self.entries[index]
+            del self.by_length[bisect.bisect_left(self.by_length, (len(word), *entry))]
+
+    def starting_with(self, prefix: str) -> Iterable[str]:
+        """
+        :param prefix: lower case prefix
+        """
+        index = bisect.bisect_left(self.entries, (prefix,))
+        while index < len(self.entries) and self.entries[index][0].startswith(prefix):
+            yield self.entries[index][1]
+            index += 1
+
+    def shortest_starting_with(self, prefix: str) -> Iterator[Tuple[int, str, str]]:
+        """
+        Words starting with `prefix` as (length, lower case word, word), shortest first
+
+        :param prefix: lower case prefix
+        """
+        start = bisect.bisect_left(self.entries, (prefix,))
+        end = bisect.bisect_left(self.entries, (prefix + MAX_CHARACTER,), start)
+        if end - start <= self.SORT_LIMIT:
+            yield from sorted((len(word), lower, word) for lower, word in self.entries[start:end])
+        else:
+            # many matches, the caller usually stops after the first few
+            for entry in self.by_length:
+                if entry[1].startswith(prefix):
+                    yield entry
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class CompletionIndex:
+    """
+    Case insensitive prefix index over named vocabularies.
+
+    Vocabularies are indexed separately, adding or replacing one does not touch the others.
+    """
+
+    def __init__(self, max_results: Optional[int] = None):
+        """
+        :param max_results: default cap on the number of results returned by `complete`
+        """
+        self.max_results = max_results
+        self.vocabularies: Dict[str, Vocabulary] = {}
+
+    def set_vocabulary(self, name: str, words: Iterable[str]):
+        self.vocabularies[name] = Vocabulary(words)
+
+    def add_words(self, name: str, words: Iterable[str]):
+        vocabulary = self.vocabularies.setdefault(name, Vocabulary())
+        for word in words:
+            vocabulary.add(word)
+
+    def remove_vocabulary(self, name: str):
+        self.vocabularies.pop(name, None)
+
+    def complete(self, prefix: str, max_results: Optional[int] = None) -> List[str]:
+        """
+        Get words starting with `prefix` (ignoring case) - ones matching its case first, then shorter ones first
+
+        :param max_results: cap on the number of results, overrides the index's default
+        """
+        max_results = self.max_results if max_results is None else max_results
+        lower_prefix = prefix.lower()
+        matching_case: List[str] = []
+        other_case: List[str] = []
+        seen = set()
+        # shortest words first across vocabularies - words matching the prefix's case rank first, collecting stops
+        # once `max_results` of them were found
+        for _, _, word in heapq.merge(*(vocabulary.shortest_starting_with(lower_prefix)
+                                        for vocabulary in self.vocabularies.values())):
+            if word in seen:
+                continue
+            seen.add(word)
+            if word.startswith(prefix):
+                matching_case.append(word)
+                if max_results is not None and len(matching_case) >= max_results:
+                    break
+            elif max_results is None or len(other_case) < max_results:
+                other_case.append(word)
+        ranked = matching_case + other_case
+        return ranked if max_results is None else ranked[:max_results]
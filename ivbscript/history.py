@@ -1,4 +1,9 @@
+import hashlib
+import queue
 import sqlite3
+import sys
+import threading
+import time
 import uuid
 from contextlib import closing
 
@@ -19,26 +24,62 @@ class HistoryManager:
     """
     SQLite DB manager capable of retrieving and appending
     history to a database on disk
+
+    Sources are stored once per distinct content (`sources`) and referenced by history entries.
     """
     MAX_SESSION_ID_GENERATE_TRIES = 15
+    DEFAULT_QUEUE_SIZE = 1000
+    MAX_BATCH_SIZE = 500
+    MAINTENANCE_DELAY = 30
+    MAINTENANCE_INTERVAL = 60 * 60
+    VACUUM_PAGES = 1024
+    AUTO_VACUUM_INCREMENTAL = 2
+    # seconds to wait for another kernel's write transaction before failing with `database is locked`
+    BUSY_TIMEOUT = 30
+    _STOP = object()
 
-    def __init__(self, history_path: str):
+    # pylint: disable=too-many-arguments
+    def __init__(self, history_path: str, write_behind: bool = False, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 max_age: float = None, max_sessions: int = None, max_bytes: int = None):
         """
         :param history_path: Path to database (created if does not exist)
         :type history_path: string
+        :param write_behind: queue appended history to a background writer committing it in batches
+        :param queue_size: maximum number of queued entries before `append` blocks (write_behind only)
+        :param max_age: drop sessions started more than `max_age` seconds ago
+        :param max_sessions: keep only the latest `max_sessions` sessions
+        :param max_bytes: drop the oldest sessions while stored sources take more than `max_bytes`
         """
         self.history_db_path = history_path
         self.history_db = None
         self.session_id = self._generate_session_id()
+        self.session_number = None
+        self.full_text_search = False
+        self.write_behind = write_behind
+        self.queue_size = queue_size
+        self.max_age = max_age
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._queue = None
+        self._writer = None
+        self._write_error = None
+
+    # pylint: enable=too-many-arguments
 
     @staticmethod
     def _generate_session_id():
         return str(uuid.uuid4())
 
+    @staticmethod
+    def _source_hash(source: str) -> str:
+        return hashlib.sha256(source.encode('utf-8', errors='surrogatepass')).hexdigest()
+
     @property
     def connected(self):
         try:
-            self.history_db.execute('SELECT 1')
+            with self._lock:
+                self.history_db.execute('SELECT 1')
             return True
         except (sqlite3.ProgrammingError, AttributeError):
             return False
@@ -46,15 +87,36 @@ class HistoryManager:
     def connect(self):
         if self.connected:
             raise DBAlreadyConnected
-        self.history_db = sqlite3.connect(self.history_db_path)
+        # kernels share the DB - write transactions take the write lock when they begin, so they wait for each other
+        # (up to BUSY_TIMEOUT) rather than fail upgrading a read lock another kernel's commit made stale
+        self.history_db = sqlite3.connect(self.history_db_path, timeout=self.BUSY_TIMEOUT, check_same_thread=False,
+                                          isolation_level='IMMEDIATE')
+        self.history_db.create_function('source_hash', 1, self._source_hash, deterministic=True)
+        # only takes effect on a new database, existing ones are converted by `maintain`
+        self.history_db.execute(f'PRAGMA auto_vacuum={self.AUTO_VACUUM_INCREMENTAL}')
+        # WAL commits append to the log instead of syncing a rollback journal and the DB file
+        self.history_db.execute('PRAGMA journal_mode=WAL')
+        self.history_db.execute('PRAGMA synchronous=NORMAL')
         with closing(self.history_db.cursor()) as cursor:
+            cursor.execute("""CREATE TABLE IF NOT EXISTS sources (
+                                          id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                          hash CHAR(64) NOT NULL UNIQUE,
+                                          source TEXT NOT NULL
+                                      );
+                                   """)
+            columns = [column[1] for column in cursor.execute('PRAGMA table_info(history)')]
+            if 'source' in columns:
+                self._migrate_inline_sources(cursor)
             cursor.execute("""CREATE TABLE IF NOT EXISTS history (
                                           id INTEGER PRIMARY KEY AUTOINCREMENT,
                                           session_id VARCHAR(36) NOT NULL,
                                           line INTEGER NOT NULL,
-                                          source TEXT
+                                          source_id INTEGER NOT NULL REFERENCES sources (id)
                                       );
                                    """)
+            self._create_indexes(cursor)
+            self._create_sessions_table(cursor)
+            self.full_text_search = self._create_full_text_search(cursor)
             self.history_db.commit()
 
         tries_left = self.MAX_SESSION_ID_GENERATE_TRIES
@@ -65,34 +127,302 @@ class HistoryManager:
         if self.is_session_exists():
             raise FailedGenerateSessionId
 
+        with self.history_db:
+            self.session_number = self.history_db.execute(
+                "INSERT INTO sessions (session_id, start_time) VALUES (?,?)",
+                (self.session_id, time.time())).lastrowid
+
+        if self.write_behind:
+            self._queue = queue.Queue(self.queue_size)
+            self._writer = threading.Thread(target=self._write_loop, name='ivbscript-history-writer', daemon=True)
+            self._writer.start()
+
+    @staticmethod
+    def _migrate_inline_sources(cursor: sqlite3.Cursor):
+        """
+        Move sources stored in history rows to `sources`
+        """
+        cursor.executescript("""
+            BEGIN IMMEDIATE;
+            DROP TRIGGER IF EXISTS history_fts_insert;
+            DROP TRIGGER IF EXISTS history_fts_delete;
+            DROP TABLE IF EXISTS history_fts;
+            ALTER TABLE history RENAME TO history_inline_sources;
+            CREATE TABLE history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id VARCHAR(36) NOT NULL,
+                line INTEGER NOT NULL,
+                source_id INTEGER NOT NULL REFERENCES sources (id)
+            );
+            INSERT OR IGNORE INTO sources (hash, source)
+                SELECT source_hash(COALESCE(source, '')), COALESCE(source, '')
+                FROM history_inline_sources
+                ORDER BY id;
+            INSERT INTO history (id, session_id, line, source_id)
+                SELECT h.id, h.session_id, h.line, s.id
+                FROM history_inline_sources h
+                JOIN sources s ON s.hash = source_hash(COALESCE(h.source, ''));
+            DROP TABLE history_inline_sources;
+            COMMIT;
+        """)
+
+    @staticmethod
+    def _create_indexes(cursor: sqlite3.Cursor):
+        cursor.execute("CREATE INDEX IF NOT EXISTS history_session_line ON history (session_id, line)")
+        # lets `unique` lookups and source garbage collection find references to a source without scanning
+        cursor.execute("CREATE INDEX IF NOT EXISTS history_source ON history (source_id, id)")
+
+    @staticmethod
+    def _create_sessions_table(cursor: sqlite3.Cursor):
+        exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions'").fetchone()
+        cursor.execute("""CREATE TABLE IF NOT EXISTS sessions (
+                                  id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                  session_id VARCHAR(36) NOT NULL UNIQUE,
+                                  start_time REAL NOT NULL
+                              );
+                           """)
+        if not exists:
+            # history written before sessions were tracked, in order of appearance
+            cursor.execute("""INSERT OR IGNORE INTO sessions (session_id, start_time)
+                              SELECT session_id, 0 FROM history GROUP BY session_id ORDER BY MIN(id)""")
+
+    @staticmethod
+    def _create_full_text_search(cursor: sqlite3.Cursor) -> bool:
+        """
+        Index sources with FTS5's trigram tokenizer, which serves GLOB patterns from the index
+
+        :return: False if this SQLite build has no FTS5/trigram support
+        """
+        exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sources_fts'").fetchone()
+        try:
+            cursor.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS sources_fts USING fts5(
+                    source, content='sources', content_rowid='id', tokenize='trigram case_sensitive 1'
+                );
+                CREATE TRIGGER IF NOT EXISTS sources_fts_insert AFTER INSERT ON sources BEGIN
+                    INSERT INTO sources_fts (rowid, source) VALUES (new.id, new.source);
+                END;
+                CREATE TRIGGER IF NOT EXISTS sources_fts_delete AFTER DELETE ON sources BEGIN
+                    INSERT INTO sources_fts (sources_fts, rowid, source) VALUES ('delete', old.id, old.source);
+                END;
+            """)
+        except sqlite3.OperationalError:
+            return False
+        if not exists:
+            cursor.execute("INSERT INTO sources_fts (sources_fts) VALUES ('rebuild')")
+        return True
+
     def is_session_exists(self):
-        with closing(self.history_db.cursor()) as cursor:
+        with self._lock, closing(self.history_db.cursor()) as cursor:
             result = cursor.execute("""SELECT session_id
-            FROM history
+            FROM sessions
             where session_id = ?
             LIMIT 1""", (self.session_id,)).fetchone()
         return bool(result)
 
     def append(self, line: int, source: str):
-        self.history_db.execute("INSERT INTO history (session_id, line, source)"
-                                " VALUES (?,?,?)", (self.session_id, line, source))
-        self.history_db.commit()
+        if self._writer:
+            self._queue.put((self.session_id, line, source))
+            return
+        self._insert([(self.session_id, line, source)])
 
-    def tail(self, lines_back: int):
-        with closing(self.history_db.cursor()) as cursor:
-            return cursor.execute("""
-            SELECT h.session_id, h.line, h.source
+    def _insert(self, rows):
+        hashed_rows = [(session_id, line, source or '', self._source_hash(source or ''))
+                       for session_id, line, source in rows]
+        with self._lock:
+            with self.history_db:
+                self.history_db.executemany("INSERT OR IGNORE INTO sources (hash, source) VALUES (?,?)",
+                                            [(source_hash, source) for _, _, source, source_hash in hashed_rows])
+                self.history_db.executemany("INSERT INTO history (session_id, line, source_id)"
+                                            " SELECT ?, ?, id FROM sources WHERE hash = ?",
+                                            [(session_id, line, source_hash)
+                                             for session_id, line, _, source_hash in hashed_rows])
+
+    def _write_loop(self):
+        next_maintenance = time.monotonic() + self.MAINTENANCE_DELAY
+        stop = False
+        while not stop:
+            try:
+                batch = [self._queue.get(timeout=max(next_maintenance - time.monotonic(), 0))]
+            except queue.Empty:
+                try:
+                    self.maintain()
+                except sqlite3.Error as exception:
+                    self._write_error = exception
+                next_maintenance = time.monotonic() + self.MAINTENANCE_INTERVAL
+                continue
+            while len(batch) < self.MAX_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [item for item in batch if item is not self._STOP]
+            stop = len(rows) != len(batch)
+            try:
+                if rows:
+                    self._insert(rows)
+            except sqlite3.Error as exception:
+                self._write_error = exception
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self):
+        """
+        Wait for queued history to be written (write_behind only)
+        """
+        if self._writer:
+            self._queue.join()
+        if self._write_error:
+            exception, self._write_error = self._write_error, None
+            raise exception
+
+    def maintain(self):
+        """
+        Apply the retention limits and return free pages to the file system.
+        Runs periodically on the writer thread when write_behind is used
+        """
+        with self._lock:
+            self.prune()
+            auto_vacuum = self.history_db.execute('PRAGMA auto_vacuum').fetchone()[0]
+            if auto_vacuum != self.AUTO_VACUUM_INCREMENTAL:
+                self.history_db.execute(f'PRAGMA auto_vacuum={self.AUTO_VACUUM_INCREMENTAL}')
+                self.history_db.execute('VACUUM')
+            else:
+                # executescript steps the pragma to completion, a single step frees a single page
+                self.history_db.executescript(f'PRAGMA incremental_vacuum({self.VACUUM_PAGES})')
+
+    def prune(self):
+        """
+        Drop sessions (except the current one) beyond the retention limits, and sources no longer referenced
+        """
+        with self._lock, self.history_db, closing(self.history_db.cursor()) as cursor:
+            # other kernels prune the same sessions, select them under the write lock
+            cursor.execute('BEGIN IMMEDIATE')
+            deleted_sources = 0
+            expired = []
+            if self.max_age is not None:
+                expired += cursor.execute("SELECT id FROM sessions WHERE start_time < ? AND id != ?",
+                                          (time.time() - self.max_age, self.session_number)).fetchall()
+            if self.max_sessions is not None:
+                expired += cursor.execute("""SELECT id FROM sessions
+                WHERE id != ?
+                ORDER BY id DESC
+                LIMIT -1 OFFSET ?""", (self.session_number, max(self.max_sessions - 1, 0))).fetchall()
+            for session_number in sorted(set(expired)):
+                deleted_sources += self._delete_session(cursor, session_number[0])[0]
+            if self.max_bytes is not None:
+                stored_bytes = self.stored_bytes()
+                while stored_bytes > self.max_bytes:
+                    oldest = cursor.execute("SELECT id FROM sessions WHERE id != ? ORDER BY id LIMIT 1",
+                                            (self.session_number,)).fetchone()
+                    if not oldest:
+                        break
+                    sources_count, freed_bytes = self._delete_session(cursor, oldest[0])
+                    deleted_sources += sources_count
+                    stored_bytes -= freed_bytes
+            if deleted_sources and self.full_text_search:
+                # FTS5 deletes only mark entries as deleted until segments are merged
+                cursor.execute("INSERT INTO sources_fts (sources_fts, rank) VALUES ('merge', ?)",
+                               (-self.VACUUM_PAGES,))
+
+    def stored_bytes(self) -> int:
+        """
+        Total size of stored sources in bytes
+        """
+        with self._lock:
+            return self.history_db.execute(
+                "SELECT COALESCE(SUM(LENGTH(CAST(source AS BLOB))), 0) FROM sources").fetchone()[0]
+
+    @staticmethod
+    def _delete_session(cursor: sqlite3.Cursor, session_number: int):
+        """
+        Delete a session's history and the sources only it referenced
+
+        :return: number of deleted sources and their total size in bytes
+        """
+        session_id = cursor.execute("SELECT session_id FROM sessions WHERE id = ?", (session_number,)).fetchone()[0]
+        orphans = cursor.execute("""SELECT s.id, LENGTH(CAST(s.source AS BLOB))
+        FROM sources s
+        WHERE s.id IN (SELECT source_id FROM history WHERE session_id = ?1)
+        AND NOT EXISTS (SELECT 1 FROM history h WHERE h.source_id = s.id AND h.session_id != ?1)""",
+                                 (session_id,)).fetchall()
+        cursor.execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+        cursor.execute("DELETE FROM sessions WHERE id = ?", (session_number,))
+        cursor.executemany("DELETE FROM sources WHERE id = ?", [(source_id,) for source_id, _ in orphans])
+        return len(orphans), sum(size for _, size in orphans)
+
+    def tail(self, lines_back: int, unique: bool = False):
+        """
+        Get the last `lines_back` entries of all sessions, oldest first
+
+        :param unique: skip entries whose source appears again later
+        """
+        return self._latest("", (), lines_back, unique)
+
+    def search(self, pattern: str, limit: int = None, unique: bool = False):
+        """
+        Get entries whose source matches the (case sensitive) glob `pattern`, oldest first
+
+        :param limit: return only the last `limit` matches
+        :param unique: skip entries whose source appears again later
+        """
+        if self.full_text_search:
+            condition = "AND h.source_id IN (SELECT rowid FROM sources_fts WHERE sources_fts.source GLOB ?)"
+        else:
+            condition = "AND s.source GLOB ?"
+        return self._latest(condition, (pattern,), limit, unique)
+
+    def range(self, session: int = 0, start: int = 0, stop: int = None):
+        """
+        Get a session's entries with `start <= line < stop`
+
+        :param session: 0 for the current session, negative for earlier sessions relative to it,
+                        positive for an absolute session number
+        """
+        self.flush()
+        with self._lock, closing(self.history_db.cursor()) as cursor:
+            if session <= 0:
+                found = cursor.execute("""SELECT session_id FROM sessions
+                WHERE id <= ?
+                ORDER BY id DESC
+                LIMIT 1 OFFSET ?""", (self.session_number, -session)).fetchone()
+            else:
+                found = cursor.execute("SELECT session_id FROM sessions WHERE id = ?", (session,)).fetchone()
+            if not found:
+                return []
+            return cursor.execute("""SELECT h.session_id, h.line, s.source
+            FROM history h
+            JOIN sources s ON s.id = h.source_id
+            WHERE h.session_id = ? AND h.line >= ? AND h.line < ?
+            ORDER BY h.line, h.id""", (found[0], start, sys.maxsize if stop is None else stop)).fetchall()
+
+    def _latest(self, condition: str, parameters: tuple, limit: int = None, unique: bool = False):
+        """
+        Walk history backwards from the newest entry, collecting matching entries
+
+        :param condition: SQL condition on history `h` / its source `s`, starting with `AND`
+        """
+        self.flush()
+        if unique:
+            condition += """ AND NOT EXISTS (
+                SELECT 1 FROM history later WHERE later.source_id = h.source_id AND later.id > h.id
+            )"""
+        with self._lock, closing(self.history_db.cursor()) as cursor:
+            rows = cursor.execute(f"""SELECT h.session_id, h.line, s.source
             FROM history h
-            JOIN (
-                    SELECT MIN(id) as order_, session_id
-                    FROM history
-                    GROUP BY session_id
-            ) o
-            ON o.session_id = h.session_id
-            ORDER BY o.order_
-            LIMIT ? """, (lines_back,)).fetchall()
+            JOIN sources s ON s.id = h.source_id
+            WHERE 1 {condition}
+            ORDER BY h.id DESC
+            LIMIT ?""", (*parameters, -1 if limit is None else limit)).fetchall()
+        rows.reverse()
+        return rows
 
     def disconnect(self):
+        if self._writer:
+            self._queue.put(self._STOP)
+            self._writer.join()
+            self._writer = None
         try:
             self.history_db.close()
         except AttributeError:
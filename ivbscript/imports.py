@@ -0,0 +1,60 @@
+"""
+Libraries imported into the interpreter session (`%import`), so unchanged ones are not run again
+"""
+import hashlib
+import locale
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+ENCODING = locale.getpreferredencoding(False)
+
+
+class LibraryState(NamedTuple):
+    """
+    :param mtime_ns: modification time of the file when it was read
+    :param size: size of the file when it was read
+    :param digest: sha256 of the file's content
+    """
+    mtime_ns: int
+    size: int
+    digest: str
+
+
+class ImportTable:
+    """
+    State of each library file as it was when run in the session. Files whose modification time and size did not
+    change are not read again, touched files whose content did not change are not run again
+    """
+
+    def __init__(self):
+        self.libraries: Dict[str, LibraryState] = {}
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def changed(self, path: str) -> Optional[Tuple[str, LibraryState]]:
+        """
+        :return: None if `path` was imported and did not change since, otherwise its code and its state to `add`
+            once the code ran
+        :raise OSError: `path` could not be read
+        :raise UnicodeDecodeError: `path` is not a text file
+        """
+        key = self._key(path)
+        stat = os.stat(path)
+        imported = self.libraries.get(key)
+        if imported and (imported.mtime_ns, imported.size) == (stat.st_mtime_ns, stat.st_size):
+            return None
+        with open(path, 'rb') as library_file:
+            data = library_file.read()
+        state = LibraryState(stat.st_mtime_ns, stat.st_size, hashlib.sha256(data).hexdigest())
+        if imported and imported.digest == state.digest:
+            self.libraries[key] = state
+            return None
+        return data.decode(ENCODING), state
+
+    def add(self, path: str, state: LibraryState):
+        self.libraries[self._key(path)] = state
+
+    def clear(self):
+        self.libraries.clear()
@@ -0,0 +1,68 @@
+"""
+Kernel side cache of object inspection results, so known types are not reflected over again
+"""
+import re
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+OBJECT_INFO_REGEX = re.compile(r'^Object (?P<type_name>\S+)$')
+MEMBER_REGEX = re.compile(r'^ (?:Function|Sub|Property)\b.*?(?P<name>\w+)(?:\(.*\))?$')
+
+
+class TypeInfo(NamedTuple):
+    """
+    :param type_name: TypeName() of the inspected object
+    :param members: names of the type's members
+    :param text: the inspection result as printed by the interpreter
+    """
+    type_name: str
+    members: Tuple[str, ...]
+    text: str
+
+
+def parse_object_info(text: str) -> Optional[TypeInfo]:
+    """
+    Parse `Interpreter.GetObjectInfo` output of an object
+
+    :return: None if `text` does not describe an object's members
+    """
+    lines = text.splitlines()
+    header = OBJECT_INFO_REGEX.match(lines[0]) if lines else None
+    if not header:
+        return None
+    members = []
+    for line in lines[1:]:
+        member = MEMBER_REGEX.match(line)
+        if member:
+            members.append(member.group('name'))
+    return TypeInfo(header.group('type_name'), tuple(members), text)
+
+
+class TypeInfoCache:
+    """
+    Least recently used cache of `TypeInfo` keyed by type (case insensitive)
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: 'OrderedDict[str, TypeInfo]' = OrderedDict()
+
+    def get(self, type_key: str) -> Optional[TypeInfo]:
+        type_key = type_key.lower()
+        info = self.entries.get(type_key)
+        if info is not None:
+            self.entries.move_to_end(type_key)
+        return info
+
+    def put(self, type_key: str, info: TypeInfo):
+        type_key = type_key.lower()
+        self.entries[type_key] = info
+        self.entries.move_to_end(type_key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
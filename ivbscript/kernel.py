@@ -1,27 +1,51 @@
 """
 Jupyter kernel implementation for VBScript
 """
+import asyncio
+import functools
+import itertools
 import os
 import random
 import re
 import shlex
-import time
+import shutil
+import tempfile
+import threading
 import traceback
-from distutils.spawn import find_executable
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from subprocess import PIPE, Popen, TimeoutExpired
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
-import psutil
 import termcolor
-import win32clipboard
 from ipykernel.kernelbase import Kernel
 from pygments.lexers import _vbscript_builtins
 
+from .backends import (BACKENDS, RUNTIME_DIR_PREFIX, InterpreterBackend,
+                       InterpreterStandby, sweep_runtime_data)
+from .completion import CompletionIndex
 from .history import HistoryManager
+from .imports import ImportTable
+from .inspection import TypeInfoCache, parse_object_info
+from .shell import STDERR, STDOUT, ShellCommand, SpillingOutput
+from .stats import PhaseStats, PhaseTimer, format_timeit
+from .streaming import OutputCoalescer
+from .symbols import SymbolTable
+from .syntax import BlockChecker, interpreter_command
+from .transport import InterpreterExited
+from .values import display_bundle
+from .watchdog import CellWatchdog, describe_process
 
 __version__ = '1.0.0'
 
+COMPLETION_INITIAL_REGEX = re.compile(r'(\s+|[&,\(])?(?P<initial>\w+)$')
+MEMBER_ACCESS_REGEX = re.compile(r'(?P<object>\w+)\.(?P<initial>\w*)$')
+WORD_REGEX = re.compile(r'\w+')
+INSPECT_MAGIC_REGEX = re.compile(r'^inspect\s+(?P<expression>.+?)(?P<options>(?:\s+--\w+\s+\S+)*)$', re.DOTALL)
+INSPECT_OPTION_REGEX = re.compile(r'--(?P<name>\w+)\s+(?P<value>\S+)')
+TIMEIT_MAGIC_REGEX = re.compile(r'^(?P<options>(?:-[nr]\s*\d+\s+)*)(?P<code>\S.*)$', re.DOTALL)
+TIMEIT_OPTION_REGEX = re.compile(r'-(?P<name>[nr])\s*(?P<value>\d+)')
+TIMEIT_RESULT_REGEX = re.compile(r'^timeit:(?P<number>\d+);(?P<rounds>[\d;]+)\r?\n?', re.MULTILINE)
+
 
 class VBScriptKernel(Kernel):
     """
@@ -30,7 +54,7 @@ class VBScriptKernel(Kernel):
     implementation = 'iVBScript'
     language = "vbscript"
     implementation_version = __version__
-    banner = termcolor.colored(r'''
+    BANNER = r'''
 d8b 888     888 888888b.    .d8888b.                   d8b          888
 Y8P 888     888 888  "88b  d88P  Y88b                  Y8P          888
     888     888 888  .88P  Y88b.                                    888
@@ -42,24 +66,42 @@ Y8P 888     888 888  "88b  d88P  Y88b                  Y8P          888
                                                            888
                                                            888
                                                            888
-    ''', color=random.choice(list(termcolor.COLORS)))
-    INTERPRETER = 'cscript.exe'
-    COMMAND_LINE_TIMEOUT = 15
+    '''
+    BACKEND = os.environ.get('IVBS_BACKEND', 'cscript')
+    TRANSPORT = 'pipe'
+    # parent of the kernels' private runtime directories, a tmpfs such as `/dev/shm` keeps transport files off disk -
+    # the system's temporary directory if unset
+    RUNTIME_DIR = os.environ.get('IVBS_RUNTIME_DIR') or os.environ.get('XDG_RUNTIME_DIR') or None
+    SHUTDOWN_TIMEOUT = 2
+    RESTARTED_MESSAGE = 'the interpreter was restarted, its variables and definitions are lost'
+    # seconds a cell may run before the interpreter is killed, None for no limit - see `%timeout`
+    CELL_TIMEOUT = float(os.environ.get('IVBS_CELL_TIMEOUT', 0)) or None
+    HISTORY_MAX_AGE = 365 * 24 * 60 * 60
+    HISTORY_MAX_SESSIONS = 5000
+    HISTORY_MAX_BYTES = 128 * 1024 * 1024
+    MAX_COMPLETIONS = 100
+    TYPE_INFO_CACHE_SIZE = 128
+    # %inspect defaults - elements listed per array/dictionary, nesting levels listed, result size
+    INSPECT_LIMIT = 100
+    INSPECT_DEPTH = 2
+    INSPECT_BYTES = 64 * 1024
+    # %timeit default rounds
+    TIMEIT_REPEAT = 5
+    # seconds a `!<command>` may run before it is killed, None for no limit
+    COMMAND_LINE_TIMEOUT = float(os.environ.get('IVBS_COMMAND_LINE_TIMEOUT', 0)) or None
+    # characters of a `!<command>`'s stdout/stderr displayed before the rest is written to a temporary file
+    COMMAND_LINE_OUTPUT_LIMIT = 1024 * 1024
+    STREAM_INTERVAL = 0.05
+    STREAM_CHUNK_SIZE = 64 * 1024
     incomplete_indent = '  '
-    completion_regexes = {
-        'sub': {'start_pattern': r'(^|\s)((private|public)\s+)?sub(\s+)[a-z_][a-z0-9_]*\s*(\(.+\))?',
-                'end_pattern': r'(^|\s)end(\s+)sub(\s|$)'},
-        'function': {'start_pattern': r'(^|\s)((private|public)\s+)?function(\s+)[a-z_][a-z0-9_]*\s*(\(.+\))?',
-                     'end_pattern': r'(^|\s)end(\s+)function(\s|$)'},
-        'if': {'start_pattern': r'(^|\s)if(\s+).+(\s+)then(\s|$)', 'end_pattern': r'(^|\s)end(\s+)if(\s|$)'},
-        'select': {'start_pattern': r'(^|\s)select(\s+)case', 'end_pattern': r'(^|\s)end(\s+)select(\s|$)'},
-        'for': {'start_pattern': r'(^|\s)for(\s+)', 'end_pattern': r'(^|\s)next(\s|$)'},
-        'do': {'start_pattern': r'(^|\s)do(\s+)', 'end_pattern': r'(^|\s)loop(\s|$)'},
-        'with': {'start_pattern': r'(^|\s)with(\s+)', 'end_pattern': r'(^|\s)end(\s+)with(\s|$)'},
-        'property': {'start_pattern': r'(^|\s)((private|public)\s+)?property(\s+)[a-z_][a-z0-9_]*\s*(\(.+\))?',
-                     'end_pattern': r'(^|\s)end(\s+)property(\s|$)'},
-        'class': {'start_pattern': r'(^|\s)class(\s+)', 'end_pattern': r'(^|\s)end(\s+)class(\s|$)'}
-    }
+    _banner = None
+
+    @property
+    def banner(self):
+        # colored on first kernel_info request rather than at import
+        if self._banner is None:
+            self._banner = termcolor.colored(self.BANNER, color=random.choice(list(termcolor.COLORS)))
+        return self._banner
 
     @property
     def language_info(self):
@@ -71,24 +113,49 @@ Y8P 888     888 888  "88b  d88P  Y88b                  Y8P          888
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        assert find_executable(self.INTERPRETER), f'Could not find {self.INTERPRETER}'
-        os.chdir(os.path.dirname(os.path.abspath(__file__)))
-        runtime_data_dir = os.path.join(os.getcwd(), 'runtime_data')
-        if not os.path.exists(runtime_data_dir):
-            os.mkdir(runtime_data_dir)
-        pid = os.getpid()
-
-        self.history_manager = HistoryManager(self.get_history_path())
-        self.cscript = None
-        self.stdout_pos = 0
-        self.stdout_file_path = os.path.join(runtime_data_dir, f'{pid}.stdout')
-        self.stderr_file_path = os.path.join(runtime_data_dir, f'{pid}.stderr')
-        self.input_file_path = os.path.join(runtime_data_dir, f'{pid}.input')
-        debug_log = os.path.join(runtime_data_dir, f'{pid}.log')
-
-        os.environ.update({'IVBS_CMD_PATH': self.input_file_path, 'IVBS_RET_PATH': self.stderr_file_path,
-                           'IVBS_DEBUG_PATH': debug_log})
-        self.run()
+        # private to this kernel, kernels sharing a host never see each other's transport files - created by `run`, so
+        # a kernel that never starts up leaves nothing behind
+        self._runtime_data_dir = os.path.join(self.RUNTIME_DIR or tempfile.gettempdir(),
+                                              f'{RUNTIME_DIR_PREFIX}{os.getpid()}-{os.urandom(6).hex()}')
+        self._interpreter_ids = itertools.count()
+        # interpreters are also created in the background, after start up
+        self.backend = self.BACKEND
+        self.transport = self.TRANSPORT
+
+        self.history_manager = HistoryManager(self.get_history_path(), write_behind=True,
+                                              max_age=self.HISTORY_MAX_AGE, max_sessions=self.HISTORY_MAX_SESSIONS,
+                                              max_bytes=self.HISTORY_MAX_BYTES)
+        self.interpreter = self._create_interpreter()
+        self.interpreters = InterpreterStandby(self._create_interpreter, self.SHUTDOWN_TIMEOUT)
+        self._stdout_stream = None
+        self._stderr_stream = None
+        self.completion_index = CompletionIndex(self.MAX_COMPLETIONS)
+        self.completion_index.set_vocabulary('builtins', _vbscript_builtins.BUILTIN_CONSTANTS
+                                             + _vbscript_builtins.BUILTIN_FUNCTIONS
+                                             + _vbscript_builtins.BUILTIN_VARIABLES
+                                             + _vbscript_builtins.KEYWORDS
+                                             + _vbscript_builtins.OPERATOR_WORDS)
+        self.symbols = SymbolTable()
+        self.imports = ImportTable()
+        self.type_info_cache = TypeInfoCache(self.TYPE_INFO_CACHE_SIZE)
+        self.block_checker = BlockChecker()
+        # cells run one at a time on a worker thread, interrupts arrive on the control thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ivbscript-execute')
+        self._interpreter_lock = threading.Lock()
+        self._interpreter_busy = False
+        # (ename, evalue) of the reason the running cell was aborted
+        self._abort_reason: Optional[Tuple[str, str]] = None
+        self._shell_command: Optional[ShellCommand] = None
+        self.command_line_timeout = self.COMMAND_LINE_TIMEOUT
+        self.cell_timeout = self.CELL_TIMEOUT
+        self._watchdog = CellWatchdog(None)
+        self.stats = PhaseStats()
+        self._timer = PhaseTimer()
+        # connecting the history and spawning the interpreter happen in the background, so the kernel answers
+        # kernel_info right away - requests needing them wait in `_wait_started`
+        self._startup_error: Optional[Exception] = None
+        self._startup = threading.Thread(target=self._start, name='ivbscript-startup', daemon=True)
+        self._startup.start()
 
     @classmethod
     def get_history_path(cls):
@@ -97,72 +164,228 @@ Y8P 888     888 888  "88b  d88P  Y88b                  Y8P          888
         """
         return os.path.join(os.path.expanduser("~"), f".{cls.implementation.lower()}_history.db")
 
+    def _create_interpreter(self) -> InterpreterBackend:
+        # interpreters run side by side while one is on standby, their transport files must not collide
+        return BACKENDS[self.backend](self._runtime_data_dir, next(self._interpreter_ids), transport=self.transport)
+
     def run(self):
+        os.makedirs(self._runtime_data_dir, mode=0o700, exist_ok=True)
+        sweep_runtime_data(os.path.dirname(self._runtime_data_dir))
+        # the interpreter process starts up while the history DB is opened
+        self.interpreter.spawn()
         self.history_manager.connect()
-        with open(self.stdout_file_path, 'w') as stdout_file:
-            self.cscript = Popen([
-                self.INTERPRETER,
-                '//nologo',
-                'interpreter.vbs'
-            ], stdout=stdout_file, stderr=stdout_file, shell=False, env=os.environ.copy())
+        self.interpreters.replenish()
+
+    def _start(self):
+        try:
+            self.run()
+        except Exception as exception:  # pylint: disable=broad-except
+            self._startup_error = exception
+
+    def _wait_started(self):
+        """
+        :raise Exception: what `run` raised - every time, until a restart starts the kernel up again
+        """
+        self._startup.join()
+        if self._startup_error:
+            raise self._startup_error
 
     def _get_stdout(self) -> str:
-        with open(self.stdout_file_path, 'r') as stdout_file:
-            stdout_file.seek(self.stdout_pos)
-            data = stdout_file.read()
-            self.stdout_pos = stdout_file.tell()
-            return data
+        return self.interpreter.read_output()
 
     def _handle_command_line_code(self, code: str) -> Dict:
+        """
+        Run a child program, passing its output on while it runs - interrupting the cell kills it
+        """
+        output = {'stdout': '', 'stderr': ''}
         try:
-            process = Popen(shlex.split(code), stderr=PIPE, stdout=PIPE)
-            try:
-                stdout, stderr = process.communicate(timeout=self.COMMAND_LINE_TIMEOUT)
-                return {'stdout': stdout.decode('utf-8'), 'stderr': stderr.decode('utf-8')}
-            finally:
-                process.terminate()
-        except (FileNotFoundError, TimeoutExpired) as exception:
-            return {'stdout': '', 'stderr': (''.join(traceback.format_exception(None, exception, None)))}
+            command = ShellCommand(shlex.split(code))
+        except (OSError, ValueError) as exception:
+            output['stderr'] = ''.join(traceback.format_exception(None, exception, None))
+            return output
+        watchdog = CellWatchdog(self.command_line_timeout)
+        streams = {name: SpillingOutput(functools.partial(collect, output), self.COMMAND_LINE_OUTPUT_LIMIT, name)
+                   for name, collect in ((STDOUT, self._collect_stdout), (STDERR, self._collect_stderr))}
+        with self._interpreter_lock:
+            self._shell_command = command
+        try:
+            while not command.finished():
+                for deadline in (watchdog, self._watchdog):
+                    if deadline.expired() and not command.abort_reason:
+                        command.abort('TimeoutError', f'command timed out after {deadline.timeout:g} seconds')
+                for name, text in command.read(self.STREAM_INTERVAL):
+                    streams[name].write(text)
+                for stream in (self._stdout_stream, self._stderr_stream):
+                    if stream:
+                        stream.write('')
+        finally:
+            with self._interpreter_lock:
+                self._shell_command = None
+            command.close()
+        for name, stream in streams.items():
+            output[name] += stream.close()
+        if command.abort_reason:
+            output['stderr'] += '{}: {}\n'.format(*command.abort_reason)
+        return output
 
     def _send_command(self, code: str):
-        if os.path.exists(self.stderr_file_path):
-            os.remove(self.stderr_file_path)
-        with open(self.input_file_path, 'w', encoding='utf-8') as input_file:
-            input_file.write("\n".join(code.splitlines()))
+        self.interpreter.send(code)
 
     def _handle_vbscript_command(self, code: str, try_evaluate: bool = True, force_evaluate: bool = False) -> Dict:
-        inspect_prefix = 'oInterpreter.HandleInspect '
+        """
+        :param try_evaluate: let the interpreter echo `code`'s value if it turns out to be an expression
+        :param force_evaluate: echo `code`'s value, an error if it is not an expression
+        """
         if not try_evaluate and force_evaluate:
             return {'stderr': 'Error: cant force_evaluate and not try_evaluate'}
-        should_evaluate = False
-        if try_evaluate or force_evaluate:
-            if force_evaluate or self._should_evaluate(code):
-                should_evaluate = True
-                code = f'{inspect_prefix}{code}'
-        self._send_command(code)
-        while not os.path.exists(self.stderr_file_path):
-            time.sleep(1)
-        output = {}
-        with open(self.stderr_file_path, 'r', encoding='utf-8') as stderr_file:
-            output['stderr'] = stderr_file.read()
-        os.remove(self.stderr_file_path)
-        output['stdout'] = self._get_stdout()
-        if not force_evaluate and should_evaluate and output.get('stderr', False):
-            code = code.replace(inspect_prefix, '')
-            output = self._handle_vbscript_command(code, try_evaluate=False)
+        command = code
+        if force_evaluate:
+            command = f'oInterpreter.HandleInspect {code}'
+        elif try_evaluate:
+            command = interpreter_command(code, self.symbols.subs())
+        output = {'stdout': ''}
+        try:
+            with self._interpreter_lock:
+                self._interpreter_busy = True
+            with self._timer.phase('send'):
+                self._send_command(command)
+            output['stderr'] = self._wait_result(output)
+        except InterpreterExited:
+            output['stderr'] = 'Error: interpreter exited, use %reset to start a new one'
+        finally:
+            with self._interpreter_lock:
+                self._interpreter_busy = False
+        with self._timer.phase('output'):
+            self._collect_stdout(output, self._get_stdout())
+            if self._stdout_stream:
+                self._stdout_stream.flush()
+            values = self.interpreter.read_values()
+            data = display_bundle(values[-1]) if values and not output.get('stderr') else None
+            # Empty is what calls of procedures returning nothing evaluate to, not worth an Out[n]
+            if data and data['application/json']['type'] != 'vbEmpty':
+                output['data'] = data
+        if not force_evaluate and not output.get('stderr'):
+            self._remember_symbols(code)
         return output
 
+    def _remember_symbols(self, code: str):
+        symbols = self.symbols.update(code)
+        if symbols:
+            self.completion_index.add_words('session', [symbol.name for symbol in symbols])
+
+    def _forget_session(self):
+        """
+        Forget what was defined in the interpreter, after it was replaced
+        """
+        self.symbols.clear()
+        self.imports.clear()
+        self.completion_index.remove_vocabulary('session')
+
+    def _handle_local_inspect(self, name: str) -> Dict:
+        """
+        Describe a procedure/class defined in this session without asking the interpreter
+
+        :return: empty output if `name` is not such a symbol
+        """
+        symbol = self.symbols.get(name) if WORD_REGEX.fullmatch(name) else None
+        if symbol and (symbol.is_procedure or symbol.kind == 'class'):
+            return {'stdout': symbol.describe() + '\n'}
+        return {}
+
+    def _handle_inspect(self, code: str) -> Dict:
+        """
+        Inspect `code` in the interpreter - objects created from a type inspected before are answered from cache
+        """
+        type_key = self._object_type(code.strip())
+        info = self.type_info_cache.get(type_key) if type_key else None
+        if info:
+            return {'stdout': info.text}
+        # collected rather than streamed, to be parsed into the cache
+        stdout_stream, self._stdout_stream = self._stdout_stream, None
+        try:
+            output = self._handle_vbscript_command(code, force_evaluate=True)
+        finally:
+            self._stdout_stream = stdout_stream
+        info = parse_object_info(output['stdout']) if type_key and not output.get('stderr') else None
+        if info:
+            self.type_info_cache.put(type_key, info)
+        return output
+
+    def _object_type(self, name: str) -> Optional[str]:
+        """
+        Type (ProgID/class) the object variable `name` was created from, if known
+        """
+        symbol = self.symbols.get(name) if WORD_REGEX.fullmatch(name) else None
+        return symbol.type_name if symbol and symbol.kind == 'object' else None
+
+    def _object_members(self, name: str) -> List[str]:
+        members = [member.name for member in self.symbols.members(name)]
+        if not members:
+            type_key = self._object_type(name)
+            info = self.type_info_cache.get(type_key) if type_key else None
+            members = list(info.members) if info else []
+        return members
+
+    def _wait_result(self, output: Dict) -> str:
+        """
+        Wait for the running command to finish, passing its output on while it runs
+        """
+        while True:
+            if self._watchdog.expired() and not self._abort_reason:
+                state = describe_process(self.interpreter.process.pid)
+                self._abort('TimeoutError', f'cell timed out after {self._watchdog.timeout:g} seconds with the '
+                                            f'interpreter {state}, {self.RESTARTED_MESSAGE}')
+            with self._timer.phase('wait'):
+                stderr = self.interpreter.wait_result(self.STREAM_INTERVAL, until_output=True)
+            with self._timer.phase('output'):
+                self._collect_stdout(output, self._get_stdout())
+            if stderr is not None:
+                return stderr
+
+    def _collect_stdout(self, output: Dict, text: str):
+        if self._stdout_stream:
+            self._stdout_stream.write(text)
+        else:
+            output['stdout'] += text
+
+    def _collect_stderr(self, output: Dict, text: str):
+        if self._stderr_stream:
+            self._stderr_stream.write(text)
+        else:
+            output['stderr'] += text
+
+    def _send_stdout(self, text: str):
+        self.send_response(self.iopub_socket, 'stream', {'name': 'stdout', 'text': text})
+
+    def _send_stderr(self, text: str):
+        self.send_response(self.iopub_socket, 'stream',
+                           {'name': 'stderr', 'text': termcolor.colored(text, color='red')})
+
     def _handle_magic(self, code: str) -> Dict:
         output = {}
-        command_parts = shlex.split(code)
         if not code:
             output['stderr'] = f'No magic specified'
             return output
+        # magics taking VBScript code - not split, its `'` comments would fail shlex
+        magic_name = code.split(maxsplit=1)[0]
+        if magic_name == 'inspect':
+            return self._handle_inspect_magic(code)
+        if magic_name == 'time':
+            return self._handle_time_magic(code[len(magic_name):].strip())
+        if magic_name == 'timeit':
+            return self._handle_timeit_magic(code[len(magic_name):].strip())
+        command_parts = shlex.split(code)
         if code.lower() == 'reset':
             self.do_shutdown(True)
             return output
         if code.lower() == 'paste':
             return self._handle_paste()
+        if command_parts[0] == 'timeout':
+            return self._handle_timeout_magic(command_parts[1:])
+        if command_parts[0] == 'stats':
+            return self._handle_stats_magic(command_parts[1:])
+        if command_parts[0] == 'import':
+            return self._handle_import_magic(command_parts[1:])
         if command_parts[0] == 'file':
             if len(command_parts) != 2:
                 output['stderr'] = 'Usage: %file <file_path>'
@@ -172,6 +395,102 @@ Y8P 888     888 888  "88b  d88P  Y88b                  Y8P          888
         output['stderr'] = f'Invalid magic "{code}"'
         return output
 
+    def _handle_time_magic(self, code: str) -> Dict:
+        """
+        `%time <code>` - run `code` and print how long each phase of its execution took
+        """
+        if not code:
+            return {'stderr': 'Usage: %time <code>'}
+        cell_timer, self._timer = self._timer, PhaseTimer()
+        try:
+            output = self._handle_code(code)
+        finally:
+            code_timer, self._timer = self._timer, cell_timer
+        code_timer.add('total', code_timer.elapsed())
+        for name, seconds in code_timer.timings.items():
+            if name != 'total':
+                cell_timer.add(name, seconds)
+        output['stdout'] = output.get('stdout', '') + code_timer.format()
+        return output
+
+    def _handle_timeit_magic(self, code: str) -> Dict:
+        """
+        `%timeit [-n N] [-r R] <code>` - time `code` looping N times in each of R rounds inside the interpreter,
+        so the measurement does not include round trips
+        """
+        usage = {'stderr': 'Usage: %timeit [-n N] [-r R] <code>'}
+        parsed = TIMEIT_MAGIC_REGEX.match(code)
+        if not parsed:
+            return usage
+        # a number of 0 lets the interpreter pick one
+        options = {'n': 0, 'r': self.TIMEIT_REPEAT}
+        for option in TIMEIT_OPTION_REGEX.finditer(parsed.group('options')):
+            options[option.group('name')] = int(option.group('value'))
+        if options['r'] < 1:
+            return usage
+        escaped = '" & vbNewLine & "'.join(line.replace('"', '""') for line in parsed.group('code').splitlines())
+        command = f'oInterpreter.TimeIt "{escaped}", {options["n"]}, {options["r"]}'
+        # collected rather than streamed, to be parsed
+        stdout_stream, self._stdout_stream = self._stdout_stream, None
+        try:
+            output = self._handle_vbscript_command(command, try_evaluate=False)
+        finally:
+            self._stdout_stream = stdout_stream
+        result = TIMEIT_RESULT_REGEX.search(output['stdout'])
+        if output.get('stderr') or not result:
+            return output
+        rounds = [int(microseconds) / 1000000 for microseconds in result.group('rounds').split(';')]
+        output['stdout'] = (output['stdout'][:result.start()] + output['stdout'][result.end():]
+                            + format_timeit(int(result.group('number')), rounds))
+        return output
+
+    def _handle_stats_magic(self, arguments: List[str]) -> Dict:
+        """
+        `%stats [reset]` - print/reset the session's histograms of execution phase timings
+        """
+        if not arguments:
+            return {'stdout': self.stats.report()}
+        if arguments == ['reset']:
+            self.stats.clear()
+            return {}
+        return {'stderr': 'Usage: %stats [reset]'}
+
+    def _handle_timeout_magic(self, arguments: List[str]) -> Dict:
+        """
+        `%timeout [seconds|off]` - show/set the time a cell may run before the interpreter is killed
+        """
+        if not arguments:
+            return {'stdout': f'Cell timeout: {f"{self.cell_timeout:g} seconds" if self.cell_timeout else "off"}\n'}
+        usage = {'stderr': 'Usage: %timeout [seconds|off]'}
+        if len(arguments) != 1:
+            return usage
+        try:
+            timeout = 0 if arguments[0].lower() == 'off' else float(arguments[0])
+        except ValueError:
+            return usage
+        if timeout < 0:
+            return usage
+        self.cell_timeout = timeout or None
+        return {}
+
+    def _handle_inspect_magic(self, code: str) -> Dict:
+        """
+        `%inspect <expression> [--offset n] [--limit n] [--depth n] [--bytes n]` - inspect a page of a large
+        array/dictionary
+        """
+        usage = {'stderr': 'Usage: %inspect <expression> [--offset n] [--limit n] [--depth n] [--bytes n]'}
+        parsed = INSPECT_MAGIC_REGEX.match(code)
+        if not parsed:
+            return usage
+        options = {'offset': 0, 'limit': self.INSPECT_LIMIT, 'depth': self.INSPECT_DEPTH, 'bytes': self.INSPECT_BYTES}
+        for option in INSPECT_OPTION_REGEX.finditer(parsed.group('options')):
+            if option.group('name') not in options or not option.group('value').isdigit():
+                return usage
+            options[option.group('name')] = int(option.group('value'))
+        command = (f'oInterpreter.InspectPage {parsed.group("expression")}, {options["offset"]}, {options["limit"]}, '
+                   f'{options["depth"]}, {options["bytes"]}')
+        return self._handle_vbscript_command(command, try_evaluate=False)
+
     def _handle_file_execute(self, file_path: str) -> Dict:
         output = {}
         try:
@@ -181,7 +500,32 @@ Y8P 888     888 888  "88b  d88P  Y88b                  Y8P          888
             output['stderr'] = (''.join(traceback.format_exception(None, exception, None)))
         return output
 
+    def _handle_import_magic(self, paths: List[str]) -> Dict:
+        """
+        `%import <file_path>...` - run library files once per interpreter session, again only once they change
+        """
+        if not paths:
+            return {'stderr': 'Usage: %import <file_path>...'}
+        output = {'stdout': ''}
+        for path in paths:
+            try:
+                changed = self.imports.changed(path)
+            except (OSError, ValueError) as exception:
+                output['stderr'] = ''.join(traceback.format_exception(None, exception, None))
+                return output
+            if changed is None:
+                continue
+            code, state = changed
+            library_output = self._handle_vbscript_command(code)
+            output['stdout'] += library_output.get('stdout', '')
+            if library_output.get('stderr'):
+                output['stderr'] = f'{path}: {library_output["stderr"]}'
+                return output
+            self.imports.add(path, state)
+        return output
+
     def _handle_paste(self) -> Dict:
+        import win32clipboard  # pylint: disable=import-outside-toplevel
         output = {}
         win32clipboard.OpenClipboard()
         try:
@@ -190,6 +534,9 @@ Y8P 888     888 888  "88b  d88P  Y88b                  Y8P          888
             if not clipboard_code.endswith('\n'):
                 text += '\n'
             text += "## -- End pasted text --\n"
+            if self._stdout_stream:
+                self._stdout_stream.write(text)
+                text = ''
             if clipboard_code.lower().strip() != '%paste':
                 output.update(self._handle_code(clipboard_code))
             else:
@@ -215,47 +562,146 @@ Y8P 888     888 888  "88b  d88P  Y88b                  Y8P          888
         elif code.startswith('%'):
             output = self._handle_magic(code[1:])
         elif code.endswith('?'):
-            output = self._handle_vbscript_command(code[:-1], force_evaluate=True)
+            output = self._handle_local_inspect(code[:-1].strip()) or self._handle_inspect(code[:-1])
         else:
             output = self._handle_vbscript_command(code)
         return output
 
     # pylint: disable=too-many-arguments
-    def do_execute(self, code, silent, store_history=True, user_expressions=None, allow_stdin=False):
+    async def do_execute(self, code, silent, store_history=True, user_expressions=None, allow_stdin=False):
+        # waiting on the interpreter blocks, run the cell on the worker thread and keep the event loop free
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._execute, code, silent)
+
+    # pylint: enable=too-many-arguments
+
+    def _error_reply(self, exception: Exception, silent: bool = False) -> Dict:
+        """
+        Reply to a request failing unexpectedly, the exception is written to stderr too. Raising it instead would
+        leave the frontend waiting for a reply that never comes
+        """
+        lines = traceback.format_exception(type(exception), exception, exception.__traceback__)
+        if not silent:
+            self._send_stderr(''.join(lines))
+        return {'status': 'error', 'ename': type(exception).__name__, 'evalue': str(exception), 'traceback': lines}
+
+    def _execute(self, code: str, silent: bool) -> Dict:
+        self._timer = PhaseTimer()
+        try:
+            self._wait_started()
+        except Exception as exception:  # pylint: disable=broad-except
+            return dict(self._error_reply(exception, silent), execution_count=self.execution_count)
         self.history_manager.append(self.execution_count, code)
-        output = self._handle_code(code.strip())
+        self._watchdog = CellWatchdog(self.cell_timeout)
+        self._stdout_stream = OutputCoalescer(self._send_stdout if not silent else lambda text: None,
+                                              self.STREAM_CHUNK_SIZE, self.STREAM_INTERVAL)
+        self._stderr_stream = OutputCoalescer(self._send_stderr if not silent else lambda text: None,
+                                              self.STREAM_CHUNK_SIZE, self.STREAM_INTERVAL)
+        error = None
+        try:
+            output = self._handle_code(code.strip())
+        except Exception as exception:  # pylint: disable=broad-except
+            output, error = {}, exception
+        finally:
+            self._stdout_stream.flush()
+            self._stderr_stream.flush()
+            self._stdout_stream = None
+            self._stderr_stream = None
+        with self._interpreter_lock:
+            abort_reason, self._abort_reason = self._abort_reason, None
+        if abort_reason:
+            try:
+                self._replace_interpreter()
+            except Exception as exception:  # pylint: disable=broad-except
+                error = error or exception
+            self._forget_session()
+            output['stderr'] = '{}: {}'.format(*abort_reason)
         if not silent:
             if output.get('stdout', list()):
-                self.send_response(self.iopub_socket, 'stream', {'name': 'stdout', 'text': output['stdout']})
+                self._send_stdout(output['stdout'])
             if output.get('stderr', list()):
                 self.send_response(self.iopub_socket, 'stream',
                                    {'name': 'stderr',
                                     'text': termcolor.colored(output['stderr'], color='red')})
             if output.get('data', list()):
                 out_prompt = termcolor.colored(f'Out[{self.execution_count}]:', color='red')
-                self.send_response(self.iopub_socket, 'display_data',
-                                   {'name': 'stdout',
-                                    'data': {'text/plain': f'{out_prompt} {output["data"]}'}})
-
+                data = dict(output['data'], **{'text/plain': f'{out_prompt} {output["data"]["text/plain"]}'})
+                self.send_response(self.iopub_socket, 'display_data', {'data': data, 'metadata': {}})
+
+        self._timer.add('total', self._timer.elapsed())
+        self.stats.record(self._timer.timings)
+        if error:
+            return dict(self._error_reply(error, silent), execution_count=self.execution_count)
+        if abort_reason:
+            ename, evalue = abort_reason
+            return {'status': 'error', 'execution_count': self.execution_count,
+                    'ename': ename, 'evalue': evalue, 'traceback': []}
         return {'status': 'ok', 'execution_count': self.execution_count, 'payload': [], 'user_expressions': {}}
 
-    # pylint: enable=too-many-arguments
+    def finish_metadata(self, parent, metadata, reply_content):
+        metadata = super().finish_metadata(parent, metadata, reply_content)
+        # seconds spent in each phase of the cell - send/wait (interpreter pickup and execution)/output/total
+        metadata['timings'] = dict(self._timer.timings)
+        return metadata
+
+    def _send_interrupt_children(self):
+        self._abort('KeyboardInterrupt', f'execution interrupted, {self.RESTARTED_MESSAGE}')
 
-    def _is_interpreter_running(self) -> bool:
-        return not self.cscript.poll()
+    def _abort(self, ename: str, evalue: str):
+        """
+        Abort the running cell by killing the interpreter, it is replaced once the cell returns. A running
+        `!<command>` is killed instead, the interpreter is left alone
+        """
+        with self._interpreter_lock:
+            if self._interpreter_busy and not self._abort_reason:
+                self._abort_reason = (ename, evalue)
+                self.interpreter.kill()
+            elif self._shell_command:
+                self._shell_command.abort(ename, evalue)
+
+    def _replace_interpreter(self):
+        """
+        Swap in the standby interpreter, the current one is terminated in the background
+        """
+        retired, self.interpreter = self.interpreter, self.interpreters.take()
+        self.interpreters.retire(retired)
 
     def _shutdown_cleanup(self):
+        if self._startup_error is None:
+            self.history_manager.disconnect()
+            self.interpreter.terminate(self.SHUTDOWN_TIMEOUT)
+        else:
+            # start up failed part way, the interpreter may have been spawned before it did
+            self.interpreter.kill()
+        self.interpreters.close()
+        self._executor.shutdown(wait=False)
+        shutil.rmtree(self._runtime_data_dir, ignore_errors=True)
+
+    def _restart(self):
         self.history_manager.disconnect()
-        self._send_command('WScript.Quit')
-        time.sleep(2)
-        if self._is_interpreter_running():
-            self.cscript.kill()
+        self._replace_interpreter()
+        self.history_manager.connect()
+
+    def _retry_startup(self):
+        if self.history_manager.connected:
+            self.history_manager.disconnect()
+        self.interpreter.kill()
+        self.interpreter = self._create_interpreter()
+        self._startup_error = None
+        self._startup = threading.Thread(target=self._start, name='ivbscript-startup', daemon=True)
+        self._startup.start()
 
     def do_shutdown(self, restart):
-        self._shutdown_cleanup()
-        if restart:
+        self._startup.join()
+        if restart and self._startup_error is not None:
+            self._retry_startup()
             self.execution_count = 0
-            self.run()
+            self._forget_session()
+        elif restart:
+            self._restart()
+            self.execution_count = 0
+            self._forget_session()
+        else:
+            self._shutdown_cleanup()
         return {'restart': restart}
 
     def do_apply(self, content, bufs, msg_id, reply_metadata):
@@ -268,47 +714,55 @@ Y8P 888     888 888  "88b  d88P  Y88b                  Y8P          888
 
     def do_is_complete(self, code):
         completed = {'status': 'complete'}
-        lines = code.splitlines()
-        if code.strip().endswith('_'):
-            return {'status': 'incomplete'}
-        if not any(list(map(str.strip, lines[-1:]))):
+        # the last line, as `code.splitlines()[-1]` - found from the end, without splitting the whole buffer
+        end = len(code) - (2 if code.endswith('\r\n') else 1 if code.endswith(('\n', '\r')) else 0)
+        start = max(code.rfind('\n', 0, end), code.rfind('\r', 0, end)) + 1
+        if not code[start:end].strip():
             return completed
-        for patterns in self.completion_regexes.values():
-            if not self._statement_completed(code, **patterns):
-                return {'status': 'incomplete', 'indent': self.incomplete_indent}
+        state = self.block_checker.check(code)
+        if state.pending:
+            return {'status': 'incomplete'}
+        if state.invalid:
+            return {'status': 'invalid'}
+        if state.depth:
+            return {'status': 'incomplete', 'indent': self.incomplete_indent * state.depth}
         return completed
 
-    @staticmethod
-    def _statement_completed(code: str, start_pattern: str, end_pattern: str) -> bool:
-        flags = re.IGNORECASE
-        code_lines = [line.strip() for line in code.splitlines()]
-        found_start = any([re.search(start_pattern, line, flags) for line in code_lines])
-        found_end = any([re.search(end_pattern, line, flags) for line in code_lines])
-        # checks if both None - both start and end not found, or if both found
-        return found_start == found_end
-
     # pylint: disable=too-many-arguments
     def do_history(self, hist_access_type, output, raw, session=None,
                    start=None, stop=None, n=None, pattern=None, unique=False):
-        if hist_access_type != "tail" or not n or output:
+        if output:
             return {'history': []}
-        result = self.history_manager.tail(n)
+        try:
+            self._wait_started()
+        except Exception as exception:  # pylint: disable=broad-except
+            return dict(self._error_reply(exception), history=[])
+        if hist_access_type == 'tail':
+            result = self.history_manager.tail(n, unique=unique) if n else []
+        elif hist_access_type == 'range':
+            result = self.history_manager.range(session or 0, start or 0, stop)
+        elif hist_access_type == 'search':
+            result = self.history_manager.search(pattern or '*', n, unique=unique)
+        else:
+            result = []
         return {'history': result}
 
     # pylint: enable=too-many-arguments
 
     def do_complete(self, code, cursor_pos):
-        all_builtins = (_vbscript_builtins.BUILTIN_CONSTANTS
-                        + _vbscript_builtins.BUILTIN_FUNCTIONS
-                        + _vbscript_builtins.BUILTIN_VARIABLES
-                        + _vbscript_builtins.KEYWORDS
-                        + _vbscript_builtins.OPERATOR_WORDS)
-
-        # get relevant initial if is a function/sub argument/start of line/after a whitespace
-        search_results = re.search(r'(\s+|[&,\(])?(?P<initial>\w+)$', code[:cursor_pos])
-        initial = search_results.groupdict()['initial'] if search_results else ''
-
-        matches = list(filter(lambda x: x.lower().startswith(initial.lower()), all_builtins))
+        line = code[code.rfind('\n', 0, cursor_pos) + 1:cursor_pos]
+        member_access = MEMBER_ACCESS_REGEX.search(line)
+        members = self._object_members(member_access.group('object')) if member_access else []
+        if members:
+            initial = member_access.group('initial')
+            members_index = CompletionIndex(self.MAX_COMPLETIONS)
+            members_index.set_vocabulary('members', members)
+            matches = members_index.complete(initial)
+        else:
+            # get relevant initial if is a function/sub argument/start of line/after a whitespace
+            search_results = COMPLETION_INITIAL_REGEX.search(line)
+            initial = search_results.groupdict()['initial'] if search_results else ''
+            matches = self.completion_index.complete(initial)
 
         cursor_start = cursor_pos - len(initial)
         cursor_end = cursor_pos
@@ -319,27 +773,32 @@ Y8P 888     888 888  "88b  d88P  Y88b                  Y8P          888
                 'metadata': {},
                 'status': 'ok'}
 
+    def do_inspect(self, code, cursor_pos, detail_level=0, omit_sections=()):
+        symbol = None
+        for word in WORD_REGEX.finditer(code):
+            if word.start() <= cursor_pos <= word.end():
+                member_access = MEMBER_ACCESS_REGEX.search(code[:word.start()])
+                if member_access and not member_access.group('initial'):
+                    members = self.symbols.members(member_access.group('object'))
+                    symbol = next((member for member in members if member.name.lower() == word.group().lower()),
+                                  None)
+                else:
+                    symbol = self.symbols.get(word.group())
+                break
+        text = symbol.describe() if symbol else None
+        if symbol and symbol.kind == 'object':
+            info = self.type_info_cache.get(symbol.type_name) if symbol.type_name else None
+            text = info.text if info else text
+        return {'status': 'ok',
+                'found': bool(symbol),
+                'data': {'text/plain': text} if symbol else {},
+                'metadata': {}}
+
     def _terminate_app(self):
-        self.cscript.terminate()
+        self.interpreter.terminate(self.SHUTDOWN_TIMEOUT)
+        self.interpreters.close()
+        import psutil  # pylint: disable=import-outside-toplevel
         cur_process = psutil.Process()
         parent_process = cur_process.parent()
         parent_process.terminate()
         cur_process.terminate()
-
-    @staticmethod
-    def _should_evaluate(code: str) -> bool:
-        method = r'(^|\s)((private|public)\s+)?(property|function|sub)(\s+)([a-z_][a-z0-9_]*)\s*(\(.+\))?'
-        class_pattern = r'(^|\s)class(\s+)([a-z_][a-z0-9_]*)'
-        dim = r'dim(\s*)(([a-z_][a-z0-9_]*)[,]?)+'
-        object_pattern = r'(^|\s)set(\s+)([a-z_][a-z0-9_]*)(\s*)[=]'
-        var = r'(^|\s+)([a-z_][a-z0-9_]*)(\s*)[=]'
-        sub_call = r'([a-z_][a-z0-9_]*)\s+([a-z_][a-z0-9_]*|".*"|\d+|-\d+)'
-        patterns = [method, class_pattern, dim, object_pattern, var, sub_call]
-
-        for pattern in patterns:
-            search_results = re.search(pattern, code, re.IGNORECASE)
-            if search_results:
-                if pattern == var:
-                    if '(' not in code.split('=')[0]:
-                        return False
-        return True
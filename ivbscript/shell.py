@@ -0,0 +1,134 @@
+"""
+Shell escapes (`!<command>`) - child programs whose output is streamed while they run
+"""
+import codecs
+import queue
+import tempfile
+import threading
+from subprocess import PIPE, Popen
+from typing import Callable, List, Optional, Tuple
+
+from .transport import ENCODING
+from .watchdog import kill_process_tree
+
+STDOUT = 'stdout'
+STDERR = 'stderr'
+
+
+class ShellCommand:
+    """
+    Child program whose stdout and stderr are read on background threads, decoded as they arrive
+    """
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, args: List[str]):
+        """
+        :raise OSError: the program could not be started
+        """
+        self.process = Popen(args, stdin=PIPE, stdout=PIPE, stderr=PIPE, shell=False)
+        self.process.stdin.close()
+        self.abort_reason: Optional[Tuple[str, str]] = None
+        self._events = queue.Queue()
+        self._open_streams = 2
+        for name, stream in ((STDOUT, self.process.stdout), (STDERR, self.process.stderr)):
+            threading.Thread(target=self._read_loop, args=(name, stream), name=f'ivbscript-shell-{name}',
+                             daemon=True).start()
+
+    def _read_loop(self, name: str, stream):
+        decoder = codecs.getincrementaldecoder(ENCODING)(errors='replace')
+        while True:
+            data = stream.read1(self.READ_SIZE)
+            text = decoder.decode(data, final=not data)
+            if text:
+                self._events.put((name, text))
+            if not data:
+                break
+        stream.close()
+        self._events.put((name, None))
+
+    def read(self, timeout: float) -> List[Tuple[str, str]]:
+        """
+        Output written since the last call, waiting up to `timeout` seconds for some
+
+        :return: (stream name, text) pairs
+        """
+        chunks = []
+        try:
+            event = self._events.get(timeout=timeout)
+            while True:
+                name, text = event
+                if text is None:
+                    self._open_streams -= 1
+                else:
+                    chunks.append((name, text))
+                event = self._events.get_nowait()
+        except queue.Empty:
+            pass
+        return chunks
+
+    def finished(self) -> bool:
+        """
+        Whether the program exited and all its output was read
+        """
+        return not self._open_streams and self.process.poll() is not None
+
+    def abort(self, ename: str, evalue: str):
+        """
+        Kill the program and the processes it started
+        """
+        if self.abort_reason is None:
+            self.abort_reason = (ename, evalue)
+        kill_process_tree(self.process.pid)
+
+    def close(self):
+        if self.process.poll() is None:
+            kill_process_tree(self.process.pid)
+        self.process.wait()
+
+
+class SpillingOutput:
+    """
+    Passes output on until `limit` characters were passed, then writes it to a temporary file instead - the file
+    holds the whole output, memory use is bounded by `limit`
+    """
+
+    def __init__(self, send: Callable[[str], None], limit: int, name: str):
+        """
+        :param send: callable receiving the output to display
+        :param limit: characters displayed before spilling
+        :param name: name of the output, part of the temporary file's name
+        """
+        self.send = send
+        self.limit = limit
+        self.name = name
+        self.size = 0
+        self.spill_file = None
+        self._displayed = []
+
+    def write(self, text: str):
+        if self.spill_file is None:
+            room = self.limit - self.size
+            if len(text) <= room:
+                self._displayed.append(text)
+                self.send(text)
+            else:
+                self.send(text[:room])
+                self.spill_file = tempfile.NamedTemporaryFile('w', encoding='utf-8', errors='replace', delete=False,
+                                                              prefix=f'ivbscript-{self.name}-', suffix='.txt')
+                self.spill_file.write(''.join(self._displayed))
+                self._displayed = []
+                self.spill_file.write(text)
+        else:
+            self.spill_file.write(text)
+        self.size += len(text)
+
+    def close(self) -> str:
+        """
+        :return: a notice about the truncation, empty if the output was fully displayed
+        """
+        self._displayed = []
+        if self.spill_file is None:
+            return ''
+        self.spill_file.close()
+        return (f'\n[{self.name} truncated after {self.limit} characters, '
+                f'all {self.size} characters were written to {self.spill_file.name}]\n')
@@ -0,0 +1,474 @@
+"""
+Stand-in for interpreter.vbs speaking the same protocol, for running the kernel where cscript.exe is missing.
+
+Understands a small VBScript subset - `Dim`, assignments, `WScript.Echo`, `WScript.Sleep`, `WScript.Quit`,
+`Err.Raise`, `oInterpreter.HandleInspect`/`InspectPage`/`TryEvaluate`/`TimeIt` with literal/variable/`&`/arithmetic
+expressions and a few builtin functions. Anything else fails the way VBScript would fail calling an unknown Sub.
+
+This file is executed directly as a script and must not import the `ivbscript` package.
+"""
+import io
+import json
+import locale
+import os
+import re
+import struct
+import sys
+import time
+
+ENCODING = locale.getpreferredencoding(False)
+# commands arrive as ASCII with other characters escaped, as transport.escape_command sends them
+COMMAND_ENCODING = 'ascii'
+ESCAPED_CHARACTERS_REGEX = re.compile(r'(?:\x1b[0-9a-f]{4})+', re.IGNORECASE)
+RECORD_SEPARATOR = '\x1e'
+FILE_POLL_INTERVAL = 0.01
+# defaults of `oInterpreter.HandleInspect`, as in interpreter.vbs
+INSPECT_LIMIT = 100
+INSPECT_DEPTH = 2
+INSPECT_BYTES = 65536
+VB_NEW_LINE = '\r\n'
+
+TOKEN_REGEX = re.compile(r'''
+    \s*(?:
+        (?P<string>"(?:[^"]|"")*")
+        |(?P<number>\d+(?:\.\d+)?)
+        |(?P<name>[a-z_][a-z0-9_]*(?:\.[a-z_][a-z0-9_]*)*)
+        |(?P<operator><>|<=|>=|[-+*/&=<>(),])
+    )''', re.IGNORECASE | re.VERBOSE)
+STATEMENT_REGEX = re.compile(r'([a-z_][a-z0-9_.]*|)(.*)', re.IGNORECASE | re.DOTALL)
+
+
+class VBScriptError(Exception):
+    def __init__(self, number: int, description: str):
+        super().__init__(description)
+        self.number = number
+        self.description = description
+
+
+class Empty:
+    def __repr__(self):
+        return ''
+
+
+EMPTY = Empty()
+
+
+def type_name(value) -> str:
+    if value is EMPTY:
+        return 'vbEmpty (uninitialized variable)'
+    if value is None:
+        return 'vbNull (value unknown)'
+    if isinstance(value, bool):
+        return 'vbBoolean'
+    if isinstance(value, int):
+        return 'vbInteger' if -32768 <= value <= 32767 else 'vbLong'
+    if isinstance(value, float):
+        return 'vbDouble'
+    if isinstance(value, list):
+        return 'vbArray'
+    return 'vbString'
+
+
+def to_string(value) -> str:
+    if value is EMPTY or value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'True' if value else 'False'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, list):
+        raise VBScriptError(13, 'Type mismatch')
+    return str(value)
+
+
+def to_number(value):
+    if value is EMPTY:
+        return 0
+    if isinstance(value, bool):
+        return -1 if value else 0
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value) if '.' in value else int(value)
+    except (TypeError, ValueError):
+        raise VBScriptError(13, 'Type mismatch') from None
+
+
+def split_statements(code: str):
+    """
+    Split code to statements on new lines and `:`, ignoring strings and comments
+    """
+    statements = []
+    for line in code.splitlines():
+        current = []
+        in_string = False
+        for char in line:
+            if char == '"':
+                in_string = not in_string
+            elif not in_string and char == "'":
+                break
+            elif not in_string and char == ':':
+                statements.append(''.join(current).strip())
+                current = []
+                continue
+            current.append(char)
+        statements.append(''.join(current).strip())
+    return [statement for statement in statements if statement]
+
+
+def is_compilation_error(number: int) -> bool:
+    return 1000 < number < 1100
+
+
+class Interpreter:
+    def __init__(self, output, token: str = ''):
+        self.output = output
+        self.token = token
+        self.variables = {}
+        self.functions = {
+            'len': lambda value: len(to_string(value)),
+            'ucase': lambda value: to_string(value).upper(),
+            'lcase': lambda value: to_string(value).lower(),
+            'cstr': to_string,
+            'clng': lambda value: int(to_number(value)),
+            'space': lambda count: ' ' * int(to_number(count)),
+            'string': lambda count, char: to_string(char)[:1] * int(to_number(count)),
+            'array': lambda *items: list(items),
+            'ubound': lambda value: len(value) - 1,
+            'typename': self._type_name,
+            'timer': lambda: time.time() % 86400,
+        }
+
+    @staticmethod
+    def _type_name(value) -> str:
+        if value is EMPTY:
+            return 'Empty'
+        if value is None:
+            return 'Null'
+        return {bool: 'Boolean', int: 'Integer', float: 'Double', str: 'String', list: 'Variant()'}[type(value)]
+
+    def echo(self, text: str):
+        self.output.write(text + '\n')
+        self.output.flush()
+
+    def execute(self, code: str) -> str:
+        try:
+            for statement in split_statements(code):
+                self._execute_statement(statement)
+        except VBScriptError as error:
+            return f'Err.Description: {error.description}.{VB_NEW_LINE}Err.Number: {error.number}'
+        return ''
+
+    def _execute_statement(self, statement: str):
+        keyword, rest = STATEMENT_REGEX.match(statement).groups()
+        keyword = keyword.lower()
+        if keyword == 'dim':
+            for name in rest.split(','):
+                self.variables.setdefault(name.strip().lower(), EMPTY)
+        elif keyword == 'wscript.echo':
+            self.echo(' '.join(to_string(value) for value in self._evaluate_list(rest)))
+        elif keyword == 'wscript.sleep':
+            time.sleep(to_number(self.evaluate(rest)) / 1000)
+        elif keyword == 'wscript.quit':
+            sys.exit(0)
+        elif keyword == 'err.raise':
+            arguments = self._evaluate_list(rest) + [EMPTY, EMPTY]
+            raise VBScriptError(int(to_number(arguments[0])), to_string(arguments[2]) or 'Unknown runtime error')
+        elif keyword == 'ointerpreter.handleinspect':
+            self.echo(self.get_object_info(self.evaluate(rest)))
+        elif keyword == 'ointerpreter.inspectpage':
+            value, offset, limit, depth, max_bytes = self._evaluate_list(rest)
+            self.echo(self.get_object_info(value, int(offset), int(limit), int(depth), [int(max_bytes)]))
+        elif keyword == 'ointerpreter.timeit':
+            code, number, repeat = self._evaluate_list(rest)
+            self.time_it(code, int(number), int(repeat))
+        elif keyword == 'ointerpreter.tryevaluate':
+            self.try_evaluate(self.evaluate(rest))
+        elif re.match(r'^[a-z_][a-z0-9_]*\s*=', statement, re.IGNORECASE):
+            name, _, expression = statement.partition('=')
+            name = name.strip().lower()
+            if name not in self.variables:
+                raise VBScriptError(500, 'Variable is undefined')
+            self.variables[name] = self.evaluate(expression)
+        else:
+            raise VBScriptError(13, 'Type mismatch')
+
+    def try_evaluate(self, code: str):
+        """
+        Echo `code`'s value if it compiles as an expression, execute it otherwise
+        """
+        try:
+            self.evaluate(code, dry_run=True)
+        except VBScriptError as error:
+            if is_compilation_error(error.number):
+                for statement in split_statements(code):
+                    self._execute_statement(statement)
+                return
+        self.write_value(self.evaluate(code))
+
+    def write_value(self, value):
+        """
+        Typed value in a value frame, like Interpreter.WriteValue
+        """
+        payload = json.dumps(self.encode_value(value), separators=(',', ':'))
+        self.output.write(f'{RECORD_SEPARATOR}{self.token}={len(payload)}\n{payload}')
+        self.output.flush()
+
+    def encode_value(self, value, depth: int = INSPECT_DEPTH):
+        if not isinstance(value, list):
+            # bare VarType names, without the descriptions inspection adds
+            return {'type': type_name(value).split(' (')[0], 'value': None if value is EMPTY else value}
+        items = [self.encode_value(item, depth - 1) for item in value[:INSPECT_LIMIT]] if depth > 0 else []
+        return {'type': 'vbArray', 'shape': [len(value)], 'items': items, 'truncated': len(items) < len(value)}
+
+    def time_it(self, code: str, number: int, repeat: int):
+        """
+        Run `code` `number` times in each of `repeat` rounds, like Interpreter.TimeIt
+        """
+        statements = split_statements(code)
+
+        def time_loop(loop_statements, count: int) -> float:
+            start = time.perf_counter()
+            for _ in range(count):
+                for statement in loop_statements:
+                    self._execute_statement(statement)
+            return time.perf_counter() - start
+
+        if number <= 0:
+            number = 1
+            while time_loop(statements, number) < 0.2 and number < 1000000000:
+                number *= 10
+        rounds = [round(max(time_loop(statements, number) - time_loop([], number), 0) * 1000000)
+                  for _ in range(repeat)]
+        self.echo(f'timeit:{number};' + ';'.join(map(str, rounds)))
+
+    def get_object_info(self, value, offset: int = 0, limit: int = INSPECT_LIMIT, depth: int = INSPECT_DEPTH,
+                        bytes_left=None) -> str:
+        """
+        :param bytes_left: single item list of the characters left in the result's budget, shared by nested calls
+        """
+        bytes_left = [INSPECT_BYTES] if bytes_left is None else bytes_left
+        if value is EMPTY or value is None:
+            return type_name(value)
+        if not isinstance(value, list):
+            return f'{type_name(value)}, Value: {to_string(value)}'
+        header = f'{type_name(value)} Len: {len(value)}'
+        bytes_left[0] -= len(header)
+        if depth <= 0 or not value:
+            return header + VB_NEW_LINE
+        lines = [header]
+        first = min(max(offset, 0), len(value))
+        for index in range(first, min(first + limit, len(value))):
+            if bytes_left[0] <= 0:
+                break
+            item = f'  {index}): {self.get_object_info(value[index], 0, limit, depth - 1, bytes_left)}'
+            bytes_left[0] -= len(item)
+            lines.append(item)
+        listed = first + len(lines) - 1
+        if listed < len(value):
+            lines.append(f'  ... {len(value) - listed} more from offset {listed}')
+        return VB_NEW_LINE.join(lines) + VB_NEW_LINE
+
+    def _evaluate_list(self, code: str):
+        if not code.strip():
+            return []
+        parser = ExpressionParser(code, self)
+        values = [parser.parse_expression()]
+        while parser.accept(','):
+            values.append(parser.parse_expression())
+        parser.expect_end()
+        return values
+
+    def evaluate(self, code: str, dry_run: bool = False):
+        """
+        :param dry_run: only check the syntax, names evaluate to 0
+        """
+        parser = ExpressionParser(code, self, dry_run)
+        value = parser.parse_expression()
+        parser.expect_end()
+        return value
+
+
+class ExpressionParser:
+    """
+    Recursive descent parser evaluating VBScript expressions while parsing
+    """
+    CONSTANTS = {'true': True, 'false': False, 'empty': EMPTY, 'null': None, 'vbnewline': VB_NEW_LINE,
+                 'vbcrlf': VB_NEW_LINE, 'vbtab': '\t'}
+
+    def __init__(self, code: str, interpreter: Interpreter, dry_run: bool = False):
+        self.interpreter = interpreter
+        self.dry_run = dry_run
+        self.tokens = []
+        position = 0
+        code = code.rstrip()
+        while position < len(code):
+            match = TOKEN_REGEX.match(code, position)
+            if not match:
+                raise VBScriptError(1002, 'Syntax error')
+            self.tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            position = match.end()
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def accept(self, operator: str) -> bool:
+        if self.peek() == ('operator', operator):
+            self.position += 1
+            return True
+        return False
+
+    def expect_end(self):
+        if self.position != len(self.tokens):
+            raise VBScriptError(1025, 'Expected end of statement')
+
+    def parse_expression(self):
+        left = self.parse_concatenation()
+        for operator in ('=', '<>', '<=', '>=', '<', '>'):
+            if self.accept(operator):
+                right = self.parse_concatenation()
+                if isinstance(left, str) or isinstance(right, str):
+                    left, right = to_string(left), to_string(right)
+                else:
+                    left, right = to_number(left), to_number(right)
+                return {'=': left == right, '<>': left != right, '<=': left <= right, '>=': left >= right,
+                        '<': left < right, '>': left > right}[operator]
+        return left
+
+    def parse_concatenation(self):
+        value = self.parse_additive()
+        while self.accept('&'):
+            value = to_string(value) + to_string(self.parse_additive())
+        return value
+
+    def parse_additive(self):
+        value = self.parse_multiplicative()
+        while True:
+            if self.accept('+'):
+                right = self.parse_multiplicative()
+                value = value + right if isinstance(value, str) and isinstance(right, str) else \
+                    to_number(value) + to_number(right)
+            elif self.accept('-'):
+                value = to_number(value) - to_number(self.parse_multiplicative())
+            else:
+                return value
+
+    def parse_multiplicative(self):
+        value = self.parse_unary()
+        while True:
+            if self.accept('*'):
+                value = to_number(value) * to_number(self.parse_unary())
+            elif self.accept('/'):
+                divisor = to_number(self.parse_unary())
+                if not divisor:
+                    raise VBScriptError(11, 'Division by zero')
+                value = to_number(value) / divisor
+            else:
+                return value
+
+    def parse_unary(self):
+        if self.accept('-'):
+            return -to_number(self.parse_unary())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind, text = self.peek()
+        self.position += 1
+        if kind == 'string':
+            return text[1:-1].replace('""', '"')
+        if kind == 'number':
+            return float(text) if '.' in text else int(text)
+        if (kind, text) == ('operator', '('):
+            value = self.parse_expression()
+            self._expect(')')
+            return value
+        if kind == 'name':
+            return self._parse_name(text.lower())
+        raise VBScriptError(1002, 'Syntax error')
+
+    def _parse_name(self, name: str):
+        if name in self.CONSTANTS:
+            return self.CONSTANTS[name]
+        arguments = None
+        if self.accept('('):
+            arguments = []
+            if not self.accept(')'):
+                arguments.append(self.parse_expression())
+                while self.accept(','):
+                    arguments.append(self.parse_expression())
+                self._expect(')')
+        if self.dry_run:
+            return 0
+        if name in self.interpreter.variables:
+            value = self.interpreter.variables[name]
+            if arguments is None:
+                return value
+            if not isinstance(value, list) or len(arguments) != 1:
+                raise VBScriptError(13, 'Type mismatch')
+            index = int(to_number(arguments[0]))
+            if not 0 <= index < len(value):
+                raise VBScriptError(9, 'Subscript out of range')
+            return value[index]
+        if name in self.interpreter.functions:
+            try:
+                return self.interpreter.functions[name](*(arguments or []))
+            except TypeError:
+                raise VBScriptError(450, 'Wrong number of arguments or invalid property assignment') from None
+        raise VBScriptError(500, 'Variable is undefined')
+
+    def _expect(self, operator: str):
+        if not self.accept(operator):
+            raise VBScriptError(1006, f"Expected '{operator}'")
+
+
+def _unescape_characters(match: re.Match) -> str:
+    units = [int(unit, 16) for unit in match.group().split('\x1b')[1:]]
+    return struct.pack(f'<{len(units)}H', *units).decode('utf-16-le', errors='surrogatepass')
+
+
+def unescape_command(code: str) -> str:
+    return ESCAPED_CHARACTERS_REGEX.sub(_unescape_characters, code)
+
+
+def read_pipe_command(stdin) -> str:
+    header = stdin.readline()
+    if not header:
+        sys.exit(0)
+    length = int(header.strip())
+    return unescape_command(stdin.read(length)) if length else ''
+
+
+def read_file_command(command_path: str) -> str:
+    while not os.path.exists(command_path):
+        time.sleep(FILE_POLL_INTERVAL)
+    with open(command_path, 'r', encoding=COMMAND_ENCODING) as command_file:
+        code = command_file.read()
+    os.remove(command_path)
+    return unescape_command(code.rstrip())
+
+
+def run(token: str, use_pipe: bool):
+    """
+    Execute commands read from stdin (pipe transport) or the command file (file transport), writing the results
+    as frames on stdout after the commands' own output
+    """
+    stdin = io.TextIOWrapper(sys.stdin.buffer, encoding=COMMAND_ENCODING, newline='')
+    # characters the code page lacks are written as "?", like cscript does
+    stdout = io.TextIOWrapper(sys.stdout.buffer, encoding=ENCODING, errors='replace', newline='',
+                              write_through=True)
+    interpreter = Interpreter(stdout, token)
+    while True:
+        code = read_pipe_command(stdin) if use_pipe else read_file_command(os.environ['IVBS_CMD_PATH'])
+        stderr = interpreter.execute(code)
+        stdout.write(f'{RECORD_SEPARATOR}{token}:{len(stderr)}\n{stderr}')
+        stdout.flush()
+
+
+def main(argv):
+    named = dict(argument[1:].partition(':')[::2] for argument in argv if argument.startswith('/'))
+    run(named['token'], use_pipe=named.get('transport', 'file') == 'pipe')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,129 @@
+"""
+Per-phase latency measurements of cell execution, aggregated into per-session histograms
+"""
+import bisect
+import math
+import statistics
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+# upper bounds (milliseconds) of the histograms' buckets - powers of two from 1/16 ms to ~1 minute
+BUCKET_BOUNDS = [2 ** exponent for exponent in range(-4, 17)]
+
+
+class PhaseTimer:
+    """
+    Monotonic timings (seconds) of the phases of one cell, a phase entered several times accumulates
+    """
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - start)
+
+    def add(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0) + seconds
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def format(self) -> str:
+        lines = [f'{name}: {format_duration(seconds)}' for name, seconds in self.timings.items()]
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 0.001:
+        return f'{seconds * 1000000:.3f} µs'
+    if seconds < 1:
+        return f'{seconds * 1000:.3f} ms'
+    return f'{seconds:.3f} s'
+
+
+class Histogram:
+    """
+    Log scale histogram of durations, keeping exact count/sum/min/max
+    """
+
+    def __init__(self):
+        # the last bucket counts everything above the last bound
+        self.buckets: List[int] = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+
+    def add(self, seconds: float):
+        milliseconds = seconds * 1000
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, milliseconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.minimum = min(self.minimum, seconds)
+        self.maximum = max(self.maximum, seconds)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Upper bound (seconds) of the bucket holding the `fraction` percentile, capped by the maximum
+        """
+        if not self.count:
+            return 0.0
+        rank = max(math.ceil(self.count * fraction), 1)
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                if index == len(BUCKET_BOUNDS):
+                    return self.maximum
+                return min(BUCKET_BOUNDS[index] / 1000, self.maximum)
+        return self.maximum
+
+
+class PhaseStats:
+    """
+    Histogram per phase over the cells of a session
+    """
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+
+    def record(self, timings: Dict[str, float]):
+        for name, seconds in timings.items():
+            self.histograms.setdefault(name, Histogram()).add(seconds)
+
+    def clear(self):
+        self.histograms.clear()
+
+    def report(self) -> str:
+        if not self.histograms:
+            return 'No cells measured yet\n'
+        header = f'{"phase":<10}{"count":>8}{"mean":>14}{"min":>14}{"p50":>14}{"p90":>14}{"p99":>14}{"max":>14}'
+        lines = [header]
+        for name, histogram in self.histograms.items():
+            values = [histogram.mean, histogram.minimum, histogram.percentile(0.5), histogram.percentile(0.9),
+                      histogram.percentile(0.99), histogram.maximum]
+            lines.append(f'{name:<10}{histogram.count:>8}' + ''.join(f'{format_duration(value):>14}'
+                                                                        for value in values))
+        return '\n'.join(lines) + '\n'
+
+
+def format_timeit(number: int, rounds: List[float]) -> str:
+    """
+    :param number: loops per round
+    :param rounds: seconds each round took
+    """
+    per_loop = [seconds / number for seconds in rounds]
+    return (f'{number} loops, best of {len(rounds)}: {format_duration(min(per_loop))} per loop '
+            f'(mean {format_duration(statistics.mean(per_loop))} '
+            f'± {format_duration(statistics.pstdev(per_loop))} std. dev.)\n')
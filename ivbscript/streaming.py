@@ -0,0 +1,57 @@
+"""
+Coalescing of incremental output into size and time bounded chunks
+"""
+import time
+from typing import Callable
+
+
+class OutputCoalescer:
+    """
+    Buffers text written to a stream and passes it on in chunks of at most `max_size` characters,
+    at most once every `interval` seconds (except for full chunks)
+    """
+
+    def __init__(self, send: Callable[[str], None], max_size: int, interval: float):
+        """
+        :param send: callable receiving each chunk
+        :param max_size: maximum chunk size in characters
+        :param interval: minimal time in seconds between two partial chunks
+        """
+        self.send = send
+        self.max_size = max_size
+        self.interval = interval
+        self._buffer = []
+        self._buffered_size = 0
+        self._last_send = float('-inf')
+
+    def write(self, text: str):
+        """
+        Buffer `text`, sending whatever is due. Call with an empty string to only send what is due
+        """
+        if text:
+            self._buffer.append(text)
+            self._buffered_size += len(text)
+        if self._buffered_size >= self.max_size:
+            data = self._take()
+            while len(data) >= self.max_size:
+                self._send(data[:self.max_size])
+                data = data[self.max_size:]
+            if data:
+                self._buffer.append(data)
+                self._buffered_size = len(data)
+        if self._buffered_size and time.monotonic() - self._last_send >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self._buffered_size:
+            self._send(self._take())
+
+    def _take(self) -> str:
+        data = ''.join(self._buffer)
+        self._buffer = []
+        self._buffered_size = 0
+        return data
+
+    def _send(self, data: str):
+        self._last_send = time.monotonic()
+        self.send(data)
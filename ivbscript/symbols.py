@@ -0,0 +1,236 @@
+"""
+Table of symbols defined by executed code, for completion and inspection without asking the interpreter
+"""
+import re
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+NAME = r'[a-z_][a-z0-9_]*'
+PROCEDURE_REGEX = re.compile(
+    rf'^(?:(?:public|private)\s+)?(?:default\s+)?(sub|function|property\s+(?:get|let|set))\s+({NAME})\s*'
+    r'(?:\((.*)\))?', re.IGNORECASE)
+END_PROCEDURE_REGEX = re.compile(r'^end\s+(sub|function|property)\b', re.IGNORECASE)
+CLASS_REGEX = re.compile(rf'^class\s+({NAME})', re.IGNORECASE)
+END_CLASS_REGEX = re.compile(r'^end\s+class\b', re.IGNORECASE)
+CONST_REGEX = re.compile(rf'^(?:(?:public|private)\s+)?const\s+(.+)', re.IGNORECASE)
+DIM_REGEX = re.compile(r'^(dim|redim(?:\s+preserve)?|public|private)\s+(.+)', re.IGNORECASE)
+SET_REGEX = re.compile(rf'^set\s+({NAME})\s*=\s*(.+)', re.IGNORECASE)
+# `Set` anywhere in a statement, as in `If ... Then Set x = ...`
+NESTED_SET_REGEX = re.compile(rf'\bset\s+({NAME})\s*=', re.IGNORECASE)
+ASSIGNMENT_REGEX = re.compile(rf'^({NAME})\s*(?:\(.*\))?\s*=', re.IGNORECASE)
+CREATE_OBJECT_REGEX = re.compile(r'^(?:wscript\.)?createobject\s*\(\s*"([^"]+)"', re.IGNORECASE)
+NEW_REGEX = re.compile(rf'^new\s+({NAME})', re.IGNORECASE)
+PARAMETER_PREFIX_REGEX = re.compile(r'^(?:(?:optional|byval|byref)\s+)+', re.IGNORECASE)
+
+
+class Symbol(NamedTuple):
+    """
+    :param kind: sub/function/property get/property let/property set/class/variable/constant/object
+    :param parameters: procedure's parameters
+    :param members: class' members
+    :param type_name: for objects - the ProgID they were created from or the class they are an instance of
+    """
+    name: str
+    kind: str
+    parameters: Tuple[str, ...] = ()
+    members: Tuple['Symbol', ...] = ()
+    type_name: Optional[str] = None
+
+    @property
+    def is_procedure(self) -> bool:
+        return self.kind in ('sub', 'function') or self.kind.startswith('property')
+
+    def signature(self) -> str:
+        title = ' '.join(word.capitalize() for word in self.kind.split())
+        if self.kind == 'variable':
+            return f'Dim {self.name}'
+        if self.kind == 'object':
+            return f'Set {self.name}' + (f' ({self.type_name})' if self.type_name else '')
+        if self.is_procedure:
+            return f'{title} {self.name}({", ".join(self.parameters)})'
+        return f'{title} {self.name}'
+
+    def describe(self) -> str:
+        lines = [self.signature()]
+        lines += [f'  {member.signature()}' for member in self.members]
+        return '\n'.join(lines)
+
+
+def split_statements(code: str) -> Iterator[str]:
+    """
+    Yield the statements of `code` - joining continued lines, splitting on `:` and dropping comments
+    """
+    logical_line = ''
+    for line in code.splitlines():
+        statement = []
+        in_string = False
+        for char in line:
+            if char == '"':
+                in_string = not in_string
+            elif not in_string and char == "'":
+                break
+            elif not in_string and char == ':':
+                yield from _complete_statement(logical_line + ''.join(statement))
+                logical_line = ''
+                statement = []
+                continue
+            statement.append(char)
+        text = ''.join(statement).rstrip()
+        if text.endswith('_') and not in_string:
+            logical_line += text[:-1] + ' '
+            continue
+        yield from _complete_statement(logical_line + text)
+        logical_line = ''
+    yield from _complete_statement(logical_line)
+
+
+def _complete_statement(statement: str) -> Iterator[str]:
+    statement = statement.strip()
+    if statement and not re.match(r'^rem(\s|$)', statement, re.IGNORECASE):
+        yield statement
+
+
+def _split_names(declaration: str) -> List[str]:
+    """
+    Names declared by `a, b(10), c` ignoring array bounds
+    """
+    names = []
+    depth = 0
+    current = []
+    for char in declaration + ',':
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and not depth:
+            name = ''.join(current).strip()
+            if re.fullmatch(NAME, name, re.IGNORECASE):
+                names.append(name)
+            current = []
+            continue
+        elif not depth:
+            current.append(char)
+    return names
+
+
+def _parameters(parameter_list: Optional[str]) -> Tuple[str, ...]:
+    if not parameter_list:
+        return ()
+    parameters = []
+    for parameter in parameter_list.split(','):
+        parameter = PARAMETER_PREFIX_REGEX.sub('', parameter.strip())
+        if parameter:
+            parameters.append(parameter)
+    return tuple(parameters)
+
+
+class SymbolTable:
+    """
+    Global symbols (procedures, classes, variables, constants) defined by executed code
+    """
+
+    def __init__(self):
+        self.symbols: Dict[str, Symbol] = {}
+
+    def update(self, code: str) -> List[Symbol]:
+        """
+        Record the global symbols defined by `code`
+
+        :return: symbols recorded
+        """
+        found = []
+        current_class = None
+        class_members = []
+        procedure_depth = 0
+        for statement in split_statements(code):
+            procedure = PROCEDURE_REGEX.match(statement)
+            if procedure:
+                kind = ' '.join(procedure.group(1).lower().split())
+                symbol = Symbol(procedure.group(2), kind, _parameters(procedure.group(3)))
+                (class_members if current_class else found).append(symbol)
+                if not re.search(r'\bend\s+(sub|function|property)\s*$', statement, re.IGNORECASE):
+                    procedure_depth += 1
+                continue
+            if END_PROCEDURE_REGEX.match(statement):
+                procedure_depth = max(procedure_depth - 1, 0)
+                continue
+            if procedure_depth:
+                found.extend(self._rebound_objects(statement, found))
+                continue
+            class_match = CLASS_REGEX.match(statement)
+            if class_match:
+                current_class = class_match.group(1)
+                class_members = []
+                continue
+            if END_CLASS_REGEX.match(statement):
+                if current_class:
+                    found.append(Symbol(current_class, 'class', members=tuple(class_members)))
+                current_class = None
+                continue
+            symbols = self._parse_declaration(statement)
+            (class_members if current_class else found).extend(symbols)
+            if not symbols and not current_class:
+                found.extend(self._rebound_objects(statement, found))
+        for symbol in found:
+            self.symbols[symbol.name.lower()] = symbol
+        return found
+
+    def _rebound_objects(self, statement: str, found: List[Symbol]) -> List[Symbol]:
+        """
+        Objects `statement` may `Set` to another object - conditionally, or whenever the procedure it is in runs.
+        Their type is no longer known
+
+        :param found: symbols recorded so far by the code `statement` is in
+        """
+        rebound = []
+        for set_match in NESTED_SET_REGEX.finditer(statement):
+            name = set_match.group(1).lower()
+            symbol = next((symbol for symbol in reversed(found) if symbol.name.lower() == name), None) or self.get(name)
+            if symbol and symbol.kind == 'object' and symbol.type_name:
+                rebound.append(Symbol(symbol.name, 'object'))
+        return rebound
+
+    def _parse_declaration(self, statement: str) -> List[Symbol]:
+        const = CONST_REGEX.match(statement)
+        if const:
+            return [Symbol(name, 'constant') for name in _split_names(re.sub(r'=[^,]*', '', const.group(1)))]
+        dim = DIM_REGEX.match(statement)
+        if dim:
+            return [self.symbols.get(name.lower()) or Symbol(name, 'variable') for name in _split_names(dim.group(2))]
+        set_match = SET_REGEX.match(statement)
+        if set_match:
+            value = set_match.group(2).strip()
+            type_match = CREATE_OBJECT_REGEX.match(value) or NEW_REGEX.match(value)
+            return [Symbol(set_match.group(1), 'object', type_name=type_match.group(1) if type_match else None)]
+        assignment = ASSIGNMENT_REGEX.match(statement)
+        if assignment:
+            existing = self.symbols.get(assignment.group(1).lower())
+            if existing and existing.kind != 'object':
+                return [existing]
+            return [Symbol(assignment.group(1), 'variable')]
+        return []
+
+    def get(self, name: str) -> Optional[Symbol]:
+        return self.symbols.get(name.lower())
+
+    def members(self, name: str) -> Tuple[Symbol, ...]:
+        """
+        Members of the class `name` is an instance of (if known)
+        """
+        symbol = self.get(name)
+        if symbol and symbol.type_name:
+            class_symbol = self.get(symbol.type_name)
+            if class_symbol and class_symbol.kind == 'class':
+                return class_symbol.members
+        return ()
+
+    def subs(self) -> Set[str]:
+        """
+        Lower case names of the subs defined
+        """
+        return {name for name, symbol in self.symbols.items() if symbol.kind == 'sub'}
+
+    def names(self) -> List[str]:
+        return [symbol.name for symbol in self.symbols.values()]
+
+    def clear(self):
+        self.symbols.clear()
@@ -0,0 +1,250 @@
+"""
+Single pass block balance checking of VBScript code, for is_complete requests
+"""
+import re
+from typing import Container, List, NamedTuple, Tuple
+
+TOKEN_REGEX = re.compile(r'"[^"]*"?|\'.*|\.\s*[a-z_]\w*|[a-z_]\w*|:|\S', re.IGNORECASE)
+# `end <block>` closes the block it names
+END_BLOCKS = {'sub': 'sub', 'function': 'function', 'property': 'property', 'if': 'if', 'select': 'select',
+              'with': 'with', 'class': 'class'}
+# keywords closing the block they map to
+CLOSING_KEYWORDS = {'next': 'for', 'loop': 'do', 'wend': 'while'}
+# keywords opening a block named after them, followed by a name that should not be interpreted
+NAMED_BLOCKS = ('sub', 'function', 'class')
+# keywords whose next word is not a block keyword - `Exit For`, `Resume Next`
+SKIP_NEXT_KEYWORDS = ('exit', 'resume')
+
+
+class BlockState(NamedTuple):
+    """
+    :param blocks: open blocks, innermost last
+    :param pending: tokens of a statement continued (`_`) on the next line
+    :param invalid: a block was closed without being opened
+    """
+    blocks: Tuple[str, ...] = ()
+    pending: Tuple[str, ...] = ()
+    invalid: bool = False
+
+    @property
+    def depth(self) -> int:
+        return len(self.blocks)
+
+
+def _tokenize(line: str) -> List[str]:
+    """
+    Lower case tokens of `line` - strings are kept as `"`, comments are dropped
+    """
+    tokens = []
+    for token in TOKEN_REGEX.findall(line):
+        if token[0] == "'":
+            break
+        if token[0] == '"':
+            tokens.append('"')
+            continue
+        token = token.lower()
+        if token == 'rem' and (not tokens or tokens[-1] == ':'):
+            break
+        tokens.append(token)
+    return tokens
+
+
+def _statements(tokens: List[str]) -> List[List[str]]:
+    statements = [[]]
+    for token in tokens:
+        if token == ':':
+            statements.append([])
+        else:
+            statements[-1].append(token)
+    return statements
+
+
+def _close(blocks: List[str], block: str) -> bool:
+    if blocks and blocks[-1] == block:
+        blocks.pop()
+        return True
+    return False
+
+
+def _apply_statement(blocks: List[str], statement: List[str]) -> bool:
+    """
+    Update `blocks` with the blocks opened/closed by `statement`
+
+    :return: False if a block was closed without being opened
+    """
+    valid = True
+    index = 0
+    while index < len(statement):
+        word = statement[index]
+        following = statement[index + 1] if index + 1 < len(statement) else None
+        if word == 'end' and following in END_BLOCKS:
+            valid &= _close(blocks, END_BLOCKS[following])
+            index += 1
+        elif word in SKIP_NEXT_KEYWORDS:
+            index += 1
+        elif word in CLOSING_KEYWORDS:
+            valid &= _close(blocks, CLOSING_KEYWORDS[word])
+        elif word in NAMED_BLOCKS:
+            blocks.append(word)
+            index += 1
+        elif word == 'property' and following in ('get', 'let', 'set'):
+            blocks.append('property')
+            index += 2
+        elif word == 'select' and following == 'case':
+            blocks.append('select')
+            index += 1
+        elif word in ('for', 'do', 'with'):
+            blocks.append(word)
+        elif word == 'while' and (index == 0 or statement[index - 1] not in ('do', 'loop')):
+            blocks.append('while')
+        elif word == 'if':
+            # a block only if nothing follows `then`, otherwise a single line `If`
+            if statement[-1] == 'then':
+                blocks.append('if')
+                break
+        index += 1
+    return valid
+
+
+def advance(state: BlockState, line: str) -> BlockState:
+    """
+    State after the physical line `line`
+    """
+    tokens = _tokenize(line)
+    if tokens and tokens[-1] == '_':
+        return state._replace(pending=state.pending + tuple(tokens[:-1]))
+    blocks = list(state.blocks)
+    valid = not state.invalid
+    for statement in _statements(list(state.pending) + tokens):
+        valid &= _apply_statement(blocks, statement)
+    return BlockState(tuple(blocks), (), not valid)
+
+
+class BlockChecker:
+    """
+    Checks block balance of code that grows between calls (console input), re-scanning only changed lines
+    """
+
+    def __init__(self):
+        self._code = ''
+        # _offsets[i] - where line i of _code starts, _states[i] - state before it
+        self._offsets: List[int] = [0]
+        self._states: List[BlockState] = [BlockState()]
+
+    def _line_unchanged(self, code: str, index: int) -> bool:
+        """
+        Whether `code` has line `index` of the previously checked code at the same offset
+        """
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return code.startswith(self._code[start:end], start)
+
+    def _reusable_line(self, code: str) -> int:
+        """
+        Index of the last cached line starting after a prefix `code` shares with the previously checked code.
+        Console input changes at its end - when the last cached line is unchanged the lines before it are taken to
+        be unchanged as well, without comparing them
+        """
+        last = len(self._offsets) - 1
+        if not last or self._line_unchanged(code, last - 1):
+            return last
+        low, high = 0, len(self._offsets) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if code.startswith(self._code[:self._offsets[middle]]):
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def check(self, code: str) -> BlockState:
+        line_index = self._reusable_line(code)
+        del self._offsets[line_index + 1:]
+        del self._states[line_index + 1:]
+        offset = self._offsets[-1]
+        state = self._states[-1]
+        for line in code[offset:].splitlines(keepends=True):
+            state = advance(state, line)
+            offset += len(line)
+            if line.endswith(('\n', '\r')):
+                # only terminated lines are cached, the last one may still change
+                self._offsets.append(offset)
+                self._states.append(state)
+        self._code = code
+        return state
+
+
+# keywords only starting statements
+STATEMENT_KEYWORDS = {'call', 'class', 'const', 'dim', 'do', 'end', 'erase', 'execute', 'executeglobal', 'exit',
+                      'for', 'function', 'if', 'loop', 'next', 'on', 'option', 'private', 'property', 'public',
+                      'randomize', 'redim', 'rem', 'select', 'set', 'stop', 'sub', 'wend', 'while', 'with'}
+# keywords continuing an expression after a name - `x Mod 2` is not a call of `x`
+OPERATOR_KEYWORDS = {'and', 'eqv', 'imp', 'is', 'mod', 'or', 'xor'}
+# keywords starting expressions
+EXPRESSION_KEYWORDS = {'new', 'not'}
+# intrinsic methods returning nothing - called without arguments they are statements, unlike `obj.Count`
+VOID_MEMBERS = {'err.clear', 'err.raise', 'wscript.echo', 'wscript.quit', 'wscript.sleep'}
+# `target (argument)` - a space before the parentheses makes them part of the first argument of a call
+SPACED_PARENTHESES_REGEX = re.compile(r'^\s*[a-z_][\w.]*\s+\(', re.IGNORECASE)
+
+
+def _is_name(token: str) -> bool:
+    return token[0].isalpha() or token[0] == '_'
+
+
+def is_statement(code: str, subs: Container[str] = ()) -> bool:
+    """
+    Whether `code` can only run as statements - False if it may be an expression worth echoing
+
+    :param subs: lower case names of subs known to be defined, calling them without arguments is a statement
+    """
+    lines = [line for line in code.splitlines() if line.strip()]
+    if len(lines) != 1:
+        return True
+    tokens = _tokenize(lines[0])
+    if not tokens or ':' in tokens or tokens[-1] == '_' or tokens[0] in STATEMENT_KEYWORDS:
+        return True
+    if not _is_name(tokens[0]) or tokens[0] in EXPRESSION_KEYWORDS:
+        return False
+    # skip the `name.member(arguments).member` target
+    index = 1
+    depth = 0
+    while index < len(tokens) and (depth or tokens[index][0] in '.(' or tokens[index] == ')'):
+        depth += {'(': 1, ')': -1}.get(tokens[index], 0)
+        index += 1
+    target = ''.join(token.replace(' ', '') for token in tokens[:index])
+    # a sub returns nothing, a member may be a method taking the rest of the line as arguments
+    callable_target = tokens[0] in subs or '.' in target
+    if index == len(tokens):
+        return (tokens[0] in subs and index == 1) or target in VOID_MEMBERS or (
+            callable_target and bool(SPACED_PARENTHESES_REGEX.match(lines[0])))
+    following = tokens[index]
+    if following in ('=', ','):
+        return True
+    if callable_target and (following == '-' or SPACED_PARENTHESES_REGEX.match(lines[0])):
+        return True
+    # `name argument` calls a sub, `name + 1`/`name Mod 2` is an expression
+    return following == '"' or following[0].isdigit() or (_is_name(following)
+                                                           and following not in OPERATOR_KEYWORDS)
+
+
+def strip_comment(line: str) -> str:
+    """
+    `line` without its trailing `'` comment - quotes inside string literals are kept
+    """
+    for token in TOKEN_REGEX.finditer(line):
+        if token.group()[0] == "'":
+            return line[:token.start()]
+    return line
+
+
+def interpreter_command(code: str, subs: Container[str] = ()) -> str:
+    """
+    Command running `code` in the interpreter - expressions are sent to `TryEvaluate` to have their value echoed,
+    the interpreter falls back to executing them in the same round trip
+
+    :param subs: lower case names of subs known to be defined, see `is_statement`
+    """
+    if is_statement(code, subs):
+        return code
+    escaped = strip_comment(code.strip()).rstrip().replace('"', '""')
+    return f'oInterpreter.TryEvaluate "{escaped}"'
@@ -0,0 +1,117 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+import pytest
+
+from ..backends import (BACKENDS, CScriptBackend, InterpreterNotFound,
+                        InterpreterStandby, StandInBackend,
+                        sweep_runtime_data)
+
+
+class TestBackends:
+    backend = None
+
+    def setup_method(self, method):
+        self.runtime_data_dir = tempfile.mkdtemp()
+
+    def teardown_method(self, method):
+        if self.backend:
+            self.backend.terminate(timeout=5)
+        shutil.rmtree(self.runtime_data_dir)
+
+    def test_registry(self):
+        assert BACKENDS['cscript'] is CScriptBackend
+        assert BACKENDS['stand-in'] is StandInBackend
+
+    def test_cscript_not_found(self):
+        backend = CScriptBackend(self.runtime_data_dir, 1)
+        with mock.patch('ivbscript.backends.shutil.which', return_value=None):
+            with pytest.raises(InterpreterNotFound):
+                backend.spawn()
+
+    @pytest.mark.parametrize("transport", ['pipe', 'file'])
+    def test_stand_in_lifecycle(self, transport: str):
+        self.backend = StandInBackend(self.runtime_data_dir, 1, transport=transport)
+        assert not self.backend.is_running()
+        self.backend.spawn()
+        assert self.backend.is_running()
+        self.backend.send('WScript.Echo 1 + 1')
+        assert self.backend.wait_result(timeout=10) == ''
+        assert self.backend.read_output() == '2\n'
+        process = self.backend.process
+        self.backend.terminate(timeout=5)
+        assert process.poll() is not None
+        assert not self.backend.is_running()
+
+    def test_stand_in_values(self):
+        self.backend = StandInBackend(self.runtime_data_dir, 1)
+        self.backend.spawn()
+        self.backend.send('Dim e: oInterpreter.TryEvaluate "e"')
+        assert self.backend.wait_result(timeout=10) == ''
+        assert [json.loads(value) for value in self.backend.read_values()] == [{'type': 'vbEmpty', 'value': None}]
+
+    def test_sweep_runtime_data(self):
+        dead_pid = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], check=True,
+                                  capture_output=True, text=True).stdout.strip()
+        names = [f'ivbscript-{dead_pid}-abc', f'ivbscript-{os.getpid()}-def', 'ivbscript-batch-ghi', 'notes']
+        for name in names:
+            os.mkdir(os.path.join(self.runtime_data_dir, name))
+            with open(os.path.join(self.runtime_data_dir, name, '0.log'), 'w'):
+                pass
+        sweep_runtime_data(self.runtime_data_dir)
+        assert sorted(os.listdir(self.runtime_data_dir)) == sorted(names[1:])
+
+    def test_terminate_kills_hung_interpreter(self):
+        self.backend = StandInBackend(self.runtime_data_dir, 1)
+        self.backend.spawn()
+        self.backend.send('WScript.Sleep 60000')
+        process = self.backend.process
+        self.backend.terminate(timeout=0.1)
+        assert process.poll() is not None
+
+
+class TestInterpreterStandby:
+    standby = None
+
+    def setup_method(self, method):
+        self.runtime_data_dir = tempfile.mkdtemp()
+        self.created = []
+        self.standby = InterpreterStandby(self.create, timeout=5)
+
+    def teardown_method(self, method):
+        self.standby.close()
+        for interpreter in self.created:
+            interpreter.terminate(timeout=5)
+        shutil.rmtree(self.runtime_data_dir)
+
+    def create(self) -> StandInBackend:
+        self.created.append(StandInBackend(self.runtime_data_dir, len(self.created)))
+        return self.created[-1]
+
+    def test_take_replenishes(self):
+        self.standby.replenish()
+        interpreter = self.standby.take()
+        assert interpreter is self.created[0] and interpreter.is_running()
+        replacement = self.standby.take()
+        assert replacement is self.created[1] and replacement.is_running()
+        self.standby.close()
+        assert len(self.created) == 3 and not self.created[2].is_running(), 'standby should be terminated'
+
+    def test_take_without_standby(self):
+        with mock.patch.object(StandInBackend, 'spawn', side_effect=[OSError('spawn failed'), None, None]):
+            self.standby.replenish()
+            self.standby.take()
+            self.standby.close()
+        assert len(self.created) == 3, 'failed standby should be replaced by a synchronous spawn'
+
+    def test_retire(self):
+        interpreter = self.standby.take()
+        process = interpreter.process
+        self.standby.retire(interpreter)
+        self.standby.close()
+        assert process.poll() is not None
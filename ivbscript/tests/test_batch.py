@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import pytest
+
+from ..batch import BatchRunner, main, read_cells
+
+
+class TestBatch:
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.runner = BatchRunner(2, backend='stand-in')
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def write(self, name: str, content: str) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as code_file:
+            code_file.write(content)
+        return path
+
+    def write_notebook(self, name: str, cells) -> str:
+        notebook = {'cells': [{'cell_type': cell_type, 'source': source} for cell_type, source in cells],
+                    'metadata': {}, 'nbformat': 4, 'nbformat_minor': 4}
+        return self.write(name, json.dumps(notebook))
+
+    def test_read_cells(self):
+        script = self.write('a.vbs', 'WScript.Echo 1\n')
+        notebook = self.write_notebook('b.ipynb', [('code', ['Dim x\n', 'x = 1']), ('markdown', '# x'),
+                                                   ('code', 'x')])
+        assert read_cells(script) == ['WScript.Echo 1\n']
+        assert read_cells(notebook) == ['Dim x\nx = 1', 'x']
+
+    def test_run_isolated(self):
+        first = self.write('first.vbs', 'Dim x\nx = 5\nWScript.Echo x\n')
+        second = self.write('second.vbs', 'WScript.Echo "[" & x & "]"\n')
+        notebook = self.write_notebook('notebook.ipynb', [('code', 'Dim y: y = 2'), ('code', '%time y'),
+                                                          ('code', 'y * 3')])
+        report = self.runner.run([first, second, notebook])
+        assert report['failed'] == 1 and report['workers'] == 2
+        first_result, second_result, notebook_result = report['jobs']
+        assert first_result['path'] == first and first_result['stdout'] == '5\n'
+        assert 'Variable is undefined' in second_result['stderr'], 'jobs should not share interpreter state'
+        assert [cell['status'] for cell in notebook_result['cells']] == ['ok', 'skipped', 'ok']
+        assert notebook_result['stdout'] == ''
+        assert notebook_result['values'] == [{'type': 'vbInteger', 'value': 6}]
+        assert set(notebook_result['timings']) == {'send', 'wait', 'output'}
+
+    def test_import(self):
+        library = self.write('library.vbs', 'Dim shared: shared = 7\n')
+        notebook = self.write_notebook('notebook.ipynb', [('code', f'%import {library}'), ('code', f'%import {library}'),
+                                                          ('code', 'WScript.Echo shared')])
+        result = self.runner.run([notebook])['jobs'][0]
+        assert [cell['status'] for cell in result['cells']] == ['ok', 'ok', 'ok']
+        assert result['stdout'] == '7\n'
+
+    def test_file(self):
+        script = self.write('script.vbs', 'Dim shown: shown = 3\n')
+        notebook = self.write_notebook('notebook.ipynb', [('code', f'%file {script}'), ('code', 'WScript.Echo shown'),
+                                                          ('code', '%file'), ('code', 'WScript.Echo 1')])
+        result = self.runner.run([notebook])['jobs'][0]
+        assert [cell['status'] for cell in result['cells']] == ['ok', 'ok', 'error']
+        assert result['stdout'] == '3\n' and result['stderr'] == 'Usage: %file <file_path>'
+
+    def test_script_encoding(self):
+        # scripts are ANSI files on Windows, not UTF-8
+        path = os.path.join(self.directory, 'ansi.vbs')
+        with open(path, 'w', encoding='cp1252') as code_file:
+            code_file.write('Dim s: s = "caf\u00e9"\nWScript.Echo Len(s)\n')
+        with mock.patch('ivbscript.batch.ENCODING', 'cp1252'):
+            assert read_cells(path) == ['Dim s: s = "caf\u00e9"\nWScript.Echo Len(s)\n']
+            result = self.runner.run([path])['jobs'][0]
+        assert result['status'] == 'ok' and result['stdout'] == '4\n'
+
+    def test_run_stops_at_error(self):
+        notebook = self.write_notebook('notebook.ipynb', [('code', 'Err.Raise 5'), ('code', 'WScript.Echo 1')])
+        missing = os.path.join(self.directory, 'missing.vbs')
+        report = self.runner.run([notebook, missing])
+        assert report['failed'] == 2
+        notebook_result, missing_result = report['jobs']
+        assert notebook_result['status'] == 'error' and len(notebook_result['cells']) == 1
+        assert 'FileNotFoundError' in missing_result['stderr']
+
+    def test_not_a_notebook(self):
+        broken = self.write('broken.ipynb', '[]')
+        script = self.write('a.vbs', 'WScript.Echo 1\n')
+        with pytest.raises(ValueError):
+            read_cells(broken)
+        broken_result, script_result = self.runner.run([broken, script])['jobs']
+        assert broken_result['status'] == 'error' and 'ValueError' in broken_result['stderr']
+        assert script_result['status'] == 'ok' and script_result['stdout'] == '1\n'
+
+    def test_unexpected_job_error(self):
+        script = self.write('a.vbs', 'WScript.Echo 1\n')
+        with mock.patch('ivbscript.batch.read_cells', side_effect=[RuntimeError('broken'), ['WScript.Echo 2']]):
+            self.runner.workers = 1
+            report = self.runner.run([script, script])
+        broken_result, script_result = report['jobs']
+        assert report['failed'] == 1
+        assert broken_result['status'] == 'error' and 'RuntimeError: broken' in broken_result['stderr']
+        assert script_result['stdout'] == '2\n'
+
+    def test_timeout(self):
+        self.runner.timeout = 0.5
+        hung = self.write('hung.vbs', 'WScript.Sleep 60000\n')
+        after = self.write('after.vbs', 'WScript.Echo 1\n')
+        self.runner.workers = 1
+        report = self.runner.run([hung, after])
+        hung_result, after_result = report['jobs']
+        assert hung_result['status'] == 'timeout' and 'TimeoutError' in hung_result['stderr']
+        assert after_result['status'] == 'ok' and after_result['stdout'] == '1\n'
+
+    def test_main(self, capsys):
+        script = self.write('a.vbs', 'WScript.Echo 1 + 1\n')
+        report_path = os.path.join(self.directory, 'report.json')
+        assert main(['--backend', 'stand-in', '-j', '1', '-o', report_path, script]) == 0
+        with open(report_path, 'r', encoding='utf-8') as report_file:
+            assert json.load(report_file)['jobs'][0]['stdout'] == '2\n'
+        failing = self.write('b.vbs', 'Err.Raise 5\n')
+        assert main(['--backend', 'stand-in', failing]) == 1
+        assert json.loads(capsys.readouterr().out)['failed'] == 1
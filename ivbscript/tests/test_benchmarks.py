@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from benchmarks import harness
+
+
+class TestBenchmarks:
+    def setup_method(self, method):
+        self.calls = 0
+
+    def call(self):
+        self.calls += 1
+
+    def test_measure(self):
+        result = harness.measure(self.call, rounds=3, round_time=0.001)
+        assert result['number'] in [factor * 10 ** magnitude for magnitude in range(8) for factor in harness.NUMBERS]
+        assert self.calls >= result['number'] * 4
+        assert 0 < result['min'] <= result['seconds']
+        assert result['ops_per_second'] == pytest.approx(1 / result['seconds'])
+
+    @pytest.mark.parametrize("current,verdict", [(1.0, 'ok'), (1.4, 'ok'), (1.6, 'regressed'), (0.6, 'improved')])
+    def test_compare(self, current: float, verdict: str):
+        baseline = {'benchmarks': {'bench': {'seconds': 1.2, 'min': 1.0, 'threshold': 1.5}}}
+        [row] = harness.compare({'bench': {'seconds': current * 1.2, 'min': current}}, baseline)
+        assert (row['verdict'], row['ratio']) == (verdict, pytest.approx(current))
+        assert harness.compare({'other': {'seconds': 1.0, 'min': 1.0}}, baseline)[0]['verdict'] == 'new'
+
+    def test_main(self, tmp_path):
+        baseline_path = str(tmp_path / 'baseline.json')
+        output_path = str(tmp_path / 'results.json')
+        arguments = ['-k', r'^is_statement\[statement\]$', '--rounds', '1', '--baseline', baseline_path]
+        assert harness.main(arguments + ['--save']) == 0
+        with open(baseline_path, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        assert list(baseline['benchmarks']) == ['is_statement[statement]']
+        assert baseline['benchmarks']['is_statement[statement]']['threshold'] == harness.DEFAULT_THRESHOLD
+
+        baseline['benchmarks']['is_statement[statement]']['min'] /= 1000
+        with open(baseline_path, 'w', encoding='utf-8') as baseline_file:
+            json.dump(baseline, baseline_file)
+        assert harness.main(arguments + ['-o', output_path]) == 1
+        with open(output_path, 'r', encoding='utf-8') as output_file:
+            assert json.load(output_file)['comparison'][0]['verdict'] == 'regressed'
+
+    def test_registered(self):
+        harness.load()
+        for name in ['do_complete', 'do_is_complete[5000]', 'is_statement', 'history.append[1000000]',
+                     'history.tail[1000]', 'do_execute']:
+            assert any(registered == name or registered.startswith(f'{name}[') for registered in harness.BENCHMARKS)
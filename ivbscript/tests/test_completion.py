@@ -0,0 +1,66 @@
+import pytest
+
+from ..completion import CompletionIndex, Vocabulary
+
+
+class TestCompletionIndex:
+    index = None
+
+    def setup_method(self, method):
+        self.index = CompletionIndex()
+        self.index.set_vocabulary('builtins', ['vbNewLine', 'vbNull', 'ByRef', 'ByVal', 'End', 'Each', 'vbNullString'])
+
+    @pytest.mark.parametrize("prefix,expected", [
+        ('vbNu', ['vbNull', 'vbNullString']),
+        ('VBNU', ['vbNull', 'vbNullString']),
+        ('b', ['ByRef', 'ByVal']),
+        ('x', []),
+        ('e', ['End', 'Each']),
+        ('E', ['End', 'Each']),
+    ])
+    def test_complete(self, prefix: str, expected):
+        assert self.index.complete(prefix) == expected
+
+    def test_exact_case_ranked_first(self):
+        self.index.set_vocabulary('session', ['endCount', 'Endpoint'])
+        assert self.index.complete('end') == ['endCount', 'End', 'Endpoint']
+        assert self.index.complete('End') == ['End', 'Endpoint', 'endCount']
+
+    def test_max_results(self):
+        assert self.index.complete('', max_results=2) == ['End', 'Each']
+        self.index.max_results = 3
+        assert len(self.index.complete('')) == 3
+
+    def test_vocabularies(self):
+        self.index.add_words('session', ['myVar', 'myVar', 'MyVar'])
+        self.index.add_words('session', ['mySub'])
+        assert self.index.complete('my') == ['mySub', 'myVar', 'MyVar']
+        self.index.vocabularies['session'].discard('myVar')
+        assert self.index.complete('my') == ['mySub', 'MyVar']
+        self.index.add_words('builtins', ['mySub'])
+        assert self.index.complete('mys') == ['mySub']
+        self.index.remove_vocabulary('session')
+        assert self.index.complete('my') == ['mySub']
+
+    @pytest.mark.parametrize("sort_limit", [0, 256])
+    def test_large_vocabularies(self, sort_limit: int):
+        words = [f'{first}{middle}{index}' for index in range(300) for first, middle in (('w', 'ork'), ('W', 'ORK'))]
+        self.index.set_vocabulary('session', words)
+        self.index.vocabularies['session'].SORT_LIMIT = sort_limit
+        self.index.add_words('session', ['Wx'])
+        self.index.vocabularies['session'].discard('work0')
+        every_word = {word for vocabulary in self.index.vocabularies.values() for _, word in vocabulary.entries}
+        for prefix in ['', 'w', 'W', 'WORK1', 'e']:
+            ranked = sorted((word for word in every_word if word.lower().startswith(prefix.lower())),
+                            key=lambda word: (not word.startswith(prefix), len(word), word.lower(), word))
+            assert self.index.complete(prefix, max_results=50) == ranked[:50]
+            assert self.index.complete(prefix) == ranked
+
+    def test_vocabulary_sorted(self):
+        vocabulary = Vocabulary(['b', 'C', 'a'])
+        vocabulary.add('B')
+        vocabulary.discard('C')
+        assert vocabulary.entries == sorted(vocabulary.entries)
+        assert vocabulary.by_length == sorted((len(word), lower, word) for lower, word in vocabulary.entries)
+        assert list(vocabulary.starting_with('b')) == ['B', 'b']
+        assert len(vocabulary) == 3
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from typing import List
+from unittest import mock
+
+from ..kernel import VBScriptKernel
+
+# kernels running side by side in the process, each with its own stand-in interpreter and standby
+KERNELS = 24
+CELLS = 5
+
+
+class TestDensity:
+    def setup_method(self, method):
+        self.runtime_dir = tempfile.mkdtemp()
+        self.history_dir = tempfile.mkdtemp()
+        self.history_path = os.path.join(self.history_dir, 'history.db')
+        self.kernels: List[VBScriptKernel] = []
+
+    def teardown_method(self, method):
+        for kernel in self.kernels:
+            kernel.do_shutdown(False)
+        shutil.rmtree(self.runtime_dir)
+        shutil.rmtree(self.history_dir)
+
+    def run_kernel(self, number: int, outputs: List, errors: List):
+        try:
+            kernel = self.kernels[number]
+            texts = []
+            for cell in range(CELLS):
+                with mock.patch.object(kernel, 'send_response') as send_response_mock:
+                    reply = asyncio.run(kernel.do_execute(f'WScript.Echo "{number}:{cell}"', silent=False))
+                assert reply['status'] == 'ok'
+                texts += [call.args[2]['text'] for call in send_response_mock.call_args_list]
+            outputs[number] = ''.join(texts)
+        except Exception as exception:  # pylint: disable=broad-except
+            errors.append(exception)
+
+    def test_kernels_share_host(self):
+        cwd = os.getcwd()
+        with mock.patch.multiple(VBScriptKernel, BACKEND='stand-in', RUNTIME_DIR=self.runtime_dir,
+                                 get_history_path=mock.MagicMock(return_value=self.history_path)):
+            self.kernels = [VBScriptKernel() for _ in range(KERNELS)]
+        assert os.getcwd() == cwd
+        runtime_data_dirs = {kernel._runtime_data_dir for kernel in self.kernels}
+        assert len(runtime_data_dirs) == KERNELS
+        assert all(os.path.dirname(path) == self.runtime_dir for path in runtime_data_dirs)
+
+        outputs = [None] * KERNELS
+        errors = []
+        threads = [threading.Thread(target=self.run_kernel, args=(number, outputs, errors))
+                   for number in range(KERNELS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert outputs == [''.join(f'{number}:{cell}\n' for cell in range(CELLS)) for number in range(KERNELS)]
+
+        for kernel in self.kernels:
+            kernel.do_shutdown(False)
+        self.kernels = []
+        assert os.listdir(self.runtime_dir) == []
+        with sqlite3.connect(self.history_path) as history_db:
+            assert history_db.execute('SELECT COUNT(*) FROM history').fetchone()[0] == KERNELS * CELLS
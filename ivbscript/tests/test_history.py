@@ -1,3 +1,6 @@
+import sqlite3
+import threading
+import time
 from unittest import mock
 
 import pytest
@@ -52,3 +55,262 @@ class TestHistory:
             with pytest.raises(FailedGenerateSessionId):
                 self.history.connect()
             assert is_session_exists_mock.call_count != self.history.MAX_SESSION_ID_GENERATE_TRIES + 1
+
+
+class TestHistoryWriteBehind(TestHistory):
+
+    def setup_method(self, method):
+        in_memory_path = ":memory:"
+        self.history = HistoryManager(in_memory_path, write_behind=True, queue_size=4)
+
+    def test_batched_writes(self):
+        entries = 100
+        self.history = HistoryManager(":memory:", write_behind=True, queue_size=entries)
+        self.history.connect()
+        with mock.patch.object(self.history, '_insert', wraps=self.history._insert) as insert_mock:
+            # the writer waits for the lock to insert, entries queue up meanwhile
+            with self.history._lock:
+                for i in range(entries):
+                    self.history.append(i, f'code #{i}')
+            self.history.flush()
+        assert insert_mock.call_count <= 2, 'queued entries should be inserted in one batch'
+        assert self.history.tail(1000) == [(self.history.session_id, i, f'code #{i}') for i in range(entries)]
+
+    def test_flush_on_disconnect(self, tmp_path):
+        history_path = str(tmp_path / 'history.db')
+        self.history = HistoryManager(history_path, write_behind=True)
+        self.history.connect()
+        session_id = self.history.session_id
+        for i in range(10):
+            self.history.append(i, f'code #{i}')
+        self.history.disconnect()
+        reader = HistoryManager(history_path)
+        reader.connect()
+        try:
+            assert reader.tail(100) == [(session_id, i, f'code #{i}') for i in range(10)]
+        finally:
+            reader.disconnect()
+
+    def test_write_error_raised_on_flush(self):
+        self.history.connect()
+        with mock.patch.object(self.history, '_insert', side_effect=sqlite3.OperationalError('database is locked')):
+            self.history.append(1, 'code')
+            with pytest.raises(sqlite3.OperationalError):
+                self.history.flush()
+        self.history.flush()
+
+
+class TestHistoryQueries:
+    history = None
+
+    def setup_method(self, method):
+        self.history = HistoryManager(":memory:")
+        self.history.connect()
+
+    def teardown_method(self, method):
+        self.history.disconnect()
+
+    def new_session(self):
+        self.history.session_id = self.history._generate_session_id()
+        with self.history.history_db:
+            self.history.session_number = self.history.history_db.execute(
+                "INSERT INTO sessions (session_id, start_time) VALUES (?, 0)", (self.history.session_id,)).lastrowid
+
+    @pytest.mark.parametrize("query,parameters,index", [
+        ('SELECT 1 FROM sessions WHERE session_id = ?', ('x',), 'sqlite_autoindex_sessions'),
+        ('SELECT source_id FROM history WHERE session_id = ? AND line >= ?', ('x', 1), 'history_session_line'),
+        ('SELECT 1 FROM history WHERE source_id = ? AND id > ?', (1, 1), 'history_source'),
+        ('SELECT id FROM sources WHERE hash = ?', ('x',), 'sqlite_autoindex_sources'),
+    ])
+    def test_indexes_used(self, query: str, parameters: tuple, index: str):
+        plan = self.history.history_db.execute(f'EXPLAIN QUERY PLAN {query}', parameters).fetchall()
+        assert index in ' '.join(row[-1] for row in plan), plan
+
+    def test_tail_returns_last(self):
+        for i in range(10):
+            self.history.append(i, f'code #{i}')
+        assert [line for _, line, _ in self.history.tail(3)] == [7, 8, 9]
+
+    def test_tail_unique(self):
+        for i, source in enumerate(['a', 'b', 'a', 'c', 'b']):
+            self.history.append(i, source)
+        assert [(line, source) for _, line, source in self.history.tail(10, unique=True)] == \
+            [(2, 'a'), (3, 'c'), (4, 'b')]
+        assert [source for _, _, source in self.history.tail(2, unique=True)] == ['c', 'b']
+
+    def test_range(self):
+        first_session = self.history.session_id
+        for i in range(1, 6):
+            self.history.append(i, f'first #{i}')
+        self.new_session()
+        for i in range(1, 4):
+            self.history.append(i, f'second #{i}')
+        assert [source for _, _, source in self.history.range(0, 2, 4)] == ['second #2', 'second #3']
+        assert [source for _, _, source in self.history.range(0)] == ['second #1', 'second #2', 'second #3']
+        previous = self.history.range(-1, 4)
+        assert previous == [(first_session, 4, 'first #4'), (first_session, 5, 'first #5')]
+        assert self.history.range(1, 5, 6) == [(first_session, 5, 'first #5')]
+        assert self.history.range(-5) == []
+
+    @pytest.mark.parametrize("full_text_search", [True, False])
+    def test_search(self, full_text_search: bool):
+        self.history.full_text_search = full_text_search and self.history.full_text_search
+        sources = ['WScript.Echo 1', 'Dim x', 'wscript.echo 2', 'WScript.Echo 1', 'x = 5']
+        for i, source in enumerate(sources):
+            self.history.append(i, source)
+        assert [line for _, line, _ in self.history.search('*Echo*')] == [0, 3]
+        assert [line for _, line, _ in self.history.search('*Echo*', unique=True)] == [3]
+        assert [line for _, line, _ in self.history.search('*x*', limit=1)] == [4]
+        assert [line for _, line, _ in self.history.search('Dim ?')] == [1]
+        assert self.history.search('*nothing*') == []
+
+    @pytest.mark.parametrize("with_fts", [False, True])
+    def test_legacy_database_migration(self, tmp_path, with_fts: bool):
+        history_path = str(tmp_path / 'legacy.db')
+        legacy = sqlite3.connect(history_path)
+        legacy.execute("""CREATE TABLE history (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                          session_id VARCHAR(36) NOT NULL, line INTEGER NOT NULL, source TEXT)""")
+        legacy.execute("CREATE INDEX history_session_line ON history (session_id, line)")
+        if with_fts:
+            legacy.executescript("""
+                CREATE VIRTUAL TABLE history_fts USING fts5(source, content='history', content_rowid='id');
+                CREATE TRIGGER history_fts_insert AFTER INSERT ON history BEGIN
+                    INSERT INTO history_fts (rowid, source) VALUES (new.id, new.source);
+                END;""")
+        legacy.executemany("INSERT INTO history (session_id, line, source) VALUES (?,?,?)",
+                           [('old-1', 1, 'WScript.Echo 1'), ('old-2', 1, 'Dim y'), ('old-1', 2, 'y')])
+        legacy.commit()
+        legacy.close()
+        history = HistoryManager(history_path)
+        history.connect()
+        try:
+            assert history.range(-1) == [('old-2', 1, 'Dim y')]
+            assert history.range(-2) == [('old-1', 1, 'WScript.Echo 1'), ('old-1', 2, 'y')]
+            assert history.search('*Echo*') == [('old-1', 1, 'WScript.Echo 1')]
+            history.append(1, 'new')
+            assert history.tail(2) == [('old-1', 2, 'y'), (history.session_id, 1, 'new')]
+        finally:
+            history.disconnect()
+
+
+class TestHistoryRetention:
+    history = None
+
+    def setup_method(self, method):
+        self.history = HistoryManager(":memory:")
+
+    def teardown_method(self, method):
+        self.history.disconnect()
+
+    def add_session(self, start_time: float, sources):
+        session_id = self.history._generate_session_id()
+        with self.history.history_db:
+            self.history.history_db.execute("INSERT INTO sessions (session_id, start_time) VALUES (?, ?)",
+                                            (session_id, start_time))
+        self.history._insert([(session_id, line, source) for line, source in enumerate(sources)])
+        return session_id
+
+    def count(self, table: str) -> int:
+        return self.history.history_db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+    def test_sources_deduplicated(self):
+        self.history.connect()
+        for i in range(10):
+            self.history.append(i, 'WScript.Echo "same"')
+        self.history.append(10, 'other')
+        assert self.count('history') == 11
+        assert self.count('sources') == 2
+        assert [source for _, _, source in self.history.tail(2)] == ['WScript.Echo "same"', 'other']
+
+    def test_prune_by_age(self):
+        self.history.max_age = 60
+        self.history.connect()
+        old = self.add_session(time.time() - 120, ['old', 'shared'])
+        recent = self.add_session(time.time() - 30, ['shared'])
+        self.history.append(1, 'current')
+        self.history.prune()
+        sessions = {session_id for session_id, _, _ in self.history.tail(100)}
+        assert sessions == {recent, self.history.session_id}
+        assert old not in sessions
+        assert sorted(row[0] for row in self.history.history_db.execute('SELECT source FROM sources')) == \
+            ['current', 'shared']
+
+    def test_prune_by_session_count(self):
+        self.history.max_sessions = 2
+        self.history.connect()
+        self.add_session(0, ['first'])
+        self.add_session(0, ['second'])
+        self.add_session(0, ['third'])
+        self.history.append(1, 'current')
+        self.history.prune()
+        assert [source for _, _, source in self.history.tail(100)] == ['third', 'current']
+
+    def test_prune_by_size(self):
+        self.history.connect()
+        for i in range(20):
+            self.add_session(0, [f'{i} ' + 'x' * 50000])
+        self.history.append(1, 'current')
+        self.history.max_bytes = 200000
+        self.history.prune()
+        assert self.history.stored_bytes() <= 200000
+        remaining = [source for _, _, source in self.history.tail(100)]
+        assert [source.split()[0] for source in remaining] == ['17', '18', '19', 'current']
+
+    def test_maintain_vacuums(self, tmp_path):
+        self.history = HistoryManager(str(tmp_path / 'history.db'), max_sessions=1)
+        self.history.connect()
+        for i in range(10):
+            self.add_session(0, [f'{i} ' + 'x' * 50000])
+        self.history.history_db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        page_count = self.history.history_db.execute('PRAGMA page_count').fetchone()[0]
+        self.history.maintain()
+        assert self.history.history_db.execute('PRAGMA page_count').fetchone()[0] < page_count
+        assert self.history.history_db.execute('PRAGMA freelist_count').fetchone()[0] == 0
+
+    def test_maintenance_runs_on_writer(self):
+        self.history = HistoryManager(":memory:", write_behind=True, max_sessions=1)
+        self.history.MAINTENANCE_DELAY = 0
+        with mock.patch.object(self.history, 'maintain') as maintain_mock:
+            self.history.connect()
+            self.history.append(1, 'code')
+            self.history.flush()
+            for _ in range(100):
+                if maintain_mock.called:
+                    break
+                time.sleep(0.01)
+        maintain_mock.assert_called()
+
+    def test_concurrent_sessions(self, tmp_path):
+        path = str(tmp_path / 'history.db')
+        self.history = HistoryManager(path)
+        self.history.connect()
+        for _ in range(20):
+            self.add_session(0, ['expired'])
+        self.history.disconnect()
+        sessions = [HistoryManager(path, write_behind=True, max_age=3600) for _ in range(8)]
+        errors = []
+
+        def write(history: HistoryManager):
+            try:
+                history.connect()
+                for line in range(50):
+                    history.append(line, f'code {line}')
+                    if line % 10 == 0:
+                        history.prune()
+                history.flush()
+                history.disconnect()
+            except Exception as exception:  # pylint: disable=broad-except
+                errors.append(exception)
+
+        writers = [threading.Thread(target=write, args=(history,)) for history in sessions]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        assert errors == []
+        self.history = HistoryManager(path)
+        self.history.connect()
+        assert self.count('sessions') == 10
+        assert sorted(self.history.tail(1000)) == sorted((history.session_id, line, f'code {line}')
+                                                         for history in sessions for line in range(50))
+        assert self.history.history_db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import pytest
+
+from ..imports import ImportTable
+
+
+class TestImportTable:
+    def setup_method(self, method):
+        self.table = ImportTable()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'library.vbs')
+        self.write('WScript.Echo 1\n')
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def write(self, content: str):
+        with open(self.path, 'w') as library_file:
+            library_file.write(content)
+
+    def test_unchanged(self):
+        code, state = self.table.changed(self.path)
+        assert code == 'WScript.Echo 1\n'
+        assert self.table.changed(self.path) is not None, 'not imported until added'
+        self.table.add(self.path, state)
+        with mock.patch('builtins.open') as open_mock:
+            assert self.table.changed(self.path) is None
+        open_mock.assert_not_called()
+
+    def test_touched(self):
+        self.table.add(self.path, self.table.changed(self.path)[1])
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert self.table.changed(self.path) is None, 'same content should not be run again'
+        assert self.table.libraries[self.table._key(self.path)].mtime_ns == stat.st_mtime_ns + 10 ** 9
+
+    def test_changed(self):
+        self.table.add(self.path, self.table.changed(self.path)[1])
+        self.write('WScript.Echo 2\n')
+        assert self.table.changed(self.path)[0] == 'WScript.Echo 2\n'
+
+    def test_clear(self):
+        self.table.add(self.path, self.table.changed(self.path)[1])
+        self.table.clear()
+        assert self.table.changed(self.path) is not None
+
+    def test_missing(self):
+        with pytest.raises(OSError):
+            self.table.changed(self.path + '.missing')
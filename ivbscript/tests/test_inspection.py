@@ -0,0 +1,47 @@
+from ..inspection import TypeInfo, TypeInfoCache, parse_object_info
+
+FILE_SYSTEM_OBJECT_INFO = ('Object FileSystemObject\r\n'
+                           ' Property Drives\r\n'
+                           ' Function vbString BuildPath(Path, Name)\r\n'
+                           ' Function vbEmpty (uninitialized variable) GetFolder(FolderPath)\r\n'
+                           ' Sub DeleteFile(FileSpec, Force)\r\n'
+                           ' Property (set/get) Name\r\n'
+                           ' Unknown member, InvokeKind 16\r\n')
+
+
+def test_parse_object_info():
+    info = parse_object_info(FILE_SYSTEM_OBJECT_INFO)
+    assert info.type_name == 'FileSystemObject'
+    assert info.members == ('Drives', 'BuildPath', 'GetFolder', 'DeleteFile', 'Name')
+    assert info.text == FILE_SYSTEM_OBJECT_INFO
+
+
+def test_parse_object_info_not_object():
+    assert parse_object_info('vbString, Value: a') is None
+    assert parse_object_info('') is None
+    assert parse_object_info('Object Foo; Error: Failed to get type information of the object') is None
+
+
+class TestTypeInfoCache:
+    cache = None
+
+    def setup_method(self, method):
+        self.cache = TypeInfoCache(2)
+
+    @staticmethod
+    def info(type_name: str) -> TypeInfo:
+        return TypeInfo(type_name, (), f'Object {type_name}')
+
+    def test_get(self):
+        self.cache.put('Scripting.Dictionary', self.info('Dictionary'))
+        assert self.cache.get('scripting.dictionary') == self.info('Dictionary')
+        assert self.cache.get('Scripting.FileSystemObject') is None
+
+    def test_least_recently_used_evicted(self):
+        self.cache.put('a', self.info('A'))
+        self.cache.put('b', self.info('B'))
+        self.cache.get('a')
+        self.cache.put('c', self.info('C'))
+        assert len(self.cache) == 2
+        assert self.cache.get('b') is None
+        assert self.cache.get('a') and self.cache.get('c')
@@ -1,4 +1,10 @@
+import asyncio
 import os
+import re
+import shlex
+import sys
+import threading
+import time
 from typing import Callable, Dict, List
 from unittest import mock
 
@@ -25,6 +31,12 @@ class TestKernel:
         ('Function x()\n\tWScript.Echo 1\nEnd Function', True, False),
         ('Function x()\n\tWScript.Echo 1\n\n', True, False),
         ('Function x() WScript.Echo 1 _', False, False),
+        ('Sub x()\n\tIf a Then\n\tEnd If', False, True),
+        ('If a Then WScript.Echo "End If"', True, False),
+        ('Sub x()\n', False, True),
+        ('Sub x()\r\n', False, True),
+        ('Sub x()\r\n  \r\n', True, False),
+        ('Sub x()\n   ', True, False),
         pytest.param(None, True, False, marks=pytest.mark.xfail),
         pytest.param('', True, True, marks=pytest.mark.xfail)
     ])
@@ -37,6 +49,11 @@ class TestKernel:
         results = self.kernel.do_is_complete(code)
         assert results == expected, f'code: {code}, expected: {expected}, results: {results}'
 
+    def test_is_complete_nested_indent(self):
+        results = self.kernel.do_is_complete('Sub x()\n  If a Then')
+        assert results == {'status': 'incomplete', 'indent': self.kernel.incomplete_indent * 2}
+        assert self.kernel.do_is_complete('Next\nx = 1') == {'status': 'invalid'}
+
     @pytest.mark.parametrize("code,function", [
         ('exit', VBScriptKernel._terminate_app),
         ('!whoami', VBScriptKernel._handle_command_line_code),
@@ -105,3 +122,336 @@ class TestKernel:
     def test_do_clear(self):
         with pytest.raises(NotImplementedError):
             self.kernel.do_clear()
+
+    @pytest.mark.parametrize("arguments,method,expected_call", [
+        ({'hist_access_type': 'tail', 'n': 5}, 'tail', mock.call(5, unique=False)),
+        ({'hist_access_type': 'range', 'session': -1, 'start': 2, 'stop': 4}, 'range', mock.call(-1, 2, 4)),
+        ({'hist_access_type': 'search', 'pattern': '*Echo*', 'n': 3, 'unique': True}, 'search',
+         mock.call('*Echo*', 3, unique=True)),
+    ])
+    def test_do_history(self, arguments: Dict, method: str, expected_call):
+        with mock.patch.object(self.kernel, 'history_manager') as history_manager_mock:
+            getattr(history_manager_mock, method).return_value = [('session', 1, 'code')]
+            result = self.kernel.do_history(output=False, raw=True, **arguments)
+        assert getattr(history_manager_mock, method).call_args == expected_call
+        assert result == {'history': [('session', 1, 'code')]}
+
+    def test_execute_streams_output(self):
+        interpreter = mock.MagicMock()
+        interpreter.wait_result.side_effect = [None, None, '']
+        interpreter.read_output.side_effect = ['1\n', '2\n', '', '']
+        interpreter.read_values.return_value = []
+        self.kernel.interpreter = interpreter
+        with mock.patch.object(self.kernel, 'send_response') as send_response_mock:
+            with mock.patch.object(self.kernel.history_manager, 'append'):
+                asyncio.run(self.kernel.do_execute('Dim i', silent=False))
+        streamed = [call.args[2]['text'] for call in send_response_mock.call_args_list]
+        assert streamed[0] == '1\n', 'first output should not wait for the cell to finish'
+        assert ''.join(streamed) == '1\n2\n'
+
+    def test_execute_unexpected_error(self):
+        with mock.patch.object(self.kernel, '_handle_code', side_effect=RuntimeError('broken')), \
+                mock.patch.object(self.kernel, 'send_response') as send_response_mock, \
+                mock.patch.object(self.kernel.history_manager, 'append'):
+            reply = asyncio.run(self.kernel.do_execute('Dim i', silent=False))
+        assert reply['status'] == 'error' and (reply['ename'], reply['evalue']) == ('RuntimeError', 'broken')
+        assert reply['execution_count'] == self.kernel.execution_count
+        [call] = send_response_mock.call_args_list
+        assert call.args[2]['name'] == 'stderr' and 'RuntimeError: broken' in call.args[2]['text']
+
+
+@pytest.mark.parametrize("transport", ['pipe', 'file'])
+class TestKernelStandIn:
+    kernel = None
+
+    def setup_method(self, method):
+        self.transport = None
+
+    def teardown_method(self, method):
+        if self.kernel:
+            self.kernel.do_shutdown(False)
+
+    def start_kernel(self, transport: str):
+        with mock.patch.multiple(VBScriptKernel, BACKEND='stand-in', TRANSPORT=transport,
+                                 get_history_path=mock.MagicMock(return_value=':memory:')):
+            self.kernel = VBScriptKernel()
+
+    def execute(self, code: str) -> List:
+        with mock.patch.object(self.kernel, 'send_response') as send_response_mock:
+            reply = asyncio.run(self.kernel.do_execute(code, silent=False))
+        assert reply['status'] == 'ok'
+        return [(call.args[1], 'data', call.args[2]['data']) if call.args[1] == 'display_data'
+                else (call.args[1], call.args[2]['name'], call.args[2]['text'])
+                for call in send_response_mock.call_args_list]
+
+    def test_execute(self, transport: str):
+        self.start_kernel(transport)
+        assert self.execute('Dim i: i = 6 * 7') == []
+        assert self.execute('WScript.Echo "i is", i') == [('stream', 'stdout', 'i is 42\n')]
+
+    def test_execute_error(self, transport: str):
+        self.start_kernel(transport)
+        messages = self.execute('Err.Raise 11')
+        assert [(message_type, name) for message_type, name, _ in messages] == [('stream', 'stderr')]
+        assert 'Err.Number: 11' in messages[0][2]
+
+    def test_evaluate(self, transport: str):
+        self.start_kernel(transport)
+        self.execute('Dim i: i = 6 * 7')
+        with mock.patch.object(self.kernel.interpreter, 'send', wraps=self.kernel.interpreter.send) as send_mock:
+            messages = self.execute('i + 1')
+        assert send_mock.call_count == 1
+        [(message_type, _, data)] = messages
+        assert message_type == 'display_data' and data['text/plain'].endswith(' 43')
+        assert data['application/json'] == {'type': 'vbInteger', 'value': 43}
+
+    def test_evaluate_array(self, transport: str):
+        self.start_kernel(transport)
+        self.execute('Dim a: a = Array({})'.format(', '.join(['"x"'] * 150)))
+        data = self.execute('a')[0][2]
+        assert data['application/json']['shape'] == [150] and data['application/json']['truncated']
+        assert len(data['application/json']['items']) == 100
+        assert data['text/plain'].endswith('"x", ...)')
+
+    def test_evaluate_commented(self, transport: str):
+        self.start_kernel(transport)
+        self.execute('Dim x: x = 1')
+        [(message_type, _, data)] = self.execute("x + 1 ' show it")
+        assert message_type == 'display_data' and data['application/json'] == {'type': 'vbInteger', 'value': 2}
+
+    def test_evaluate_globals(self, transport: str):
+        self.start_kernel(transport)
+        # names the interpreter uses itself, shown with the user's values
+        self.execute('Dim number, fso, token: number = 7: fso = "files": token = 1 + 1')
+        for code, expected in [('number', {'type': 'vbInteger', 'value': 7}),
+                               ('fso', {'type': 'vbString', 'value': 'files'}),
+                               ('token * number', {'type': 'vbInteger', 'value': 14})]:
+            [(message_type, _, data)] = self.execute(code)
+            assert message_type == 'display_data' and data['application/json'] == expected
+
+    def test_void_calls_not_displayed(self, transport: str):
+        self.start_kernel(transport)
+        self.kernel._remember_symbols('Sub Show(n)\nEnd Sub')
+        with mock.patch.object(self.kernel.interpreter, 'send') as send_mock:
+            send_mock.side_effect = lambda command: self.kernel.interpreter.transport.send('WScript.Echo "sent"')
+            for code in ['Show -1', 'Show (1), 2', 'Err.Clear']:
+                self.execute(code)
+                assert send_mock.call_args.args[0] == code, 'calls should be executed, not evaluated'
+        assert self.execute('WScript.Echo -5') == [('stream', 'stdout', '-5\n')]
+        self.execute('Dim e')
+        assert self.execute('e') == [], 'Empty should not be displayed'
+
+    def test_evaluate_falls_back_to_execute(self, transport: str):
+        self.start_kernel(transport)
+        with mock.patch('ivbscript.syntax.is_statement', return_value=False):
+            assert self.execute('Dim j: j = 2') == []
+        assert self.execute('WScript.Echo j') == [('stream', 'stdout', '2\n')]
+
+    def test_inspect_bounded(self, transport: str):
+        self.start_kernel(transport)
+        self.execute('Dim a: a = Array({})'.format(', '.join(map(str, range(150)))))
+        text = self.execute('a?')[0][2]
+        assert '  99): ' in text and '  100): ' not in text
+        assert text.rstrip().endswith('... 50 more from offset 100')
+
+    def test_inspect_magic(self, transport: str):
+        self.start_kernel(transport)
+        self.execute('Dim a: a = Array(10, 11, Array(12, 13), 14)')
+        lines = self.execute('%inspect a --offset 1 --limit 2 --depth 1')[0][2].splitlines()
+        assert lines == ['vbArray Len: 4', '  1): vbInteger, Value: 11', '  2): vbArray Len: 2', '',
+                         '  ... 1 more from offset 3', '']
+        assert 'Usage: %inspect' in self.execute('%inspect a --page 2')[0][2]
+
+    def test_interrupt(self, transport: str):
+        self.start_kernel(transport)
+        self.execute('Dim i: i = 1')
+        timer = threading.Timer(0.5, self.kernel._send_interrupt_children)
+        timer.start()
+        start = time.monotonic()
+        with mock.patch.object(self.kernel, 'send_response') as send_response_mock:
+            reply = asyncio.run(self.kernel.do_execute('WScript.Sleep 30000', silent=False))
+        assert time.monotonic() - start < 10
+        assert (reply['status'], reply['ename']) == ('error', 'KeyboardInterrupt')
+        assert send_response_mock.call_args.args[2]['text'].count('KeyboardInterrupt') == 1
+        assert 'Variable is undefined' in self.execute('WScript.Echo i')[0][2], 'interpreter should be replaced'
+
+    def test_interrupt_idle(self, transport: str):
+        self.start_kernel(transport)
+        self.execute('Dim i: i = 1')
+        self.kernel._send_interrupt_children()
+        assert self.execute('WScript.Echo i') == [('stream', 'stdout', '1\n')]
+
+    def test_shell_streams(self, transport: str):
+        self.start_kernel(transport)
+        script = 'import sys, time; print(\'a\', flush=True); time.sleep(0.3); sys.stderr.write(\'b\')'
+        messages = self.execute(f'!{shlex.quote(sys.executable)} -c "{script}"')
+        assert ''.join(text for _, name, text in messages if name == 'stdout') == 'a\n'
+        assert messages[-1][1] == 'stderr' and 'b' in messages[-1][2]
+
+    def test_shell_interrupt(self, transport: str):
+        self.start_kernel(transport)
+        self.execute('Dim i: i = 1')
+        timer = threading.Timer(0.5, self.kernel._send_interrupt_children)
+        timer.start()
+        start = time.monotonic()
+        messages = self.execute(f'!{shlex.quote(sys.executable)} -c "import time; time.sleep(30)"')
+        assert time.monotonic() - start < 10
+        assert 'KeyboardInterrupt' in messages[-1][2]
+        assert self.execute('WScript.Echo i') == [('stream', 'stdout', '1\n')], 'interpreter should be kept'
+
+    def test_shell_output_spill(self, transport: str):
+        self.start_kernel(transport)
+        self.kernel.COMMAND_LINE_OUTPUT_LIMIT = 10
+        messages = self.execute(f'!{shlex.quote(sys.executable)} -c "print(\'x\' * 100)"')
+        text = ''.join(text for _, name, text in messages if name == 'stdout')
+        assert text.startswith('x' * 10 + '\n[stdout truncated after 10 characters, all 101 characters')
+        os.remove(text.split(' written to ')[1].rstrip(']\n'))
+
+    def test_import(self, transport: str, tmp_path):
+        self.start_kernel(transport)
+        library_path = str(tmp_path / 'library.vbs')
+        with open(library_path, 'w') as library_file:
+            library_file.write('WScript.Echo "loaded"\n')
+
+        def import_library() -> str:
+            return ''.join(text for _, _, text in self.execute(f'%import {library_path}'))
+
+        assert import_library() == 'loaded\n'
+        assert import_library() == ''
+        with open(library_path, 'a') as library_file:
+            library_file.write('WScript.Echo "changed"\n')
+        assert import_library() == 'loaded\nchanged\n'
+        self.execute('%reset')
+        assert import_library() == 'loaded\nchanged\n'
+        assert 'FileNotFoundError' in self.execute(f'%import {library_path}.missing')[0][2]
+
+    def test_timeout(self, transport: str):
+        self.start_kernel(transport)
+        assert self.execute('%timeout 0.5') == []
+        with mock.patch.object(self.kernel, 'send_response'):
+            reply = asyncio.run(self.kernel.do_execute('WScript.Sleep 30000', silent=False))
+        assert (reply['status'], reply['ename']) == ('error', 'TimeoutError')
+        assert 'after 0.5 seconds with the interpreter idle' in reply['evalue']
+        assert self.execute('WScript.Echo 1') == [('stream', 'stdout', '1\n')]
+        self.execute('%timeout off')
+        assert self.execute('%timeout') == [('stream', 'stdout', 'Cell timeout: off\n')]
+
+    def test_timings(self, transport: str):
+        self.start_kernel(transport)
+        messages = self.execute('%time WScript.Echo 1')
+        text = ''.join(text for _, _, text in messages)
+        assert text.startswith('1\n')
+        assert [line.split(':')[0] for line in text.splitlines()[1:]] == ['send', 'wait', 'output', 'total']
+        metadata = self.kernel.finish_metadata({}, {}, {})
+        assert {'send', 'wait', 'output', 'total'} <= set(metadata['timings'])
+        report = self.execute('%stats')[0][2].splitlines()
+        assert [line.split()[:2] for line in report[1:]] == [['send', '1'], ['wait', '1'], ['output', '1'],
+                                                             ['total', '1']]
+        self.execute('%stats reset')
+        report = self.execute('%stats')[0][2].splitlines()
+        assert [line.split()[:2] for line in report[1:]] == [['total', '1']], 'only the reset cell is measured'
+
+    def test_timeit(self, transport: str):
+        self.start_kernel(transport)
+        self.execute('Dim i: i = 0')
+        with mock.patch.object(self.kernel.interpreter, 'send', wraps=self.kernel.interpreter.send) as send_mock:
+            messages = self.execute('%timeit -n 50 -r 3 i = i + 1')
+        assert send_mock.call_count == 1, 'all runs should take a single round trip'
+        assert re.fullmatch(r'50 loops, best of 3: .+ per loop \(mean .+ ± .+ std\. dev\.\)\n', messages[0][2])
+        assert self.execute('WScript.Echo i') == [('stream', 'stdout', '150\n')]
+        assert 'Usage: %timeit' in self.execute('%timeit -r 0 i = 1')[0][2]
+
+    def test_timeit_error(self, transport: str):
+        self.start_kernel(transport)
+        messages = self.execute('%timeit Err.Raise 5')
+        assert [name for _, name, _ in messages] == ['stderr']
+
+    def test_restart(self, transport: str):
+        self.start_kernel(transport)
+        self.execute('Dim i: i = 1')
+        process = self.kernel.interpreter.process
+        self.kernel.do_shutdown(True)
+        assert self.kernel.interpreter.process is not process, 'standby interpreter should be swapped in'
+        self.kernel.interpreters.close()
+        assert process.poll() is not None
+        messages = self.execute('WScript.Echo i')
+        assert 'Variable is undefined' in messages[0][2]
+
+
+class TestKernelSymbols:
+    kernel = None
+
+    def setup_method(self, method):
+        with mock.patch.object(VBScriptKernel, 'run'):
+            self.kernel = VBScriptKernel()
+        self.kernel.interpreter = mock.MagicMock()
+        self.kernel.interpreter.read_output.return_value = ''
+        self.kernel.interpreter.wait_result.return_value = ''
+        self.kernel.interpreter.read_values.return_value = []
+
+    def define(self, code: str):
+        with mock.patch.object(self.kernel, 'send_response'):
+            with mock.patch.object(self.kernel.history_manager, 'append'):
+                asyncio.run(self.kernel.do_execute(code, silent=False))
+
+    def test_symbols_completed(self):
+        self.define('Function MyFunction(a)\nEnd Function')
+        assert self.kernel.do_complete('x = MyF', 7)['matches'] == ['MyFunction']
+
+    def test_failed_definition_ignored(self):
+        self.kernel.interpreter.wait_result.return_value = 'Err.Description: Syntax error.\r\nErr.Number: 1002'
+        self.define('Function MyFunction(a)\nEnd Function')
+        assert self.kernel.symbols.get('MyFunction') is None
+
+    def test_member_completion(self):
+        self.define('Class Counter\nPublic Count\nPublic Sub Reset\nEnd Sub\nEnd Class\nSet c = New Counter')
+        output = self.kernel.do_complete('c.Re', 4)
+        assert (output['matches'], output['cursor_start']) == (['Reset'], 2)
+
+    def test_do_inspect(self):
+        self.define('Sub Greet(name)\nEnd Sub')
+        assert self.kernel.do_inspect('Greet "you"', 2) == {
+            'status': 'ok', 'found': True, 'data': {'text/plain': 'Sub Greet(name)'}, 'metadata': {}}
+        assert not self.kernel.do_inspect('Unknown', 2)['found']
+
+    def test_local_inspect_skips_interpreter(self):
+        self.define('Sub Greet(name)\nEnd Sub')
+        self.kernel.interpreter.send.reset_mock()
+        with mock.patch.object(self.kernel, 'send_response') as send_response_mock:
+            with mock.patch.object(self.kernel.history_manager, 'append'):
+                asyncio.run(self.kernel.do_execute('Greet?', silent=False))
+        assert not self.kernel.interpreter.send.called
+        assert send_response_mock.call_args.args[2]['text'] == 'Sub Greet(name)\n'
+
+    def test_type_info_cached(self):
+        self.define('Set fso = CreateObject("Scripting.FileSystemObject")')
+        self.define('Set other = CreateObject("scripting.filesystemobject")')
+        listing = 'Object FileSystemObject\r\n Function vbString BuildPath(Path, Name)\r\n Property Drives\r\n'
+        self.kernel.interpreter.read_output.side_effect = [listing, '']
+        self.define('fso?')
+        self.kernel.interpreter.send.reset_mock()
+        with mock.patch.object(self.kernel, 'send_response') as send_response_mock:
+            with mock.patch.object(self.kernel.history_manager, 'append'):
+                asyncio.run(self.kernel.do_execute('other?', silent=False))
+        assert not self.kernel.interpreter.send.called, 'known type should not be reflected again'
+        assert send_response_mock.call_args.args[2]['text'] == listing
+        assert self.kernel.do_complete('other.B', 7)['matches'] == ['BuildPath']
+
+    def test_rebound_object_not_cached(self):
+        self.define('Set fso = CreateObject("Scripting.FileSystemObject")')
+        listing = 'Object FileSystemObject\r\n Function vbString BuildPath(Path, Name)\r\n'
+        self.kernel.interpreter.read_output.side_effect = [listing, '']
+        self.define('fso?')
+        self.kernel.interpreter.read_output.side_effect = None
+        self.define('If ready Then Set fso = CreateObject("Scripting.Dictionary")')
+        self.kernel.interpreter.send.reset_mock()
+        self.define('fso?')
+        assert self.kernel.interpreter.send.called, 'the object may be of another type now'
+        assert self.kernel.do_complete('fso.B', 5)['matches'] != ['BuildPath']
+
+    def test_reset_forgets_symbols(self):
+        self.define('Dim counter')
+        with mock.patch.object(self.kernel, '_restart'):
+            self.kernel.do_shutdown(True)
+        assert self.kernel.symbols.get('counter') is None
+        assert 'counter' not in self.kernel.do_complete('count', 5)['matches']
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+
+from ..shell import STDERR, STDOUT, ShellCommand, SpillingOutput
+
+
+class TestShellCommand:
+    def run(self, command: ShellCommand):
+        chunks = []
+        while not command.finished():
+            chunks += command.read(0.05)
+        command.close()
+        return chunks
+
+    def test_streams(self):
+        command = ShellCommand([sys.executable, '-c', 'import sys; print("out"); sys.stderr.write("err")'])
+        chunks = self.run(command)
+        assert ''.join(text for name, text in chunks if name == STDOUT).splitlines() == ['out']
+        assert ''.join(text for name, text in chunks if name == STDERR) == 'err'
+
+    def test_output_arrives_while_running(self):
+        command = ShellCommand([sys.executable, '-u', '-c', 'import time; print("first"); time.sleep(30)'])
+        start = time.monotonic()
+        chunks = []
+        while not chunks and time.monotonic() - start < 10:
+            chunks = command.read(0.05)
+        assert chunks and chunks[0][1].strip() == 'first'
+        command.abort('KeyboardInterrupt', 'interrupted')
+        self.run(command)
+        assert command.abort_reason == ('KeyboardInterrupt', 'interrupted')
+        assert time.monotonic() - start < 10
+
+
+class TestSpillingOutput:
+    def test_within_limit(self):
+        sent = []
+        output = SpillingOutput(sent.append, 10, 'stdout')
+        output.write('12345')
+        output.write('67890')
+        assert sent == ['12345', '67890'] and output.close() == ''
+
+    def test_spill(self):
+        sent = []
+        output = SpillingOutput(sent.append, 10, 'stdout')
+        output.write('1234567')
+        output.write('890abc')
+        output.write('def')
+        notice = output.close()
+        assert ''.join(sent) == '1234567890'
+        assert 'truncated after 10 characters, all 16 characters' in notice
+        with open(output.spill_file.name, 'r', encoding='utf-8') as spill_file:
+            assert spill_file.read() == '1234567890abcdef'
+        os.remove(output.spill_file.name)
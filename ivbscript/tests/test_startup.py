@@ -0,0 +1,78 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from unittest import mock
+
+import pytest
+
+from ..backends import InterpreterNotFound
+from ..kernel import VBScriptKernel
+
+# seconds importing the kernel may add on top of ipykernel - measured at ~0.06 s
+IMPORT_BUDGET = 0.25
+# modules only needed by rarely used features, they must not be imported with the kernel
+LAZY_MODULES = ['psutil', 'distutils', 'win32clipboard']
+# import the package from where it is located, whatever directory the tests run from
+PACKAGE_PARENT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMPORT_SCRIPT = f'''
+import json, sys, time
+import ipykernel.kernelbase
+start = time.perf_counter()
+import ivbscript.kernel
+print(json.dumps([time.perf_counter() - start, [name for name in {LAZY_MODULES!r} if name in sys.modules]]))
+'''
+
+
+class TestStartup:
+    def test_import(self):
+        seconds, imported = json.loads(subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], check=True,
+                                                      capture_output=True, text=True,
+                                                      cwd=PACKAGE_PARENT_DIR).stdout)
+        assert imported == []
+        assert seconds < IMPORT_BUDGET, f'importing ivbscript.kernel took {seconds:.3f} seconds'
+
+    def test_init_does_not_wait_for_run(self):
+        def slow_run(kernel):
+            time.sleep(1)
+
+        with mock.patch.object(VBScriptKernel, 'run', autospec=True, side_effect=slow_run):
+            start = time.monotonic()
+            kernel = VBScriptKernel()
+            assert time.monotonic() - start < 0.5
+            kernel._wait_started()
+            assert time.monotonic() - start >= 1
+
+    def test_startup_error(self):
+        with mock.patch.object(VBScriptKernel, 'run', side_effect=OSError('spawn failed')):
+            kernel = VBScriptKernel()
+        for _ in range(2):
+            with pytest.raises(OSError, match='spawn failed'):
+                kernel._wait_started()
+
+    def test_interpreter_not_found(self):
+        with mock.patch.multiple(VBScriptKernel, BACKEND='cscript',
+                                 get_history_path=mock.MagicMock(return_value=':memory:')), \
+                mock.patch('ivbscript.backends.shutil.which', return_value=None):
+            kernel = VBScriptKernel()
+            with mock.patch.object(kernel, 'send_response') as send_response_mock:
+                # an error reply every time, the frontend must not wait for a reply
+                for _ in range(2):
+                    reply = asyncio.run(kernel.do_execute('WScript.Echo 1', silent=False))
+                    assert reply['status'] == 'error' and reply['ename'] == InterpreterNotFound.__name__
+                    assert send_response_mock.call_args.args[2]['name'] == 'stderr'
+                    assert 'InterpreterNotFound' in send_response_mock.call_args.args[2]['text']
+                reply = kernel.do_history('tail', output=False, raw=True, n=10)
+                assert reply['status'] == 'error' and reply['history'] == []
+            assert kernel.do_shutdown(False) == {'restart': False}
+
+    def test_restart_retries_startup(self):
+        with mock.patch.object(VBScriptKernel, 'run', side_effect=[OSError('spawn failed'), None]) as run_mock:
+            kernel = VBScriptKernel()
+            with pytest.raises(OSError):
+                kernel._wait_started()
+            assert kernel.do_shutdown(True) == {'restart': True}
+            kernel._wait_started()
+        assert run_mock.call_count == 2
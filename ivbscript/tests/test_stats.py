@@ -0,0 +1,64 @@
+from unittest import mock
+
+import pytest
+
+from ..stats import Histogram, PhaseStats, PhaseTimer, format_duration, format_timeit
+
+
+def test_phase_timer():
+    now = [10.0]
+    with mock.patch('time.monotonic', side_effect=lambda: now[0]):
+        timer = PhaseTimer()
+        for _ in range(2):
+            with timer.phase('wait'):
+                now[0] += 0.25
+        with timer.phase('send'):
+            now[0] += 0.002
+        assert timer.timings == {'wait': 0.5, 'send': pytest.approx(0.002)}
+        assert timer.elapsed() == pytest.approx(0.502)
+    assert timer.format() == 'wait: 500.000 ms\nsend: 2.000 ms\n'
+
+
+@pytest.mark.parametrize("seconds,expected", [(0.0000125, '12.500 µs'), (0.0125, '12.500 ms'), (2.5, '2.500 s')])
+def test_format_duration(seconds: float, expected: str):
+    assert format_duration(seconds) == expected
+
+
+class TestHistogram:
+    def test_empty(self):
+        histogram = Histogram()
+        assert (histogram.mean, histogram.percentile(0.5)) == (0.0, 0.0)
+
+    def test_percentiles(self):
+        histogram = Histogram()
+        for milliseconds in [1.5] * 90 + [30] * 9 + [5000]:
+            histogram.add(milliseconds / 1000)
+        assert histogram.count == 100
+        assert histogram.percentile(0.5) == 0.002, 'bucket upper bound'
+        assert histogram.percentile(0.9) == 0.002
+        assert histogram.percentile(0.99) == 0.032
+        assert histogram.percentile(1) == 5
+        assert (histogram.minimum, histogram.maximum) == (0.0015, 5)
+
+    def test_above_last_bucket(self):
+        histogram = Histogram()
+        histogram.add(600)
+        assert histogram.percentile(0.5) == 600
+
+
+def test_phase_stats_report():
+    stats = PhaseStats()
+    assert stats.report() == 'No cells measured yet\n'
+    stats.record({'send': 0.001, 'total': 0.01})
+    stats.record({'total': 0.02})
+    lines = stats.report().splitlines()
+    assert lines[0].split() == ['phase', 'count', 'mean', 'min', 'p50', 'p90', 'p99', 'max']
+    assert lines[1].split()[:2] == ['send', '1']
+    assert lines[2].split()[:4] == ['total', '2', '15.000', 'ms']
+    stats.clear()
+    assert not stats.histograms
+
+
+def test_format_timeit():
+    assert format_timeit(1000, [0.002, 0.004, 0.003]) == ('1000 loops, best of 3: 2.000 µs per loop '
+                                                          '(mean 3.000 µs ± 0.816 µs std. dev.)\n')
@@ -0,0 +1,46 @@
+from unittest import mock
+
+from ..streaming import OutputCoalescer
+
+
+class TestOutputCoalescer:
+    chunks = None
+
+    def setup_method(self, method):
+        self.chunks = []
+
+    def test_first_write_sent_immediately(self):
+        stream = OutputCoalescer(self.chunks.append, max_size=100, interval=60)
+        stream.write('first')
+        stream.write('second')
+        stream.write('third')
+        assert self.chunks == ['first']
+        stream.flush()
+        assert self.chunks == ['first', 'secondthird']
+
+    def test_interval(self):
+        stream = OutputCoalescer(self.chunks.append, max_size=100, interval=1)
+        now = [10]
+        with mock.patch('time.monotonic', side_effect=lambda: now[0]):
+            stream.write('a')
+            now[0] = 10.5
+            stream.write('b')
+            assert self.chunks == ['a']
+            now[0] = 11.5
+            stream.write('')
+        assert self.chunks == ['a', 'b']
+
+    def test_max_size(self):
+        stream = OutputCoalescer(self.chunks.append, max_size=4, interval=60)
+        stream.write('')
+        stream.write('x')
+        stream.write('0123456789')
+        assert self.chunks == ['x', '0123', '4567']
+        stream.flush()
+        assert self.chunks[-1] == '89'
+
+    def test_empty_flush(self):
+        stream = OutputCoalescer(self.chunks.append, max_size=4, interval=0)
+        stream.write('')
+        stream.flush()
+        assert not self.chunks
@@ -0,0 +1,67 @@
+import pytest
+
+from ..symbols import Symbol, SymbolTable, split_statements
+
+
+@pytest.mark.parametrize("code,expected", [
+    ('Dim i: i = 1', ['Dim i', 'i = 1']),
+    ('x = "a:b" \' comment: here', ['x = "a:b"']),
+    ('WScript.Echo 1, _\n2', ['WScript.Echo 1,  2']),
+    ('Rem nothing\n\n', []),
+])
+def test_split_statements(code: str, expected):
+    assert list(split_statements(code)) == expected
+
+
+class TestSymbolTable:
+    table = None
+
+    def setup_method(self, method):
+        self.table = SymbolTable()
+
+    def test_procedures(self):
+        found = self.table.update('Function Add(ByVal a, Optional b)\n  Dim local\n  Add = a + b\nEnd Function\n'
+                                  'Sub Hello: WScript.Echo 1: End Sub')
+        assert [symbol.name for symbol in found] == ['Add', 'Hello']
+        assert self.table.get('add') == Symbol('Add', 'function', ('a', 'b'))
+        assert self.table.get('local') is None, 'procedure locals are not global symbols'
+        assert self.table.get('hello').signature() == 'Sub Hello()'
+
+    def test_declarations(self):
+        self.table.update('Dim a, b(10)\nConst Pi = 3.14, E = 2.71\nc = 1\nSet fso = CreateObject("Scripting.FileSystemObject")')
+        assert {name: self.table.get(name).kind for name in self.table.names()} == {
+            'a': 'variable', 'b': 'variable', 'Pi': 'constant', 'E': 'constant', 'c': 'variable', 'fso': 'object'}
+        assert self.table.get('FSO').type_name == 'Scripting.FileSystemObject'
+
+    def test_class_members(self):
+        self.table.update('Class Counter\n  Public Count\n  Private Sub Class_Initialize\n    Count = 0\n  End Sub\n'
+                          '  Public Function Increment(n)\n    Count = Count + n\n  End Function\nEnd Class\n'
+                          'Set c = New Counter')
+        assert [member.name for member in self.table.members('c')] == ['Count', 'Class_Initialize', 'Increment']
+        assert self.table.get('counter').describe() == ('Class Counter\n  Dim Count\n  Sub Class_Initialize()\n'
+                                                        '  Function Increment(n)')
+        assert self.table.members('Counter') == (), 'members are looked up through instances'
+
+    @pytest.mark.parametrize("code", [
+        'If ready Then Set fso = CreateObject("Scripting.Dictionary")',
+        'If ready Then WScript.Echo 1 Else Set fso = Nothing',
+        'Sub Swap\n  Set fso = CreateObject("Scripting.Dictionary")\nEnd Sub',
+        'Set fso = CreateObject("Scripting.FileSystemObject")\nSub Swap: Set fso = Nothing: End Sub',
+    ])
+    def test_rebound_object(self, code: str):
+        self.table.update('Set fso = CreateObject("Scripting.FileSystemObject")')
+        self.table.update(code)
+        assert self.table.get('fso') == Symbol('fso', 'object'), 'the type of the object is no longer known'
+
+    def test_rebound_other_names(self):
+        self.table.update('Set fso = CreateObject("Scripting.FileSystemObject")\nDim n')
+        self.table.update('If ready Then Set other = Nothing: n = 2\nSub Make\n  Set local = New Counter\nEnd Sub')
+        assert self.table.get('fso').type_name == 'Scripting.FileSystemObject'
+        assert self.table.get('other') is None and self.table.get('local') is None
+
+    def test_redefinition(self):
+        self.table.update('Sub x(a)\nEnd Sub')
+        self.table.update('Function x(a, b)\nEnd Function')
+        assert self.table.get('x') == Symbol('x', 'function', ('a', 'b'))
+        self.table.clear()
+        assert self.table.names() == []
@@ -0,0 +1,111 @@
+from unittest import mock
+
+import pytest
+
+from .. import syntax
+from ..syntax import (BlockChecker, BlockState, interpreter_command,
+                      is_statement)
+
+
+class TestBlockChecker:
+    checker = None
+
+    def setup_method(self, method):
+        self.checker = BlockChecker()
+
+    @pytest.mark.parametrize("code,blocks", [
+        ('Sub x()\n  If a Then\n    For i = 1 To 2', ('sub', 'if', 'for')),
+        ('Sub x()\n  If a Then\n  End If', ('sub',)),
+        ('If a Then b = 1 Else b = 2', ()),
+        ('If a Then \' comment', ('if',)),
+        ('x = "End Sub": Sub y()', ('sub',)),
+        ('\' Sub x()\nRem Sub y()', ()),
+        ('Do While x\n  Exit Do\nLoop', ()),
+        ('Do\nLoop While x', ()),
+        ('While x\nWend', ()),
+        ('On Error Resume Next\nFor Each i In a', ('for',)),
+        ('Select Case x\n  Case 1\n  Case Else', ('select',)),
+        ('Class C\n  Public Property Get V\n    V = Me.Next\n  End Property', ('class',)),
+        ('With o\n  .Loop = 1\n  .End', ('with',)),
+        ('Public Default Function F()\n  Exit Function\nEnd Function', ()),
+    ])
+    def test_blocks(self, code: str, blocks):
+        assert self.checker.check(code) == BlockState(blocks)
+
+    def test_invalid(self):
+        assert self.checker.check('For i = 1 To 2\nEnd Sub').invalid
+        assert self.checker.check('Next').invalid
+
+    def test_continuation(self):
+        state = self.checker.check('If a And _')
+        assert state.pending == ('if', 'a', 'and')
+        assert self.checker.check('If a And _\n  b Then') == BlockState(('if',))
+
+    def test_prefix_reused(self):
+        lines = [f'Sub s{index}()\nEnd Sub\n' for index in range(50)]
+        self.checker.check(''.join(lines))
+        with mock.patch.object(syntax, 'advance', wraps=syntax.advance) as advance_mock:
+            state = self.checker.check(''.join(lines) + 'If x Then')
+        assert advance_mock.call_count == 1, 'only the new line should be scanned'
+        assert state == BlockState(('if',))
+
+    def test_last_line_compared(self):
+        code = ''.join(f'Sub s{index}()\nEnd Sub\n' for index in range(50))
+        self.checker.check(code)
+        previous_code = mock.MagicMock()
+        previous_code.__getitem__.side_effect = code.__getitem__
+        self.checker._code = previous_code
+        assert self.checker.check(code + 'If x Then') == BlockState(('if',))
+        [call] = previous_code.__getitem__.call_args_list
+        assert call.args[0] == slice(len(code) - len('End Sub\n'), len(code)), 'only the last line should be compared'
+
+    def test_edited_prefix(self):
+        self.checker.check('Sub x()\nEnd Sub\nFor i = 1 To 2\n')
+        with mock.patch.object(syntax, 'advance', wraps=syntax.advance) as advance_mock:
+            state = self.checker.check('Sub x()\nFor i = 1 To 2\n')
+        assert advance_mock.call_count == 1
+        assert state == BlockState(('sub', 'for'))
+
+
+@pytest.mark.parametrize("code,expected", [
+    ('x', False),
+    ('1 + 2', False),
+    ('Len("abc") * 2', False),
+    ('obj.Items(1).Name', False),
+    ('x Mod 2', False),
+    ('Not x', False),
+    ('x = 1', True),
+    ('arr(1) = 2', True),
+    ('obj.Items(1).Name = "a"', True),
+    ('WScript.Echo "a"', True),
+    ('WScript.Echo x, 1', True),
+    ('Dim i: i = 1', True),
+    ('Set o = Nothing', True),
+    ('If x Then y = 1', True),
+    ('Sub s()\nEnd Sub', True),
+    ('MySub', True),
+    ('MySub + 1', False),
+    ('MySub -1', True),
+    ('MySub (1)', True),
+    ('WScript.Echo -5', True),
+    ('WScript.Echo (1) + 2', True),
+    ('Foo (1), 2', True),
+    ('Err.Clear', True),
+    ('WScript.Echo', True),
+    ('x -1', False),
+    ('Len ("abc")', False),
+    ('obj.Count', False),
+    ('obj.Item(1) + 2', False),
+    ("x + 1 ' show it", False),
+])
+def test_is_statement(code: str, expected: bool):
+    assert is_statement(code, subs={'mysub'}) == expected
+
+
+@pytest.mark.parametrize("code,expected", [
+    ("x + 1 ' show it", 'oInterpreter.TryEvaluate "x + 1"'),
+    ('"it\'s" & x \' quoted', 'oInterpreter.TryEvaluate """it\'s"" & x"'),
+    ("x = 1 ' set it", "x = 1 ' set it"),
+])
+def test_interpreter_command(code: str, expected: str):
+    assert interpreter_command(code) == expected
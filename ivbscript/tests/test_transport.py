@@ -0,0 +1,139 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pytest
+
+from ..stand_in import unescape_command
+from ..transport import (RECORD_SEPARATOR, RESULT_EVENT, STDOUT_EVENT,
+                         TRANSPORTS, VALUE_EVENT, FrameParser,
+                         InterpreterExited, escape_command)
+
+STAND_IN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'stand_in.py')
+
+
+class TestFrameParser:
+    token = 'abc'
+
+    def frame(self, payload: str) -> str:
+        return f'{RECORD_SEPARATOR}{self.token}:{len(payload)}\n{payload}'
+
+    def test_output_and_result(self):
+        parser = FrameParser(self.token)
+        events = parser.feed('hello\r\n' + self.frame('Err.Description: x.\r\nErr.Number: 1'))
+        assert events == [(STDOUT_EVENT, 'hello\n'), (RESULT_EVENT, 'Err.Description: x.\nErr.Number: 1')]
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7])
+    def test_split_chunks(self, chunk_size: int):
+        parser = FrameParser(self.token)
+        stream = 'a\r\nb' + self.frame('') + 'c' + self.frame('err')
+        events = []
+        for i in range(0, len(stream), chunk_size):
+            events += parser.feed(stream[i:i + chunk_size])
+        stdout = ''.join(text for kind, text in events if kind == STDOUT_EVENT)
+        results = [text for kind, text in events if kind == RESULT_EVENT]
+        assert stdout == 'a\nbc'
+        assert results == ['', 'err']
+
+    def test_value_frame(self):
+        parser = FrameParser(self.token)
+        stream = f'{RECORD_SEPARATOR}{self.token}=5\n[1,2]' + self.frame('') + f'{RECORD_SEPARATOR}{self.token}!'
+        assert parser.feed(stream) == [(VALUE_EVENT, '[1,2]'), (RESULT_EVENT, ''),
+                                       (STDOUT_EVENT, f'{RECORD_SEPARATOR}{self.token}!')]
+
+    def test_foreign_record_separator(self):
+        parser = FrameParser(self.token)
+        events = parser.feed(f'{RECORD_SEPARATOR}x{RECORD_SEPARATOR}ab')
+        assert events == [(STDOUT_EVENT, f'{RECORD_SEPARATOR}x')]
+        assert parser.feed('z') == [(STDOUT_EVENT, f'{RECORD_SEPARATOR}abz')]
+
+
+@pytest.mark.parametrize("code", ['WScript.Echo 1', 's = "h\u00e9llo \u20ac"', '\U0001f600 \x1b \x1e', '\u00ff' * 3])
+def test_escape_command(code: str):
+    escaped = escape_command(code)
+    assert escaped.isascii()
+    assert unescape_command(escaped) == code
+
+
+@pytest.mark.parametrize("transport_name", list(TRANSPORTS))
+class TestTransport:
+    transport = None
+
+    def setup_method(self, method):
+        self.runtime_data_dir = tempfile.mkdtemp()
+
+    def teardown_method(self, method):
+        if self.transport and self.transport.process:
+            process = self.transport.process
+            self.transport.close()
+            process.kill()
+            process.wait()
+        shutil.rmtree(self.runtime_data_dir)
+
+    def spawn(self, transport_name: str, **environment):
+        self.transport = TRANSPORTS[transport_name](self.runtime_data_dir, os.getpid())
+        env = os.environ.copy()
+        env.update(self.transport.environment(), **environment)
+        self.transport.spawn([sys.executable, STAND_IN], env=env)
+
+    def execute(self, code: str):
+        self.transport.send(code)
+        stderr = self.transport.wait_result(timeout=10)
+        return stderr, self.transport.read_output()
+
+    def test_round_trip(self, transport_name: str):
+        self.spawn(transport_name)
+        assert self.execute('Dim i: i = 41') == ('', '')
+        assert self.execute('WScript.Echo "i =", i + 1') == ('', 'i = 42\n')
+
+    def test_nothing_left_on_disk(self, transport_name: str):
+        self.spawn(transport_name)
+        for _ in range(3):
+            assert self.execute('WScript.Echo String(1000, "x")') == ('', 'x' * 1000 + '\n')
+        assert os.listdir(self.runtime_data_dir) == []
+
+    def test_error(self, transport_name: str):
+        self.spawn(transport_name)
+        stderr, stdout = self.execute('WScript.Echo "before"\nErr.Raise 5, "x", "Invalid"')
+        assert stdout == 'before\n'
+        assert stderr == 'Err.Description: Invalid.\nErr.Number: 5'
+
+    def test_values(self, transport_name: str):
+        self.spawn(transport_name)
+        assert self.execute('oInterpreter.TryEvaluate "1 + 1"') == ('', '')
+        assert self.transport.read_values() == ['{"type":"vbInteger","value":2}']
+        assert self.transport.read_values() == []
+
+    def test_non_ascii(self, transport_name: str):
+        # the interpreter decodes in an ASCII code page, unlike the kernel
+        self.spawn(transport_name, LC_ALL='C', PYTHONCOERCECLOCALE='0', PYTHONUTF8='0')
+        assert self.execute('Dim s: s = "h\u00e9llo \u20ac"') == ('', '')
+        assert self.execute('WScript.Echo Len(s), "after"') == ('', '7 after\n')
+        assert self.execute('oInterpreter.TryEvaluate "s"') == ('', '')
+        assert self.transport.read_values() == ['{"type":"vbString","value":"h\\u00e9llo \\u20ac"}']
+
+    def test_wait_timeout(self, transport_name: str):
+        self.spawn(transport_name)
+        self.transport.send('WScript.Echo 1: WScript.Sleep 300')
+        assert self.transport.wait_result(timeout=0.05) is None
+        assert self.transport.wait_result(timeout=10) == ''
+        assert self.transport.read_output() == '1\n'
+
+    def test_interpreter_exited(self, transport_name: str):
+        self.spawn(transport_name)
+        self.transport.send('WScript.Quit')
+        with pytest.raises(InterpreterExited):
+            self.transport.wait_result(timeout=10)
+
+    def test_pipe_latency(self, transport_name: str):
+        if transport_name != 'pipe':
+            pytest.skip('file transport is polling based')
+        self.spawn(transport_name)
+        self.execute('Dim i')
+        round_trips = 50
+        start = time.monotonic()
+        for _ in range(round_trips):
+            self.execute('i = 1')
+        assert (time.monotonic() - start) / round_trips < 0.05
@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from ..values import display_bundle, render
+
+
+class TestValues:
+    @pytest.mark.parametrize("value,text", [
+        ({'type': 'vbEmpty', 'value': None}, 'Empty'),
+        ({'type': 'vbNull', 'value': None}, 'Null'),
+        ({'type': 'vbString', 'value': 'say "hi"'}, '"say ""hi"""'),
+        ({'type': 'vbBoolean', 'value': False}, 'False'),
+        ({'type': 'vbDouble', 'value': 1.5}, '1.5'),
+        ({'type': 'vbDate', 'value': '1/2/2020'}, '#1/2/2020#'),
+        ({'type': 'Nothing'}, 'Nothing'),
+        ({'type': 'Object', 'type_name': 'FileSystemObject'}, '<Object FileSystemObject>'),
+        ({'type': 'vbArray', 'shape': [3], 'items': [{'type': 'vbInteger', 'value': 1},
+                                                     {'type': 'vbString', 'value': 'a'}], 'truncated': True},
+         'Array(1, "a", ...)'),
+        ({'type': 'vbArray', 'shape': [2, 3], 'items': [], 'truncated': True}, '<vbArray 2x3>'),
+        ({'type': 'Dictionary', 'count': 1, 'items': [[{'type': 'vbString', 'value': 'k'},
+                                                       {'type': 'vbLong', 'value': 100000}]], 'truncated': False},
+         'Dictionary("k": 100000)'),
+    ])
+    def test_render(self, value, text: str):
+        assert render(value) == text
+
+    def test_display_bundle(self):
+        value = {'type': 'vbInteger', 'value': 7}
+        assert display_bundle(json.dumps(value)) == {'text/plain': '7', 'application/json': value}
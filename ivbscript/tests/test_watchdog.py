@@ -0,0 +1,59 @@
+import subprocess
+import sys
+from unittest import mock
+
+import psutil
+
+from ..watchdog import CellWatchdog, describe_process, kill_process_tree
+
+
+def test_watchdog_expired():
+    now = [100.0]
+    with mock.patch('time.monotonic', side_effect=lambda: now[0]):
+        watchdog = CellWatchdog(5)
+        assert not watchdog.expired()
+        now[0] = 105.0
+        assert watchdog.expired()
+        assert not CellWatchdog(None).expired()
+
+
+class TestProcesses:
+    process = None
+
+    def teardown_method(self, method):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def spawn(self, code: str) -> subprocess.Popen:
+        self.process = subprocess.Popen([sys.executable, '-c', code])
+        return self.process
+
+    def test_describe_idle(self):
+        process = self.spawn('import time; time.sleep(30)')
+        assert describe_process(process.pid).startswith('idle')
+
+    def test_describe_spinning(self):
+        process = self.spawn('import time; time.sleep(30)')
+        with mock.patch.object(psutil.Process, 'cpu_percent', return_value=100.0):
+            assert describe_process(process.pid) == 'spinning at 100% CPU'
+
+    def test_describe_exited(self):
+        process = self.spawn('pass')
+        process.wait()
+        assert describe_process(process.pid) == 'exited'
+
+    def test_kill_process_tree(self):
+        process = self.spawn('import subprocess, sys, time\n'
+                             'subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])\n'
+                             'time.sleep(30)')
+        parent = psutil.Process(process.pid)
+        while not parent.children():
+            pass
+        child = parent.children()[0]
+        kill_process_tree(process.pid)
+        assert process.wait(5) is not None
+        try:
+            assert child.status() == psutil.STATUS_ZOMBIE, 'orphaned child is only reaped by init'
+        except psutil.NoSuchProcess:
+            pass
@@ -0,0 +1,262 @@
+"""
+Transports carrying commands from the kernel to the VBScript interpreter and results back
+"""
+import codecs
+import locale
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import uuid
+from subprocess import PIPE, STDOUT, Popen
+from typing import Dict, List, Optional, Tuple, Union
+
+ENCODING = locale.getpreferredencoding(False)
+# commands are sent as ASCII, which reads the same in any code page the interpreter may decode them with - a pipe
+# frame's length is then the number of characters `StdIn.Read` consumes. Other characters are sent as
+# COMMAND_ESCAPE and the 4 hex digits of each of their UTF-16 code units, the interpreter unescapes them
+COMMAND_ENCODING = 'ascii'
+COMMAND_ESCAPE = '\x1b'
+ESCAPED_CHARACTERS_REGEX = re.compile('[^\x00-\x1a\x1c-\x7f]+')
+RECORD_SEPARATOR = '\x1e'
+STDOUT_EVENT = 'stdout'
+RESULT_EVENT = 'result'
+VALUE_EVENT = 'value'
+EXIT_EVENT = 'exit'
+
+
+class InterpreterExited(Exception):
+    pass
+
+
+def _escape_characters(match: re.Match) -> str:
+    units = match.group().encode('utf-16-le', errors='surrogatepass')
+    return ''.join(f'{COMMAND_ESCAPE}{unit:04x}' for unit in struct.unpack(f'<{len(units) // 2}H', units))
+
+
+def escape_command(code: str) -> str:
+    """
+    `code` in COMMAND_ENCODING, see `COMMAND_ESCAPE`
+    """
+    return ESCAPED_CHARACTERS_REGEX.sub(_escape_characters, code)
+
+
+class FrameParser:
+    """
+    Splits the interpreter's output stream into user output and frames.
+
+    Result frames look like `<RS><token>:<length>\\n<payload>` where `length` is the number of
+    characters in `payload`. Value frames, `<RS><token>=<length>\\n<payload>`, carry the typed value of an
+    evaluated expression (see `values.py`) and precede the result frame of their command. Anything outside of
+    a frame is output written by the executed code.
+    """
+    FRAME_KINDS = {':': RESULT_EVENT, '=': VALUE_EVENT}
+
+    def __init__(self, token: str):
+        self.marker = f'{RECORD_SEPARATOR}{token}'
+        self._buffer = ''
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        events = []
+        self._buffer += text
+        search_from = 0
+        while self._buffer:
+            marker_pos = self._buffer.find(self.marker, search_from)
+            if marker_pos == -1:
+                keep_from = self._partial_marker_pos()
+                self._emit_stdout(events, self._buffer[:keep_from])
+                self._buffer = self._buffer[keep_from:]
+                break
+            kind_pos = marker_pos + len(self.marker)
+            if kind_pos < len(self._buffer) and self._buffer[kind_pos] not in self.FRAME_KINDS:
+                # output that only looks like the start of a frame
+                search_from = kind_pos
+                continue
+            self._emit_stdout(events, self._buffer[:marker_pos])
+            self._buffer = self._buffer[marker_pos:]
+            search_from = 0
+            header_end = self._buffer.find('\n', len(self.marker))
+            if header_end == -1:
+                break
+            length = int(self._buffer[len(self.marker) + 1:header_end])
+            payload_end = header_end + 1 + length
+            if len(self._buffer) < payload_end:
+                break
+            payload = self._buffer[header_end + 1:payload_end]
+            events.append((self.FRAME_KINDS[self._buffer[len(self.marker)]], payload.replace('\r\n', '\n')))
+            self._buffer = self._buffer[payload_end:]
+        return events
+
+    def _partial_marker_pos(self) -> int:
+        """
+        Position from which the buffer's end may still turn out to be a frame marker or half of `\\r\\n`
+        """
+        separator_pos = self._buffer.rfind(RECORD_SEPARATOR, -len(self.marker))
+        if separator_pos != -1 and self.marker.startswith(self._buffer[separator_pos:]):
+            return separator_pos
+        if self._buffer.endswith('\r'):
+            return len(self._buffer) - 1
+        return len(self._buffer)
+
+    @staticmethod
+    def _emit_stdout(events: List[Tuple[str, str]], text: str):
+        if text:
+            events.append((STDOUT_EVENT, text.replace('\r\n', '\n')))
+
+
+class PipeTransport:
+    """
+    Commands are written to the interpreter's stdin as `<length>\\r\\n<code>` frames (see `COMMAND_ENCODING`),
+    results come back on its stdout as frames (see `FrameParser`) interleaved with the executed code's own output
+    """
+    name = 'pipe'
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, runtime_data_dir: str, pid: Union[int, str]):
+        self.debug_log_path = os.path.join(runtime_data_dir, f'{pid}.log')
+        self.token = uuid.uuid4().hex
+        self.process = None
+        self._events = queue.Queue()
+        self._pending_stdout = []
+        self._values = []
+        self._reader = None
+
+    def environment(self) -> Dict[str, str]:
+        return {'IVBS_DEBUG_PATH': self.debug_log_path}
+
+    def spawn(self, command: List[str], env: Dict[str, str]) -> Popen:
+        self._events = queue.Queue()
+        self._pending_stdout = []
+        self._values = []
+        self.process = Popen(command + [f'/transport:{self.name}', f'/token:{self.token}'],
+                             stdin=PIPE, stdout=PIPE, stderr=STDOUT, shell=False, env=env)
+        self._reader = threading.Thread(target=self._read_loop, args=(self.process, self._events),
+                                        name='ivbscript-pipe-reader', daemon=True)
+        self._reader.start()
+        return self.process
+
+    def _read_loop(self, process: Popen, events: queue.Queue):
+        parser = FrameParser(self.token)
+        decoder = codecs.getincrementaldecoder(ENCODING)(errors='replace')
+        while True:
+            data = process.stdout.read1(self.READ_SIZE)
+            if not data:
+                break
+            for event in parser.feed(decoder.decode(data)):
+                events.put(event)
+        events.put((EXIT_EVENT, ''))
+
+    def send(self, code: str):
+        payload = escape_command('\r\n'.join(code.splitlines()))
+        try:
+            self.process.stdin.write(f'{len(payload)}\r\n{payload}'.encode(COMMAND_ENCODING))
+            self.process.stdin.flush()
+        except (OSError, ValueError) as exception:
+            raise InterpreterExited from exception
+
+    def wait_result(self, timeout: Optional[float] = None, until_output: bool = False) -> Optional[str]:
+        """
+        Wait for the running command to finish
+
+        :param timeout: maximum time to wait in seconds
+        :param until_output: stop waiting as soon as the command writes output
+        :return: the command's error output, or None if it did not finish yet
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                kind, text = self._events.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if kind == STDOUT_EVENT:
+                self._pending_stdout.append(text)
+                if until_output:
+                    return None
+            elif kind == VALUE_EVENT:
+                self._values.append(text)
+            elif kind == RESULT_EVENT:
+                return text
+            else:
+                raise InterpreterExited
+
+    def read_output(self) -> str:
+        while True:
+            try:
+                kind, text = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == VALUE_EVENT:
+                self._values.append(text)
+                continue
+            if kind != STDOUT_EVENT:
+                # leave results/exit for wait_result, keeping their order relative to output
+                self._requeue_front(kind, text)
+                break
+            self._pending_stdout.append(text)
+        data = ''.join(self._pending_stdout)
+        self._pending_stdout = []
+        return data
+
+    def read_values(self) -> List[str]:
+        """
+        Payloads of the value frames received since the last call
+        """
+        values, self._values = self._values, []
+        return values
+
+    def _requeue_front(self, kind: str, text: str):
+        with self._events.mutex:
+            self._events.queue.appendleft((kind, text))
+            self._events.not_empty.notify()
+
+    def close(self):
+        if self.process is not None and self.process.stdin:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+        self.process = None
+
+
+class FileTransport(PipeTransport):
+    """
+    Fallback transport - commands are written to `<pid>.input`, the interpreter polls for it. Output and results
+    come back on the interpreter's stdout as with `PipeTransport`, nothing accumulates on disk
+    """
+    name = 'file'
+
+    def __init__(self, runtime_data_dir: str, pid: Union[int, str]):
+        super().__init__(runtime_data_dir, pid)
+        self.input_file_path = os.path.join(runtime_data_dir, f'{pid}.input')
+
+    def environment(self) -> Dict[str, str]:
+        env = super().environment()
+        env['IVBS_CMD_PATH'] = self.input_file_path
+        return env
+
+    def spawn(self, command: List[str], env: Dict[str, str]) -> Popen:
+        self._remove_input()
+        return super().spawn(command, env)
+
+    def send(self, code: str):
+        if self.process is None or self.process.poll() is not None:
+            raise InterpreterExited
+        # replaced at once, the interpreter must never read a partially written command
+        with open(f'{self.input_file_path}.tmp', 'w', encoding=COMMAND_ENCODING) as input_file:
+            input_file.write(escape_command("\n".join(code.splitlines())))
+        os.replace(f'{self.input_file_path}.tmp', self.input_file_path)
+
+    def close(self):
+        super().close()
+        self._remove_input()
+
+    def _remove_input(self):
+        for path in (self.input_file_path, f'{self.input_file_path}.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+TRANSPORTS = {transport.name: transport for transport in (PipeTransport, FileTransport)}
@@ -0,0 +1,50 @@
+"""
+Typed values of evaluated expressions, as encoded by the interpreter's `WriteValue`, rendered into display bundles
+
+A value is a JSON object - `{"type": <VarType name>, "value": <scalar>}` for scalars,
+`{"type": "vbArray", "shape": [<length per dimension>], "items": [<value>...], "truncated": <bool>}` for arrays
+(items are only listed for one dimensional arrays), `{"type": "Dictionary", "count": <count>,
+"items": [[<key>, <item>]...], "truncated": <bool>}` for dictionaries, `{"type": "Object", "type_name": <TypeName>}`
+for other objects and `{"type": "Nothing"}`
+"""
+import json
+from typing import Dict
+
+SCALAR_NAMES = {'vbEmpty': 'Empty', 'vbNull': 'Null'}
+
+
+def render(value: Dict) -> str:
+    """
+    Short VBScript like text of `value`
+    """
+    value_type = value['type']
+    if value_type in SCALAR_NAMES:
+        return SCALAR_NAMES[value_type]
+    if value_type == 'Nothing':
+        return 'Nothing'
+    if value_type == 'Object':
+        return f'<Object {value["type_name"]}>'
+    if value_type == 'vbArray':
+        if len(value['shape']) > 1:
+            return f'<vbArray {"x".join(map(str, value["shape"]))}>'
+        items = [render(item) for item in value['items']]
+        return f'Array({", ".join(items + ["..."] if value["truncated"] else items)})'
+    if value_type == 'Dictionary':
+        items = [f'{render(key)}: {render(item)}' for key, item in value['items']]
+        return f'Dictionary({", ".join(items + ["..."] if value["truncated"] else items)})'
+    scalar = value['value']
+    if value_type == 'vbString':
+        return '"{}"'.format(scalar.replace('"', '""'))
+    if value_type == 'vbDate':
+        return f'#{scalar}#'
+    if value_type == 'vbBoolean':
+        return 'True' if scalar else 'False'
+    return str(scalar)
+
+
+def display_bundle(payload: str) -> Dict:
+    """
+    `display_data` bundle of a value frame's payload
+    """
+    value = json.loads(payload)
+    return {'text/plain': render(value), 'application/json': value}
@@ -0,0 +1,61 @@
+"""
+Cell deadline enforcement - diagnosing and killing a hung interpreter
+"""
+import time
+from typing import Optional
+
+CPU_SAMPLE_INTERVAL = 0.1
+SPINNING_CPU_PERCENT = 90
+
+
+class CellWatchdog:
+    """
+    Deadline of a running cell
+    """
+
+    def __init__(self, timeout: Optional[float]):
+        """
+        :param timeout: seconds the cell may run, None for no limit
+        """
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+
+def describe_process(pid: int) -> str:
+    """
+    What a hung process (and its children) is doing - spinning at full CPU or idle, blocked on something
+    """
+    import psutil  # pylint: disable=import-outside-toplevel
+    try:
+        processes = [psutil.Process(pid)]
+        processes += processes[0].children(recursive=True)
+        for process in processes:
+            process.cpu_percent()
+        time.sleep(CPU_SAMPLE_INTERVAL)
+        busiest = max(process.cpu_percent() for process in processes)
+    except psutil.NoSuchProcess:
+        return 'exited'
+    if busiest >= SPINNING_CPU_PERCENT:
+        return f'spinning at {busiest:.0f}% CPU'
+    return f'idle ({busiest:.0f}% CPU), blocked waiting'
+
+
+def kill_process_tree(pid: int):
+    """
+    Kill process `pid` and every process it started - e.g. programs run by `WScript.Shell` or modal dialogs
+    """
+    import psutil  # pylint: disable=import-outside-toplevel
+    try:
+        process = psutil.Process(pid)
+        processes = process.children(recursive=True) + [process]
+    except psutil.NoSuchProcess:
+        return
+    for process in processes:
+        try:
+            process.kill()
+        except psutil.NoSuchProcess:
+            pass
+    psutil.wait_procs(processes, timeout=CPU_SAMPLE_INTERVAL * 10)
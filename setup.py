@@ -110,7 +110,7 @@ setup(
         "Operating System :: Windows"
     ],
     entry_points={
-        'console_scripts': ['ivbscript=ivbscript.app:main']
+        'console_scripts': ['ivbscript=ivbscript.app:main', 'ivbscript-batch=ivbscript.batch:main']
     },
     install_requires=REQUIREMENTS,
     python_requires='>=3.8',